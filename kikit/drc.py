@@ -4,8 +4,10 @@ import json
 import os
 import re
 import tempfile
+from concurrent.futures import ProcessPoolExecutor
 from dataclasses import dataclass, field
-from typing import Any, Dict, Iterable, List, TextIO, Tuple, Union
+from itertools import chain
+from typing import TYPE_CHECKING, Any, Dict, Iterable, List, TextIO, Tuple, Union
 from pathlib import Path
 
 from pcbnewTransition import isV7, isV8, isV9, pcbnew
@@ -13,6 +15,9 @@ from pcbnewTransition import isV7, isV8, isV9, pcbnew
 from kikit.common import fromMm, toMm
 from kikit.drc_ui import ReportLevel
 
+if TYPE_CHECKING:
+    from kikit.panelize import Panel
+
 ItemFingerprint = Tuple[int, int, str]
 
 def roundCoord(x: int) -> int:
@@ -35,27 +40,56 @@ def getItemFingerprint(item: pcbnew.BOARD_ITEM):
             roundCoord(item.GetPosition()[1]), # Round down, since the output does the same
             getItemDescription(item))
 
+def boardItems(board: pcbnew.BOARD) -> Iterable[pcbnew.BOARD_ITEM]:
+    """
+    Traverse the board and yield all items that can appear in a DRC report
+    """
+    yield from board.GetDrawings()
+    yield from board.GetFootprints()
+    for f in board.GetFootprints():
+        yield from f.Pads()
+        yield from f.GraphicalItems()
+        yield from f.Zones()
+        yield from [f.Reference(), f.Value()]
+    yield from board.GetTracks()
+    yield from board.Zones()
+
 def collectFingerprints(board: pcbnew.BOARD) -> Dict[ItemFingerprint, pcbnew.BOARD_ITEM]:
     """
     Traverse the board and collect fingerprints of all items in the board
     """
-    fingerprints = {}
-    def collect(items: Iterable[pcbnew.BOARD_ITEM]) -> None:
-        nonlocal fingerprints
-        for x in items:
-            fingerprints[getItemFingerprint(x)] = x
-
-    collect(board.GetDrawings())
-    collect(board.GetFootprints())
-    for f in board.GetFootprints():
-        collect(f.Pads())
-        collect(f.GraphicalItems())
-        collect(f.Zones())
-        collect([f.Reference(), f.Value()])
-    collect(board.GetTracks())
-    collect(board.Zones())
+    return {getItemFingerprint(x): x for x in boardItems(board)}
+
+class FingerprintIndex:
+    """
+    Find board items by their fingerprints. Computing item descriptions is
+    expensive, so the items are indexed only by their position and the
+    descriptions are computed lazily just for the items at positions that
+    are queried.
+    """
+    def __init__(self, board: pcbnew.BOARD) -> None:
+        self.items: Dict[Tuple[int, int], List[pcbnew.BOARD_ITEM]] = {}
+        self.descriptions: Dict[Tuple[int, int], List[str]] = {}
+        for x in boardItems(board):
+            pos = x.GetPosition()
+            key = (roundCoord(pos[0]), roundCoord(pos[1]))
+            self.items.setdefault(key, []).append(x)
 
-    return fingerprints
+    def __getitem__(self, fingerprint: ItemFingerprint) -> pcbnew.BOARD_ITEM:
+        key = fingerprint[:2]
+        items = self.items.get(key)
+        if items is None:
+            raise KeyError(fingerprint)
+        descriptions = self.descriptions.get(key)
+        if descriptions is None:
+            descriptions = [getItemDescription(x) for x in items]
+            self.descriptions[key] = descriptions
+        # When more items share a fingerprint, the last one wins as in
+        # collectFingerprints
+        for item, descr in zip(reversed(items), reversed(descriptions)):
+            if descr == fingerprint[2]:
+                return item
+        raise KeyError(fingerprint)
 
 @dataclass
 class DrcExclusion:
@@ -129,13 +163,20 @@ class DrcReport:
         self.unconnected = [x for x in self.unconnected if x.eqRepr() not in prints]
         self.footprint = [x for x in self.footprint if x.eqRepr() not in prints]
 
-def readBoardItem(text: str,
-                  fingerprints: Dict[ItemFingerprint, pcbnew.BOARD_ITEM]) \
-                    -> pcbnew.BOARD_ITEM:
+Fingerprints = Union[Dict[ItemFingerprint, pcbnew.BOARD_ITEM], FingerprintIndex]
+
+REPORT_ITEM = re.compile(r'\s*@\((-?\d*(\.\d*)?) mm, (-?\d*(\.\d*)?) mm\): (.*)$')
+REPORT_VIOLATION_HEADER = re.compile(r'\[(.*)\]: (.*)\n')
+REPORT_VIOLATION_BODY = re.compile(r'\s*(.*); (Severity: )?(.*)')
+REPORT_DRC_SECTION = re.compile(r'\*\* Found \d+ DRC violations \*\*')
+REPORT_UNCONNECTED_SECTION = re.compile(r'\*\* Found \d+ unconnected pads \*\*')
+REPORT_FOOTPRINT_SECTION = re.compile(r'\*\* Found \d+ Footprint errors \*\*')
+
+def readBoardItem(text: str, fingerprints: Fingerprints) -> pcbnew.BOARD_ITEM:
     """
     Given DRC report object description, try to find it in the board
     """
-    itemMatch = re.match(r'\s*@\((-?\d*(\.\d*)?) mm, (-?\d*(\.\d*)?) mm\): (.*)$', text)
+    itemMatch = REPORT_ITEM.match(text)
     if itemMatch is None:
         raise RuntimeError(f"Cannot parse board item from '{text}'")
     posX = float(itemMatch.group(1))
@@ -147,17 +188,16 @@ def readBoardItem(text: str,
     except KeyError:
         raise RuntimeError(f"Cannot find board item from '{text}', fingerprint: '{fPrint}'") # from None
 
-def readViolations(reportFile: TextIO,
-                   fingerprints: Dict[ItemFingerprint, pcbnew.BOARD_ITEM]) \
+def readViolations(reportFile: TextIO, fingerprints: Fingerprints) \
                         -> Tuple[str, List[Violation]]:
     violations = []
     line = reportFile.readline()
     while True:
-        headerMatch = re.match(r'\[(.*)\]: (.*)\n', line)
+        headerMatch = REPORT_VIOLATION_HEADER.match(line)
         if headerMatch is None:
             break
         line = reportFile.readline()
-        bodyMatch = re.match(r'\s*(.*); (Severity: )?(.*)', line)
+        bodyMatch = REPORT_VIOLATION_BODY.match(line)
         if bodyMatch is None:
             break
         v = Violation(
@@ -174,7 +214,7 @@ def readViolations(reportFile: TextIO,
     return line, violations
 
 def readReport(reportFile: TextIO, board: pcbnew.BOARD) -> DrcReport:
-    fingerprints = collectFingerprints(board)
+    fingerprints = FingerprintIndex(board)
     drcV: List[Violation] = []
     unconnectedV: List[Violation] = []
     footprintV: List[Violation] = []
@@ -182,13 +222,13 @@ def readReport(reportFile: TextIO, board: pcbnew.BOARD) -> DrcReport:
     while True:
         if len(line) == 0:
             break
-        if re.match(r'\*\* Found \d+ DRC violations \*\*', line):
+        if REPORT_DRC_SECTION.match(line):
             line, drcV = readViolations(reportFile, fingerprints)
             continue
-        if re.match(r'\*\* Found \d+ unconnected pads \*\*', line):
+        if REPORT_UNCONNECTED_SECTION.match(line):
             line, unconnectedV = readViolations(reportFile, fingerprints)
             continue
-        if re.match(r'\*\* Found \d+ Footprint errors \*\*', line):
+        if REPORT_FOOTPRINT_SECTION.match(line):
             line, footprintV = readViolations(reportFile, fingerprints)
         line = reportFile.readline()
     return DrcReport(drcV, unconnectedV, footprintV)
@@ -243,16 +283,108 @@ def readBoardDrcExclusions(board: pcbnew.BOARD) -> List[DrcExclusion]:
         exclusions = [x[0] for x in exclusions]
     return [deserializeExclusion(e, board) for e in exclusions]
 
+# Violation as a tuple (type, description, rule, severity, KIIDs of objects),
+# so it can be passed between processes
+ViolationRecord = Tuple[str, str, str, str, List[str]]
+
+def _sourceBoardViolations(filename: str, strict: bool, ignoreExcluded: bool) \
+        -> Dict[str, List[ViolationRecord]]:
+    board = pcbnew.LoadBoard(filename)
+    report = runBoardDrc(board, strict)
+    if ignoreExcluded:
+        try:
+            report.pruneExclusions(readBoardDrcExclusions(board))
+        except FileNotFoundError:
+            pass # Boards without a project have no exclusions
+    return {kind: [(v.type, v.description, v.rule, v.severity,
+                    [x.m_Uuid.AsString() for x in v.objects]) for v in violations]
+            for kind, violations in report.items()}
+
+def runPanelDrc(panel: Panel, strict: bool, ignoreExcluded: bool = True,
+                jobs: int = 1) -> Tuple[pcbnew.BOARD, DrcReport]:
+    """
+    Check DRC of a saved panel without checking every placed board. Each
+    distinct source board is checked only once, in a pool of processes if
+    jobs > 1, and its violations are mapped to all its placements in the panel.
+    Then, only the panel-level items (frame, tabs, cuts, fiducials, ...) are
+    checked on a copy of the panel without the placed boards. Note that
+    clearances between the panel-level items and items of the boards are not
+    checked in this mode.
+
+    Returns the panel loaded from its file and the DRC report referring to
+    items of the loaded panel.
+    """
+    panelBoard = pcbnew.LoadBoard(panel.filename)
+
+    sources = list(dict.fromkeys(
+        os.path.abspath(filename) for filename, _ in panel.boardInstances))
+    args = [sources, [strict] * len(sources), [ignoreExcluded] * len(sources)]
+    if jobs > 1 and len(sources) > 1:
+        with ProcessPoolExecutor(min(jobs, len(sources))) as executor:
+            sourceReports = dict(zip(sources, executor.map(_sourceBoardViolations, *args)))
+    else:
+        sourceReports = dict(zip(sources, map(_sourceBoardViolations, *args)))
+
+    report = DrcReport([], [], [])
+    reportedSources = set()
+    for filename, itemMapping in panel.boardInstances:
+        source = os.path.abspath(filename)
+        for kind, violations in sourceReports[source].items():
+            target = getattr(report, kind)
+            for type, description, rule, severity, objectIds in violations:
+                if len(objectIds) == 0 and source in reportedSources:
+                    continue # Violations without objects are reported once per source
+                if any(x not in itemMapping for x in objectIds):
+                    continue # Some of the objects were not placed into the panel
+                objects = [panelBoard.GetItem(pcbnew.KIID(itemMapping[x]))
+                           for x in objectIds]
+                target.append(Violation(type, description, rule, severity, objects))
+        reportedSources.add(source)
+
+    placedIds = set(chain.from_iterable(
+        mapping.values() for _, mapping in panel.boardInstances))
+    panelItems = pcbnew.LoadBoard(panel.filename)
+    placedItems = [x for x in chain(panelItems.GetDrawings(), panelItems.GetFootprints(),
+                                    panelItems.GetTracks(), panelItems.Zones())
+                   if x.m_Uuid.AsString() in placedIds]
+    for x in placedItems:
+        panelItems.Remove(x)
+    panelReport = runBoardDrc(panelItems, strict)
+    for kind, violations in panelReport.items():
+        target = getattr(report, kind)
+        for v in violations:
+            v.objects = [panelBoard.GetItem(x.m_Uuid) for x in v.objects]
+            target.append(v)
+
+    if ignoreExcluded:
+        report.pruneExclusions(readBoardDrcExclusions(panelBoard))
+    return panelBoard, report
+
 def runImpl(board, useMm, ignoreExcluded, strict, level, yieldViolation):
     import faulthandler
     import sys
     faulthandler.enable(sys.stderr)
 
-    units = pcbnew.EDA_UNITS_MM if useMm else pcbnew.EDA_UNITS_INCH
     report = runBoardDrc(board, strict)
     if ignoreExcluded:
         report.pruneExclusions(readBoardDrcExclusions(board))
+    return reportViolations(report, useMm, level, yieldViolation)
+
+def runPanelImpl(panel: Panel, useMm, ignoreExcluded, strict, level, jobs,
+                 yieldViolation):
+    """
+    Check DRC of a saved panel via runPanelDrc and report the violations just
+    like runImpl does. The panel has to be the one the file was saved from.
+    """
+    _, report = runPanelDrc(panel, strict, ignoreExcluded, jobs)
+    return reportViolations(report, useMm, level, yieldViolation)
 
+def reportViolations(report: DrcReport, useMm, level, yieldViolation) -> bool:
+    """
+    Yield formatted violations of at least given level. Return whether there
+    were any.
+    """
+    units = pcbnew.EDA_UNITS_MM if useMm else pcbnew.EDA_UNITS_INCH
     failed = False
     errorName = {
         "drc": "DRC violations",
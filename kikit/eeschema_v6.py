@@ -1,9 +1,8 @@
 from dataclasses import dataclass, field
-from kikit.sexpr import Atom, parseSexprF
+from kikit.sexpr import Atom, SExpr, hasName, parseSexprF
 from itertools import islice
 import os
-from typing import Optional
-from copy import deepcopy
+from typing import Dict, Optional
 
 class SchematicError(RuntimeError):
     pass
@@ -165,14 +164,69 @@ def extractSymbolInstanceV6(sexpr, path):
             s.footprint = x[1].value
     return s
 
-def collectSymbols(filename, path = None):
+# Top-level nodes of a sheet we care about when collecting symbols
+SHEET_NODES = hasName("uuid", "symbol", "sheet", "symbol_instances")
+
+def sheetKey(filename):
+    """
+    Normalized filename used for identifying sheet files
+    """
+    return os.path.normpath(os.path.abspath(filename))
+
+def readSheet(filename):
+    """
+    Parse the parts of a sheet file relevant for collecting symbols
+    """
+    with open(filename, encoding="utf-8") as f:
+        return parseSexprF(f, nodeFilter=SHEET_NODES)
+
+def getSheetFile(sheet, filename):
+    """
+    Given a sheet node from file filename, return path to the sheet file
+    """
+    f = getProperty(sheet, "Sheet file")
+    if f is None:
+        # v7 format
+        f = getProperty(sheet, "Sheetfile")
+    if f is None:
+        raise SchematicError("Invalid format - no Sheet file")
+    dirname = os.path.dirname(filename)
+    if len(dirname) > 0:
+        f = dirname + "/" + f
+    return f
+
+def loadSheets(filename) -> Dict[str, SExpr]:
+    """
+    Parse given schematic and all its sub-sheets. Every file is parsed only
+    once, even if it is instantiated multiple times. Returns a dictionary of
+    parsed sheets indexed by sheetKey.
+    """
+    sheets: Dict[str, SExpr] = {}
+    pending = [filename]
+    while len(pending) > 0:
+        key = sheetKey(pending.pop())
+        if key in sheets:
+            continue
+        sheetSExpr = readSheet(key)
+        sheets[key] = sheetSExpr
+        pending += [getSheetFile(item, key)
+                    for item in sheetSExpr.items if isSheet(item)]
+    return sheets
+
+def collectSymbols(filename, path = None, sheets = None):
     """
     Crawl given sheet and return two lists - one with symbols, one with
-    symbol instances
+    symbol instances. Parsed sheet files are cached in sheets (see
+    loadSheets), so each file is parsed only once per crawl.
     """
     isRoot = path is None
-    with open(filename, encoding="utf-8") as f:
-        sheetSExpr = parseSexprF(f)
+    if sheets is None:
+        sheets = {}
+    key = sheetKey(filename)
+    sheetSExpr = sheets.get(key)
+    if sheetSExpr is None:
+        sheetSExpr = readSheet(filename)
+        sheets[key] = sheetSExpr
     symbols, instances = [], []
     for item in sheetSExpr.items:
         if isUuid(item) and path is None:
@@ -184,17 +238,9 @@ def collectSymbols(filename, path = None):
                 instances.append(instance)
             continue
         if isSheet(item):
-            f = getProperty(item, "Sheet file")
-            if f is None:
-                # v7 format
-                f = getProperty(item, "Sheetfile")
-            if f is None:
-                raise SchematicError("Invalid format - no Sheet file")
+            f = getSheetFile(item, filename)
             uuid = getUuid(item)
-            dirname = os.path.dirname(filename)
-            if len(dirname) > 0:
-                f = dirname + "/" + f
-            s, i = collectSymbols(f, path + "/" + uuid)
+            s, i = collectSymbols(f, path + "/" + uuid, sheets)
             symbols += s
             instances += i
             continue
@@ -206,33 +252,92 @@ def collectSymbols(filename, path = None):
             continue
     return symbols, instances
 
+class SymbolView:
+    """
+    Symbol as placed in a particular sheet instance. The instance overrides
+    (reference, value, footprint and unit) are layered over a symbol shared by
+    all the instances, which is never modified.
+    """
+    __slots__ = ["symbol", "reference", "value", "footprint", "unit"]
+
+    def __init__(self, symbol: Symbol, instance: SymbolInstance):
+        self.symbol = symbol
+        self.reference = instance.reference
+        self.value = instance.value
+        self.footprint = instance.footprint
+        self.unit = symbol.unit if instance.unit is None else instance.unit
+
+    def __repr__(self):
+        return f"SymbolView({self.symbol}, reference={self.reference}, " \
+               f"value={self.value}, footprint={self.footprint}, unit={self.unit})"
+
+    @property
+    def uuid(self) -> Optional[str]:
+        return self.symbol.uuid
+
+    @property
+    def path(self) -> Optional[str]:
+        return self.symbol.path
+
+    @property
+    def lib_id(self) -> Optional[str]:
+        return self.symbol.lib_id
+
+    @property
+    def in_bom(self) -> bool:
+        return self.symbol.in_bom
+
+    @property
+    def on_board(self) -> bool:
+        return self.symbol.on_board
+
+    @property
+    def dnp(self) -> bool:
+        return self.symbol.dnp
+
+    @property
+    def properties(self) -> dict:
+        """
+        Return a new dictionary of properties with the overrides applied
+        """
+        properties = dict(self.symbol.properties)
+        for name, value in [("Reference", self.reference), ("Value", self.value),
+                            ("Footprint", self.footprint)]:
+            if value is not None:
+                properties[name] = value
+        return properties
+
+    def getField(self, field):
+        if field == "Reference" and self.reference is not None:
+            return self.reference
+        if field == "Value" and self.value is not None:
+            return self.value
+        if field == "Footprint" and self.footprint is not None:
+            return self.footprint
+        return self.symbol.properties.get(field, None)
+
+    def getReference(self):
+        if self.reference is not None:
+            return self.reference
+        return self.symbol.properties["Reference"]
 
 def getField(component, field):
+    if isinstance(component, SymbolView):
+        return component.getField(field)
     return component.properties.get(field, None)
 
 def getUnit(component):
     return component.unit
 
 def getReference(component):
+    if isinstance(component, SymbolView):
+        return component.getReference()
     return component.properties["Reference"]
 
 def extractComponents(filename):
-    symbols, instances = collectSymbols(filename)
+    symbols, instances = collectSymbols(filename, sheets=loadSheets(filename))
     symbolsDict = {x.path: x for x in symbols}
 
     assert len(symbols) == len(instances)
 
-    components = []
-    for inst in instances:
-        s = deepcopy(symbolsDict[inst.symbol_path])
-        # Note that s should be unique, so we can safely modify it
-        if inst.reference is not None:
-            s.properties["Reference"] = inst.reference
-        if inst.value is not None:
-            s.properties["Value"] = inst.value
-        if inst.footprint is not None:
-            s.properties["Footprint"] = inst.footprint
-        if inst.unit is not None:
-            s.unit = inst.unit
-        components.append(s)
-    return components
+    return [SymbolView(symbolsDict[inst.symbol_path], inst) for inst in instances]
@@ -1,6 +1,7 @@
 # Based on https://github.com/KiCad/kicad-source-mirror/blob/master/demos/python_scripts_examples/gen_gerber_and_drill_files_board.py
 import sys
 import os
+from concurrent.futures import ProcessPoolExecutor
 from pcbnewTransition import pcbnew
 from pcbnewTransition.pcbnew import *
 
@@ -70,21 +71,34 @@ def setExcludeEdgeLayer(plotOptions, excludeEdge):
         else:
             plotOptions.SetLayerSelection(LSET(Layer.Edge_Cuts))
 
-def gerberImpl(boardfile, outputdir, plot_plan=fullGerberPlotPlan, drilling=True, settings=exportSettingsJlcpcb):
+def ensureLoadedBoard(board):
     """
-    Export board to gerbers.
-
-    If no output dir is specified, use '<board file>-gerber'
+    Given a board or a board filename, return a loaded board
     """
-    basename = os.path.basename(boardfile)
-    if outputdir:
-        plotDir = outputdir
-    else:
-        plotDir = basename + "-gerber"
-    plotDir = os.path.abspath(plotDir)
+    if isinstance(board, pcbnew.BOARD):
+        return board
+    return LoadBoard(board)
 
-    board = LoadBoard(boardfile)
+def gerberPlotLayers(board, plot_plan, settings):
+    """
+    Expand plot plan into a list of (layer, suffix, comment, skipNPTH) in the
+    order in which the layers are plotted
+    """
+    layers = []
+    for name, id, comment in plot_plan:
+        suffix = "" if settings["NoSuffix"] else name
+        layers.append((id, suffix, comment, id <= B_Cu))
+    if hasCopper(plot_plan):
+        #generate internal copper layers, if any
+        for i, layer in enumerate(Layer.innerCu(board.GetCopperLayerCount())):
+            layerName = "" if settings["NoSuffix"] else f"inner{i + 1}"
+            layers.append((layer, layerName, "inner", True))
+    return layers
 
+def setupGerberPlot(board, plotDir, settings):
+    """
+    Create a plot controller for the board configured for Gerber export
+    """
     pctl = PLOT_CONTROLLER(board)
     popt = pctl.GetPlotOptions()
 
@@ -108,37 +122,75 @@ def gerberImpl(boardfile, outputdir, plot_plan=fullGerberPlotPlan, drilling=True
     popt.SetSubtractMaskFromSilk(False)
     popt.SetDrillMarksType(pcbnew.DRILL_MARKS_NO_DRILL_SHAPE)
     popt.SetSkipPlotNPTH_Pads(False)
+    return pctl
 
-    # prepare the gerber job file
-    jobfile_writer = GERBER_JOBFILE_WRITER(board)
-
-    for name, id, comment in plot_plan:
-        if id <= B_Cu:
-            popt.SetSkipPlotNPTH_Pads(True)
-        else:
-            popt.SetSkipPlotNPTH_Pads(False)
-
+def plotGerberLayers(pctl, layers):
+    """
+    Plot given layers (see gerberPlotLayers) via the plot controller. Return
+    a list of the plotted filenames.
+    """
+    popt = pctl.GetPlotOptions()
+    filenames = []
+    for id, suffix, comment, skipNPTH in layers:
+        popt.SetSkipPlotNPTH_Pads(skipNPTH)
         pctl.SetLayer(id)
-        suffix = "" if settings["NoSuffix"] else name
         pctl.OpenPlotfile(suffix, PLOT_FORMAT_GERBER, comment)
-        jobfile_writer.AddGbrFile(id, os.path.basename(pctl.GetPlotFileName()))
+        filenames.append(pctl.GetPlotFileName())
         if pctl.PlotLayer() == False:
             raise RuntimeError("KiCAD plot error")
-
-    if hasCopper(plot_plan):
-        #generate internal copper layers, if any
-        for i, layer in enumerate(Layer.innerCu(board.GetCopperLayerCount())):
-            popt.SetSkipPlotNPTH_Pads(True)
-            pctl.SetLayer(layer)
-            layerName = "" if settings["NoSuffix"] else f"inner{i + 1}"
-            pctl.OpenPlotfile(layerName, PLOT_FORMAT_GERBER, "inner")
-            jobfile_writer.AddGbrFile(layer, os.path.basename(pctl.GetPlotFileName()))
-            if pctl.PlotLayer() == False:
-                raise RuntimeError("KiCAD plot error")
-
     # At the end you have to close the last plot, otherwise you don't know when
     # the object will be recycled!
     pctl.ClosePlot()
+    return filenames
+
+def _plotGerberLayersWorker(boardfile, plotDir, layers, settings):
+    board = LoadBoard(boardfile)
+    return plotGerberLayers(setupGerberPlot(board, plotDir, settings), layers)
+
+def gerberImpl(boardfile, outputdir, plot_plan=fullGerberPlotPlan, drilling=True,
+               settings=exportSettingsJlcpcb, jobs=1):
+    """
+    Export board to gerbers. The board can be given either as a filename or as
+    an already loaded board, so callers that need the board for other stages
+    don't have to load it again.
+
+    If jobs > 1, the layers are split among a pool of processes. Every process
+    loads the board from its file, therefore, an already loaded board must not
+    contain unsaved changes in this mode. The output is the same as for the
+    serial export.
+
+    If no output dir is specified, use '<board file>-gerber'
+    """
+    board = ensureLoadedBoard(boardfile)
+    boardfile = board.GetFileName()
+    basename = os.path.basename(boardfile)
+    if outputdir:
+        plotDir = outputdir
+    else:
+        plotDir = basename + "-gerber"
+    plotDir = os.path.abspath(plotDir)
+
+    pctl = setupGerberPlot(board, plotDir, settings)
+    layers = gerberPlotLayers(board, plot_plan, settings)
+    jobs = min(jobs, len(layers))
+    if jobs > 1:
+        # The plot controller creates the output directory only when a file
+        # is plotted; make sure the workers don't race for it
+        os.makedirs(plotDir, exist_ok=True)
+        chunks = [layers[i::jobs] for i in range(jobs)]
+        with ProcessPoolExecutor(jobs) as executor:
+            plotted = list(executor.map(_plotGerberLayersWorker,
+                [boardfile] * jobs, [plotDir] * jobs, chunks, [settings] * jobs))
+        filenames = [None] * len(layers)
+        for i, chunkFilenames in enumerate(plotted):
+            filenames[i::jobs] = chunkFilenames
+    else:
+        filenames = plotGerberLayers(pctl, layers)
+
+    # prepare the gerber job file
+    jobfile_writer = GERBER_JOBFILE_WRITER(board)
+    for (id, _, _, _), filename in zip(layers, filenames):
+        jobfile_writer.AddGbrFile(id, os.path.basename(filename))
 
     if drilling:
         # Fabricators need drill files.
@@ -165,14 +217,13 @@ def gerberImpl(boardfile, outputdir, plot_plan=fullGerberPlotPlan, drilling=True
         drlwriter.SetFormat(metricFmt, zerosFmt)
         genDrl = True
         genMap = True
-        drlwriter.CreateDrillandMapFilesSet(pctl.GetPlotDirName(), genDrl, genMap)
+        drlwriter.CreateDrillandMapFilesSet(plotDir, genDrl, genMap)
 
         # One can create a text file to report drill statistics
-        rptfn = pctl.GetPlotDirName() + 'drill_report.rpt'
+        rptfn = os.path.join(plotDir, 'drill_report.rpt')
         drlwriter.GenDrillReportFile(rptfn)
 
-    job_fn=os.path.dirname(pctl.GetPlotFileName()) + '/' + os.path.basename(boardfile)
-    job_fn=os.path.splitext(job_fn)[0] + '.gbrjob'
+    job_fn=os.path.join(plotDir, os.path.splitext(os.path.basename(boardfile))[0] + '.gbrjob')
     jobfile_writer.CreateJobFile(job_fn)
 
 def pasteDxfExport(board, plotDir):
@@ -207,13 +258,12 @@ def pasteDxfExport(board, plotDir):
     return tuple(output)
 
 def dxfImpl(boardfile, outputdir):
-    basename = os.path.dirname(boardfile)
+    board = ensureLoadedBoard(boardfile)
+    basename = os.path.dirname(board.GetFileName())
     if outputdir:
         plotDir = outputdir
     else:
         plotDir = basename
     plotDir = os.path.abspath(plotDir)
 
-    board = LoadBoard(boardfile)
-
     pasteDxfExport(board, plotDir)
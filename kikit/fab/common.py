@@ -1,8 +1,11 @@
 import csv
 from dataclasses import dataclass
 from enum import Enum
+import hashlib
+import json
 import re
-from typing import OrderedDict
+import shutil
+from typing import Dict, List, OrderedDict, Set, Tuple
 from kikit.project import KiCADProject
 from pcbnewTransition import pcbnew, kicad_major
 from math import sin, cos, radians
@@ -10,6 +13,8 @@ from kikit.common import *
 from kikit.defs import MODULE_ATTR_T
 from kikit.drc_ui import ReportLevel
 from kikit import drc
+from kikit.export import gerberImpl
+import kikit
 from kikit import eeschema, eeschema_v6
 from kikit.text import kikitTextVars
 import sys
@@ -28,17 +33,17 @@ def extractComponents(filename):
     raise RuntimeError(f"Unknown schematic file type specified: {filename}")
 
 def getUnit(component):
-    if isinstance(component, eeschema_v6.Symbol):
+    if isinstance(component, (eeschema_v6.Symbol, eeschema_v6.SymbolView)):
         return eeschema_v6.getUnit(component)
     return eeschema.getUnit(component)
 
 def getField(component, field):
-    if isinstance(component, eeschema_v6.Symbol):
+    if isinstance(component, (eeschema_v6.Symbol, eeschema_v6.SymbolView)):
         return eeschema_v6.getField(component, field)
     return eeschema.getField(component, field)
 
 def getReference(component):
-    if isinstance(component, eeschema_v6.Symbol):
+    if isinstance(component, (eeschema_v6.Symbol, eeschema_v6.SymbolView)):
         return eeschema_v6.getReference(component)
     return eeschema.getReference(component)
 
@@ -156,11 +161,65 @@ def readCorrectionPatterns(filename):
             )
     return correctionPatterns
 
+class CorrectionPatternIndex:
+    """
+    Lookup of corrections by footprint name given a list of correction patterns
+    (first matching pattern wins). The patterns are combined into a single
+    alternation, so a name is matched against all of them at once, and the
+    results are memoized as boards use only a handful of distinct footprints.
+    """
+    def __init__(self, correctionPatterns: List[CorrectionPattern]):
+        self.correctionPatterns = correctionPatterns
+        self._cache: Dict[str, Tuple[float, float, float]] = {}
+        self._combined, self._groupToPattern = self._combine(correctionPatterns)
+
+    @staticmethod
+    def _combine(correctionPatterns):
+        """
+        Build the combined regex and a mapping from its group index to the
+        correction pattern. Patterns with capturing groups (that might be
+        backreferenced) or flags cannot be combined safely; in such a case,
+        return None and the patterns are tried one by one.
+        """
+        if len(correctionPatterns) == 0:
+            return None, {}
+        flags = re.compile("").flags
+        if any(p.footprint.groups > 0 or p.footprint.flags != flags
+               for p in correctionPatterns):
+            return None, {}
+        try:
+            combined = re.compile("|".join(f"({p.footprint.pattern})"
+                                           for p in correctionPatterns))
+        except re.error:
+            return None, {}
+        return combined, {i + 1: p for i, p in enumerate(correctionPatterns)}
+
+    def lookup(self, footprintName: str) -> Tuple[float, float, float]:
+        correction = self._cache.get(footprintName)
+        if correction is None:
+            correction = self._match(footprintName)
+            self._cache[footprintName] = correction
+        return correction
+
+    def _match(self, footprintName: str) -> Tuple[float, float, float]:
+        if self._combined is not None:
+            match = self._combined.match(footprintName)
+            if match is None:
+                return (0, 0, 0)
+            corpat = self._groupToPattern[match.lastindex]
+            return (corpat.x_correction, corpat.y_correction, corpat.rotation)
+        for corpat in self.correctionPatterns:
+            if corpat.footprint.match(footprintName):
+                return (corpat.x_correction, corpat.y_correction, corpat.rotation)
+        return (0, 0, 0)
+
 def applyCorrectionPattern(correctionPatterns, footprint):
     # FIXME: part ID is currently ignored
     # GetUniStringLibId returns the full footprint name including the
     # library in the form of "Resistor_SMD:R_0402_1005Metric"
     footprintName = str(footprint.GetFPID().GetUniStringLibId())
+    if isinstance(correctionPatterns, CorrectionPatternIndex):
+        return correctionPatterns.lookup(footprintName)
     for corpat in correctionPatterns:
         if corpat.footprint.match(footprintName):
             return (corpat.x_correction, corpat.y_correction, corpat.rotation)
@@ -189,14 +248,8 @@ def collectPosData(board, correctionFields, posFilter=lambda x : True,
     correctionPatterns = []
     if correctionFile is not None:
         correctionPatterns = readCorrectionPatterns(correctionFile)
+    correctionIndex = CorrectionPatternIndex(correctionPatterns)
 
-    footprints = []
-    placeOffset = board.GetDesignSettings().GetAuxOrigin()
-    for footprint in board.GetFootprints():
-        if excludeFromPos(footprint):
-            continue
-        if posFilter(footprint) and footprint.GetReference() in bom:
-            footprints.append(footprint)
     def getCompensation(footprint):
         if footprint.GetReference() not in bom:
             return 0, 0, 0
@@ -206,28 +259,104 @@ def collectPosData(board, correctionFields, posFilter=lambda x : True,
             if field is not None:
                 break
         if field is None or field == "":
-            return applyCorrectionPattern(
-                correctionPatterns,
-                footprint)
+            return applyCorrectionPattern(correctionIndex, footprint)
         try:
             return parseCompensation(field)
         except FormatError as e:
             raise FormatError(f"{footprint.GetReference()}: {e}")
-    return [(footprint.GetReference(),
-             footprintX(footprint, placeOffset, getCompensation(footprint)),
-             footprintY(footprint, placeOffset, getCompensation(footprint)),
-             layerToSide(footprint.GetLayer()),
-             footprintOrientation(footprint, getCompensation(footprint), orientationHandling)) for footprint in footprints]
 
-def posDataToFile(posData, filename):
+    posData = []
+    placeOffset = board.GetDesignSettings().GetAuxOrigin()
+    for footprint in board.GetFootprints():
+        if excludeFromPos(footprint):
+            continue
+        if not posFilter(footprint) or footprint.GetReference() not in bom:
+            continue
+        compensation = getCompensation(footprint)
+        posData.append((footprint.GetReference(),
+                        footprintX(footprint, placeOffset, compensation),
+                        footprintY(footprint, placeOffset, compensation),
+                        layerToSide(footprint.GetLayer()),
+                        footprintOrientation(footprint, compensation, orientationHandling)))
+    return posData
+
+def isBomComponent(component, ignore) -> bool:
+    """
+    Decide whether the component belongs to the BOM: it is the first unit of
+    a real (not a power or a flag) component that is not ignored and it isn't
+    excluded from the BOM, from the board or marked as do-not-populate.
+    """
+    if getUnit(component) != 1:
+        return False
+    reference = getReference(component)
+    if reference.startswith("#PWR") or reference.startswith("#FL"):
+        return False
+    if reference in ignore:
+        return False
+    if hasattr(component, "in_bom") and not component.in_bom:
+        return False
+    if hasattr(component, "on_board") and not component.on_board:
+        return False
+    if hasattr(component, "dnp") and component.dnp:
+        return False
+    return True
+
+def groupBom(components, ignore, componentType) -> Dict[tuple, List[str]]:
+    """
+    Group references of BOM components (see isBomComponent) by their type as
+    given by the function componentType. If componentType returns None, the
+    component is left out. The groups are ordered by their first occurrence.
+    """
+    ignore = set(ignore)
+    bom: Dict[tuple, List[str]] = {}
+    for c in components:
+        if not isBomComponent(c, ignore):
+            continue
+        cType = componentType(c)
+        if cType is None:
+            continue
+        references = bom.get(cType)
+        if references is None:
+            bom[cType] = [getReference(c)]
+        else:
+            references.append(getReference(c))
+    return bom
+
+def bomReferences(bom: Dict[tuple, List[str]]) -> Set[str]:
+    """
+    Return the set of all references in the BOM
+    """
+    return {ref for references in bom.values() for ref in references}
+
+def restrictBom(bom: Dict[tuple, List[str]], references: Set[str]) -> Dict[tuple, List[str]]:
+    """
+    Keep only given references in the BOM and drop groups that became empty
+    """
+    restricted = {}
+    for cType, refs in bom.items():
+        refs = [r for r in refs if r in references]
+        if len(refs) > 0:
+            restricted[cType] = refs
+    return restricted
+
+def writeCsv(filename, header, rows) -> None:
+    """
+    Write a CSV file with given header. The rows can be any iterable, e.g., a
+    generator; they are streamed to the file as they are produced.
+    """
     with open(filename, "w", newline="", encoding="utf-8") as csvfile:
         writer = csv.writer(csvfile)
-        writer.writerow(["Designator", "Mid X", "Mid Y", "Layer", "Rotation"])
+        writer.writerow(header)
+        writer.writerows(rows)
+
+def posDataToFile(posData, filename):
+    def rows():
         for line in sorted(posData, key=lambda x: naturalComponentKey(x[0])):
             line = list(line)
             for i in [1, 2, 4]:
                 line[i] = f"{line[i]:.2f}" # Most Fab houses expect only 2 decimal digits
-            writer.writerow(line)
+            yield line
+    writeCsv(filename, ["Designator", "Mid X", "Mid Y", "Layer", "Rotation"], rows())
 
 def isValidSchPath(filename):
     return os.path.splitext(filename)[1] in [".sch", ".kicad_sch"]
@@ -255,3 +384,107 @@ def expandNameTemplate(template: str, filetype: str, board: pcbnew.BOARD) -> str
 def naturalComponentKey(reference: str) -> Tuple[str, int]:
     text, num = splitOnReverse(reference, lambda x: x.isdigit())
     return str(text), int(num)
+
+MANIFEST_FILE = "kikit-manifest.json"
+
+def fingerprint(files: List[str], values) -> str:
+    """
+    Compute a hash of content of the files and of JSON-serializable values.
+    Non-existing files are hashed as empty.
+    """
+    h = hashlib.sha256()
+    for filename in files:
+        h.update(filename.encode("utf-8"))
+        if not os.path.exists(filename):
+            continue
+        with open(filename, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                h.update(chunk)
+    h.update(json.dumps(values, sort_keys=True, default=str).encode("utf-8"))
+    return h.hexdigest()
+
+class ExportManifest:
+    """
+    Record of fingerprints of inputs of export stages stored in the output
+    directory. It allows us to skip stages whose inputs haven't changed since
+    the last run.
+    """
+    def __init__(self, outputdir: str) -> None:
+        self.outputdir = outputdir
+        self.stages = {}
+        try:
+            with open(self.filename, encoding="utf-8") as f:
+                self.stages = json.load(f)
+        except (OSError, ValueError):
+            pass
+
+    @property
+    def filename(self) -> str:
+        return os.path.join(self.outputdir, MANIFEST_FILE)
+
+    def upToDate(self, stage: str, fingerprint: str) -> bool:
+        """
+        Check if the stage was run with the same fingerprint and its outputs
+        still exist
+        """
+        record = self.stages.get(stage)
+        if record is None or record["fingerprint"] != fingerprint:
+            return False
+        return all(os.path.exists(os.path.join(self.outputdir, x))
+                   for x in record["outputs"])
+
+    def record(self, stage: str, fingerprint: str, outputs: List[str]) -> None:
+        """
+        Record a finished stage with its outputs (relative to the output
+        directory) and save the manifest
+        """
+        self.stages[stage] = {
+            "fingerprint": fingerprint,
+            "outputs": outputs
+        }
+        with open(self.filename, "w", encoding="utf-8") as f:
+            json.dump(self.stages, f, indent=4)
+
+    def invalidate(self, stage: str) -> None:
+        """
+        Forget the stage before its outputs are modified, so an interrupted
+        run doesn't leave a stale record behind
+        """
+        if self.stages.pop(stage, None) is not None:
+            with open(self.filename, "w", encoding="utf-8") as f:
+                json.dump(self.stages, f, indent=4)
+
+def exportGerberArchive(board: pcbnew.BOARD, outputdir: str, archiveName: str,
+                        incremental: bool = False, **kwargs) -> None:
+    """
+    Plot gerbers of the board into '<outputdir>/gerber' and pack them into
+    an archive '<outputdir>/<archiveName>.zip'. The remaining arguments are
+    passed to gerberImpl.
+
+    In the incremental mode, plotting and archiving are skipped when the board,
+    its project and the export settings didn't change since the last run.
+    """
+    gerberdir = os.path.join(outputdir, "gerber")
+    archive = archiveName + ".zip"
+    manifest = ExportManifest(outputdir) if incremental else None
+
+    boardfile = board.GetFileName()
+    gerberKey = fingerprint(
+        [boardfile, os.path.splitext(boardfile)[0] + ".kicad_pro"],
+        [kikit.__version__, pcbnew.GetBuildVersion(), sorted(kwargs.items())])
+    if manifest is None or not manifest.upToDate("gerber", gerberKey):
+        if manifest is not None:
+            manifest.invalidate("gerber")
+        shutil.rmtree(gerberdir, ignore_errors=True)
+        gerberImpl(board, gerberdir, **kwargs)
+        if manifest is not None:
+            manifest.record("gerber", gerberKey, ["gerber"])
+
+    archiveKey = fingerprint([], [gerberKey, archive])
+    if manifest is None or not manifest.upToDate("archive", archiveKey):
+        if manifest is not None:
+            manifest.invalidate("archive")
+        shutil.make_archive(os.path.join(outputdir, archiveName), "zip",
+                            outputdir, "gerber")
+        if manifest is not None:
+            manifest.record("archive", archiveKey, [archive])
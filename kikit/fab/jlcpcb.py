@@ -7,43 +7,25 @@ import shutil
 from pathlib import Path
 from kikit.fab.common import *
 from kikit.common import *
-from kikit.export import gerberImpl
 
 def collectBom(components, lscsFields, ignore):
-    bom = {}
-    for c in components:
-        if getUnit(c) != 1:
-            continue
-        reference = getReference(c)
-        if reference.startswith("#PWR") or reference.startswith("#FL"):
-            continue
-        if reference in ignore:
-            continue
+    def componentType(c):
         if getField(c, "JLCPCB_IGNORE") is not None and getField(c, "JLCPCB_IGNORE") != "":
-            continue
-        if hasattr(c, "in_bom") and not c.in_bom:
-            continue
-        if hasattr(c, "on_board") and not c.on_board:
-            continue
-        if hasattr(c, "dnp") and c.dnp:
-            continue
+            return None
         orderCode = None
         for fieldName in lscsFields:
             orderCode = getField(c, fieldName)
             if orderCode is not None and orderCode.strip() != "":
                 break
-        cType = (
+        return (
             getField(c, "Value"),
             getField(c, "Footprint"),
             orderCode
         )
-        bom[cType] = bom.get(cType, []) + [reference]
-    return bom
+    return groupBom(components, ignore, componentType)
 
 def bomToCsv(bomData, filename):
-    with open(filename, "w", newline="", encoding="utf-8") as csvfile:
-        writer = csv.writer(csvfile)
-        writer.writerow(["Comment", "Designator", "Footprint", "LCSC"])
+    def rows():
         for cType, references in bomData.items():
             # JLCPCB allows at most 200 components per line so we have to split
             # the BOM into multiple lines. Let's make the chunks by 100 just to
@@ -53,11 +35,12 @@ def bomToCsv(bomData, filename):
             for i in range(0, len(references), CHUNK_SIZE):
                 refChunk = sortedReferences[i:i+CHUNK_SIZE]
                 value, footprint, lcsc = cType
-                writer.writerow([value, ",".join(refChunk), footprint, lcsc])
+                yield [value, ",".join(refChunk), footprint, lcsc]
+    writeCsv(filename, ["Comment", "Designator", "Footprint", "LCSC"], rows())
 
 def exportJlcpcb(board, outputdir, assembly, schematic, ignore, field,
            corrections, correctionpatterns, missingerror, nametemplate, drc,
-           autoname):
+           autoname, incremental=False):
     """
     Prepare fabrication files for JLCPCB including their assembly service
     """
@@ -67,20 +50,19 @@ def exportJlcpcb(board, outputdir, assembly, schematic, ignore, field,
     if drc:
         ensurePassingDrc(loadedBoard)
 
-    refsToIgnore = parseReferences(ignore)
-    removeComponents(loadedBoard, refsToIgnore)
     Path(outputdir).mkdir(parents=True, exist_ok=True)
 
-    gerberdir = os.path.join(outputdir, "gerber")
-    shutil.rmtree(gerberdir, ignore_errors=True)
-    gerberImpl(board, gerberdir)
-
     if autoname:
         boardName = os.path.basename(board.replace(".kicad_pcb", ""))
         archiveName = expandNameTemplate(nametemplate, boardName + "-gerbers", loadedBoard)
     else:
         archiveName = expandNameTemplate(nametemplate, "gerbers", loadedBoard)
-    shutil.make_archive(os.path.join(outputdir, archiveName), "zip", outputdir, "gerber")
+    # Gerbers are plotted before removing the ignored components as they are
+    # still part of the fabricated board
+    exportGerberArchive(loadedBoard, outputdir, archiveName, incremental)
+
+    refsToIgnore = parseReferences(ignore)
+    removeComponents(loadedBoard, refsToIgnore)
 
     if not assembly:
         return
@@ -94,15 +76,13 @@ def exportJlcpcb(board, outputdir, assembly, schematic, ignore, field,
     ordercodeFields = [x.strip() for x in field.split(",")]
     bom = collectBom(components, ordercodeFields, refsToIgnore)
 
-    bom_refs = set(x for xs in bom.values() for x in xs)
+    bom_refs = bomReferences(bom)
     bom_components = [c for c in components if getReference(c) in bom_refs]
 
     posData = collectPosData(loadedBoard, correctionFields,
         bom=bom_components, posFilter=noFilter, correctionFile=correctionpatterns,
         orientationHandling=FootprintOrientationHandling.MirrorBottom)
-    boardReferences = set([x[0] for x in posData])
-    bom = {key: [v for v in val if v in boardReferences] for key, val in bom.items()}
-    bom = {key: val for key, val in bom.items() if len(val) > 0}
+    bom = restrictBom(bom, {x[0] for x in posData})
 
 
     missingFields = False
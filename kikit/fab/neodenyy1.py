@@ -19,27 +19,8 @@ FOOTPRIINTREGEX = {
 }
 
 def collectBom(components, ignore):
-    bom = {}
-    for c in components:
-        if getUnit(c) != 1:
-            continue
-        reference = getReference(c)
-        if reference.startswith("#PWR") or reference.startswith("#FL"):
-            continue
-        if reference in ignore:
-            continue
-        if hasattr(c, "in_bom") and not c.in_bom:
-            continue
-        if hasattr(c, "on_board") and not c.on_board:
-            continue
-        if hasattr(c, "dnp") and c.dnp:
-            continue
-        cType = (
-            getField(c, "Value"),
-            getField(c, "Footprint")
-        )
-        bom[cType] = bom.get(cType, []) + [reference]
-    return bom
+    return groupBom(components, ignore,
+        lambda c: (getField(c, "Value"), getField(c, "Footprint")))
 
 def transcodeFootprint(footprint):
     for pattern, replacement in FOOTPRIINTREGEX.items():
@@ -57,8 +38,7 @@ def posDataProcess(posData, pcbSize, bom):
     bottomLayer = []
     ref = {}
     for cType, references in bom.items():
-        sortedReferences = sorted(references, key=naturalComponentKey)
-        for refComponent in sortedReferences:
+        for refComponent in references:
             ref[refComponent] = cType
     for line in posData:
         if line[0] in ref:
@@ -151,9 +131,7 @@ def exportNeodenYY1(board, outputdir, schematic, ignore,
 
     posData = collectPosData(loadedBoard, correctionFields,
         bom=components, posFilter=noFilter, correctionFile=correctionpatterns)
-    boardReferences = set([x[0] for x in posData])
-    bom = {key: [v for v in val if v in boardReferences] for key, val in bom.items()}
-    bom = {key: val for key, val in bom.items() if len(val) > 0}
+    bom = restrictBom(bom, {x[0] for x in posData})
 
     boundingBox = loadedBoard.GetBoardEdgesBoundingBox()
     pcbSize = (boundingBox.GetHeight() / mm, boundingBox.GetWidth() / mm, )
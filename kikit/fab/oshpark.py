@@ -1,13 +1,11 @@
 from pcbnewTransition import pcbnew
-import os
-import shutil
 from pathlib import Path
-from kikit.export import gerberImpl, exportSettingsOSHPark, fullGerberPlotPlan
-from kikit.fab.common import ensurePassingDrc, expandNameTemplate
+from kikit.export import exportSettingsOSHPark, fullGerberPlotPlan
+from kikit.fab.common import ensurePassingDrc, expandNameTemplate, exportGerberArchive
 
 plotPlanNoVCuts = [(name, id, comment) for name, id, comment in fullGerberPlotPlan if name != "CmtUser"]
 
-def exportOSHPark(board, outputdir, nametemplate, drc):
+def exportOSHPark(board, outputdir, nametemplate, drc, incremental=False):
     """
     Prepare fabrication files for OSH Park
     """
@@ -17,9 +15,6 @@ def exportOSHPark(board, outputdir, nametemplate, drc):
     if drc:
         ensurePassingDrc(loadedBoard)
 
-    gerberdir = os.path.join(outputdir, "gerber")
-    shutil.rmtree(gerberdir, ignore_errors=True)
-    gerberImpl(board, gerberdir, plot_plan=plotPlanNoVCuts, settings=exportSettingsOSHPark)
-
     archiveName = expandNameTemplate(nametemplate, "gerbers", loadedBoard)
-    shutil.make_archive(os.path.join(outputdir, archiveName), "zip", outputdir, "gerber")
+    exportGerberArchive(loadedBoard, outputdir, archiveName, incremental,
+                        plot_plan=plotPlanNoVCuts, settings=exportSettingsOSHPark)
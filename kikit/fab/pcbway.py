@@ -8,7 +8,7 @@ import shutil
 from pathlib import Path
 from kikit.fab.common import *
 from kikit.common import *
-from kikit.export import gerberImpl, exportSettingsPcbway
+from kikit.export import exportSettingsPcbway
 
 def collectSolderTypes(board):
     result = {}
@@ -30,95 +30,54 @@ def addVirtualToRefsToIgnore(refsToIgnore, board):
 def collectBom(components, manufacturerFields, partNumberFields,
                descriptionFields, notesFields, typeFields, footprintFields,
                ignore):
-    bom = {}
-
     # Use KiCad footprint as fallback for footprint
     footprintFields.append("Footprint")
     # Use value as fallback for description
     descriptionFields.append("Value")
 
-    for c in components:
-        if getUnit(c) != 1:
-            continue
-        reference = getReference(c)
-        if reference.startswith("#PWR") or reference.startswith("#FL") or reference in ignore:
-            continue
-        if hasattr(c, "in_bom") and not c.in_bom:
-            continue
-        if hasattr(c, "on_board") and not c.on_board:
-            continue
-        if hasattr(c, "dnp") and c.dnp:
-            continue
-        manufacturer = None
-        for manufacturerName in manufacturerFields:
-            manufacturer = getField(c, manufacturerName)
-            if manufacturer is not None:
-                break
-        partNumber = None
-        for partNumberName in partNumberFields:
-            partNumber = getField(c, partNumberName)
-            if partNumber is not None:
-                break
-        description = None
-        for descriptionName in descriptionFields:
-            description = getField(c, descriptionName)
-            if description is not None:
-                break
-        notes = None
-        for notesName in notesFields:
-            notes = getField(c, notesName)
-            if notes is not None:
-                break
-        solderType = None
-        for typeName in typeFields:
-            solderType = getField(c, typeName)
-            if solderType is not None:
-                break
-        footprint = None
-        for footprintName in footprintFields:
-            footprint = getField(c, footprintName)
-            if footprint is not None:
+    def firstField(c, fieldNames):
+        value = None
+        for name in fieldNames:
+            value = getField(c, name)
+            if value is not None:
                 break
+        return value
 
-        cType = (
-            description,
-            footprint,
-            manufacturer,
-            partNumber,
-            notes,
-            solderType
-        )
-        bom[cType] = bom.get(cType, []) + [reference]
-    return bom
+    return groupBom(components, ignore, lambda c: (
+        firstField(c, descriptionFields),
+        firstField(c, footprintFields),
+        firstField(c, manufacturerFields),
+        firstField(c, partNumberFields),
+        firstField(c, notesFields),
+        firstField(c, typeFields)
+    ))
 
 def bomToCsv(bomData, filename, nBoards, types):
-    with open(filename, "w", newline="", encoding="utf-8") as csvfile:
-        writer = csv.writer(csvfile)
-        writer.writerow(["Item #", "Designator", "Qty", "Manufacturer",
-                         "Mfg Part #", "Description / Value", "Footprint",
-                         "Type", "Your Instructions / Notes"])
-        item_no = 1
-
+    def rows():
         tmp = {}
         for cType, references in bomData.items():
             tmp[references[0]] = (references, cType)
 
-        for i in sorted(tmp, key=naturalComponentKey):
+        for item_no, i in enumerate(sorted(tmp, key=naturalComponentKey), start=1):
             references, cType = tmp[i]
             references = sorted(references, key=naturalComponentKey)
             description, footprint, manufacturer, partNumber, notes, solderType = cType
             if solderType is None:
                 solderType = types[references[0]]
-            writer.writerow([item_no, ",".join(references),
-                             len(references) * nBoards, manufacturer,
-                             partNumber, description, footprint,
-                             solderType, notes])
-            item_no += 1
+            yield [item_no, ",".join(references),
+                   len(references) * nBoards, manufacturer,
+                   partNumber, description, footprint,
+                   solderType, notes]
+
+    writeCsv(filename, ["Item #", "Designator", "Qty", "Manufacturer",
+                        "Mfg Part #", "Description / Value", "Footprint",
+                        "Type", "Your Instructions / Notes"], rows())
 
 
 def exportPcbway(board, outputdir, assembly, schematic, ignore,
                  manufacturer, partnumber, description, notes, soldertype,
-                 footprint, corrections, correctionpatterns, missingerror, nboards, nametemplate, drc):
+                 footprint, corrections, correctionpatterns, missingerror, nboards, nametemplate, drc,
+                 incremental=False):
     """
     Prepare fabrication files for PCBWay including their assembly service
     """
@@ -128,16 +87,16 @@ def exportPcbway(board, outputdir, assembly, schematic, ignore,
     if drc:
         ensurePassingDrc(loadedBoard)
 
-    refsToIgnore = parseReferences(ignore)
-    removeComponents(loadedBoard, refsToIgnore)
     Path(outputdir).mkdir(parents=True, exist_ok=True)
 
-    gerberdir = os.path.join(outputdir, "gerber")
-    shutil.rmtree(gerberdir, ignore_errors=True)
-    gerberImpl(board, gerberdir, settings=exportSettingsPcbway)
-
+    # Gerbers are plotted before removing the ignored components as they are
+    # still part of the fabricated board
     archiveName = expandNameTemplate(nametemplate, "gerbers", loadedBoard)
-    shutil.make_archive(os.path.join(outputdir, archiveName), "zip", outputdir, "gerber")
+    exportGerberArchive(loadedBoard, outputdir, archiveName, incremental,
+                        settings=exportSettingsPcbway)
+
+    refsToIgnore = parseReferences(ignore)
+    removeComponents(loadedBoard, refsToIgnore)
 
     if not assembly:
         return
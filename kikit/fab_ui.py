@@ -20,8 +20,16 @@ def fabCommand(f):
         help="Print extra debugging information")(f)
     return f
 
+def incrementalOption(f):
+    """
+    A decorator adding the incremental option to fab commands producing gerbers
+    """
+    return click.option("--incremental/--no-incremental", default=False,
+        help="Skip plotting and archiving gerbers when the board and the export settings haven't changed since the last run in the output directory.")(f)
+
 @click.command()
 @fabCommand
+@incrementalOption
 @click.option("--assembly/--no-assembly", help="Generate files for SMT assembly (schematics is required)")
 @click.option("--schematic", type=click.Path(dir_okay=False), help="Board schematics (required for assembly files)")
 @click.option("--ignore", type=str, default="", help="Comma separated list of designators to exclude from SMT assembly")
@@ -43,6 +51,7 @@ def jlcpcb(**kwargs):
 
 @click.command()
 @fabCommand
+@incrementalOption
 @click.option("--assembly/--no-assembly", help="Generate files for SMT assembly (schematics is required)")
 @click.option("--schematic", type=click.Path(dir_okay=False), help="Board schematics (required for assembly files)")
 @click.option("--ignore", type=str, default="", help="Comma separated list of designators to exclude from SMT assembly")
@@ -76,6 +85,7 @@ def pcbway(**kwargs):
 
 @click.command()
 @fabCommand
+@incrementalOption
 def oshpark(**kwargs):
     """
     Prepare fabrication files for OSH Park
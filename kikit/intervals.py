@@ -3,6 +3,7 @@ import typing
 from typing import Any, Dict, List, Optional, Union, Tuple, Callable, Iterable
 from kikit.typing import Box, T, ComparableT
 from itertools import islice, chain
+from bisect import bisect_left
 from math import isclose
 from copy import copy
 
@@ -192,20 +193,41 @@ class BoxNeighbors:
 
     @staticmethod
     def _computeQuery(list: List[Tuple[object, Interval, float]]) -> Dict[object, List[Tuple[object, IntervalList]]]:
+        """
+        Sweep the boxes from the farthest to the closest one and maintain the
+        skyline - for each point of the projection the closest box swept so
+        far. The neighbors of a box are the owners of the skyline over its
+        projection; then the box covers the skyline over its projection.
+        """
+        # The skyline is a list of breakpoints and list of segment owners.
+        # Segment i spans from breakpoints[i] to breakpoints[i + 1]
+        breakpoints = [-float("inf"), float("inf")]
+        owners: List[Optional[int]] = [None]
+
+        def split(x: float) -> int:
+            i = bisect_left(breakpoints, x)
+            if breakpoints[i] != x:
+                breakpoints.insert(i, x)
+                owners.insert(i, owners[i - 1])
+            return i
+
         neighbors = {}
-        for i, (ident, interval, pos) in enumerate(list):
-            n: List[Tuple[object, IntervalList]] = []
-            rest = IntervalList([interval])
-            for j in range(i + 1, len(list)):
-                nIdent, nInterval, nPos = list[j]
-                shadow = rest.intersect(nInterval)
-                if shadow.trivial():
-                    continue
-                n.append((nIdent, shadow))
-                rest = rest.difference(nInterval)
-                if rest.trivial():
-                    break
-            neighbors[ident] = n
+        for i in range(len(list) - 1, -1, -1):
+            ident, interval, _ = list[i]
+            if interval.trivial():
+                neighbors[ident] = []
+                continue
+            start = split(interval.min)
+            end = split(interval.max)
+            shadows: Dict[int, List[Interval]] = {}
+            for j in range(start, end):
+                if owners[j] is not None:
+                    shadows.setdefault(owners[j], []).append(
+                        Interval(breakpoints[j], breakpoints[j + 1]))
+            del breakpoints[start + 1:end]
+            owners[start:end] = [i]
+            neighbors[ident] = [(list[j][0], IntervalList(shadow))
+                for j, shadow in sorted(shadows.items())]
         return neighbors
 
     @staticmethod
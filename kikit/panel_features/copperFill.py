@@ -4,14 +4,13 @@ from ..defs import Layer
 from ..common import KiAngle, KiLength, fromDegrees, fromMm
 from ..pcbnew_utils import increaseZonePriorities
 from pcbnewTransition import pcbnew
-from ..panelize import Panel
+from ..panelize import Panel, substratesExterior
 from .baseFeature import PanelFeature
-from typing import Any, List, Tuple
+from typing import Any, List, Tuple, Union
 import numpy as np
-from shapely.geometry import (
-    Polygon,
-    MultiPolygon)
-from shapely.ops import unary_union
+import shapely
+from shapely import STRtree
+from shapely.geometry import Polygon, MultiPolygon
 
 class KiCADCopperFillMixin(PanelFeature):
     """
@@ -23,15 +22,20 @@ class KiCADCopperFillMixin(PanelFeature):
         """
         pass  # solid infill does nothing
 
+    def _prefill(self) -> bool:
+        """
+        Allow an inherited class to fill the zones by KiKit instead of KiCAD
+        """
+        return False
+
     def apply(self, panel: Any) -> None:
         if not len(self.layers) > 0:
             raise RuntimeError("No layers to add copper to")
         increaseZonePriorities(panel.board)
 
         zoneArea = panel.boardSubstrate.substrates.buffer(-self.edgeclearance)
-        zoneArea = zoneArea.difference(unary_union(
-            [substrate.exterior().buffer(self.clearance) for substrate in panel.substrates]
-        ))
+        zoneArea = zoneArea.difference(
+            substratesExterior(panel.substrates, self.clearance))
 
         geoms = [zoneArea] if isinstance(zoneArea, Polygon) else zoneArea.geoms
 
@@ -52,7 +56,10 @@ class KiCADCopperFillMixin(PanelFeature):
                 zoneContainer = zoneContainer.Duplicate()
                 zoneContainer.SetLayer(l)
                 panel.board.Add(zoneContainer)
-                panel.zonesToRefill.append(zoneContainer)
+                if self._prefill():
+                    panel.prefillZone(zoneContainer, g, self.clearance)
+                else:
+                    panel.zonesToRefill.append(zoneContainer)
 
 
 @dataclass
@@ -63,10 +70,14 @@ class SolidCopperFill(KiCADCopperFillMixin):
     clearance: KiLength = field(default_factory=lambda: fromMm(1))
     edgeclearance: KiLength = field(default_factory=lambda: fromMm(1))
     layers: List[Layer] = field(default_factory=lambda: [Layer.F_Cu, Layer.B_Cu])
+    prefill: bool = False
 
     def _adjustZoneParameters(self, zone: pcbnew.ZONE) -> None:
         pass # There are no adjustments for solid infill
 
+    def _prefill(self) -> bool:
+        return self.prefill
+
 
 @dataclass
 class HatchedCopperFill(KiCADCopperFillMixin):
@@ -97,8 +108,13 @@ class HexCopperFill(PanelFeature):
     diameter: KiLength = field(default_factory=lambda: fromMm(7))
     space: KiLength = field(default_factory=lambda: fromMm(0.5))
     threshold: float = field(default_factory=lambda: 0.25)
+    prefill: bool = False
 
-    def _buildHexagonsPolygon(self, area: Tuple[float, float, float, float]) -> MultiPolygon:
+    def _buildHexagons(self, area: Tuple[float, float, float, float]) -> np.ndarray:
+        """
+        Build a lattice of hexagons covering the area. Return them as an array
+        of polygons ordered row by row.
+        """
         horizontalSpacing = self.space + np.sqrt(3) / 2 * self.diameter
         verticalSpacing = 3 / 4 * self.diameter + np.sqrt(3) / 2 * self.space
 
@@ -107,21 +123,46 @@ class HexCopperFill(PanelFeature):
         maxx += horizontalSpacing
         maxy += horizontalSpacing
 
-        hexagons = []
-        y = miny
-        shifted = False
-        while y <= maxy:
-            x = minx - (horizontalSpacing / 2 if shifted else 0)
-            while x <= maxx:
-                hexagons.append(Polygon([
-                    (x + self.diameter / 2 * np.cos(np.pi / 6 + i / 3 * np.pi),
-                     y + self.diameter / 2 * np.sin(np.pi / 6 + i / 3 * np.pi)) for i in range(6)
-                ]))
-                x += horizontalSpacing
-            y += verticalSpacing
-            shifted = not shifted
-
-        return MultiPolygon(hexagons)
+        def steps(start: float, step: float, stop: float) -> np.ndarray:
+            # Accumulate the steps just like repeated addition does
+            count = int((stop - start) / step) + 2
+            values = np.cumsum(np.concatenate([[start], np.full(count, step)]))
+            return values[values <= stop]
+
+        ys = steps(miny, verticalSpacing, maxy)
+        rowXs = [steps(minx, horizontalSpacing, maxx),
+                 steps(minx - horizontalSpacing / 2, horizontalSpacing, maxx)]
+        centers = np.concatenate([
+            np.column_stack([rowXs[i % 2], np.full(len(rowXs[i % 2]), y)])
+            for i, y in enumerate(ys)])
+
+        angles = np.pi / 6 + np.arange(6) / 3 * np.pi
+        vertices = self.diameter / 2 * np.column_stack([np.cos(angles), np.sin(angles)])
+        return shapely.polygons(centers[:, np.newaxis, :] + vertices[np.newaxis, :, :])
+
+    def _clipHexagons(self, hexagons: np.ndarray,
+                      zoneArea: Union[Polygon, MultiPolygon]) -> np.ndarray:
+        """
+        Clip the hexagons by the zone area and return polygons that are large
+        enough to be kept. Hexagons fully inside the zone are kept as they are.
+        """
+        tree = STRtree(hexagons)
+        inside = tree.query(zoneArea, predicate="contains")
+        overlapping = np.setdiff1d(tree.query(zoneArea, predicate="intersects"), inside)
+
+        shapely.prepare(zoneArea)
+        clipped = shapely.intersection(hexagons[overlapping], zoneArea)
+        pieces, pieceIndices = shapely.get_parts(clipped, return_index=True)
+        isPolygon = shapely.get_type_id(pieces) == shapely.GeometryType.POLYGON
+        pieces, pieceIndices = pieces[isPolygon], overlapping[pieceIndices[isPolygon]]
+
+        # Keep the lattice order of the hexagons
+        polygons = np.concatenate([hexagons[inside], pieces])
+        order = np.argsort(np.concatenate([inside, pieceIndices]), kind="stable")
+        polygons = polygons[order]
+
+        baseHexArea = 3 * np.sqrt(3) * (self.diameter / 2) ** 2 / 2
+        return polygons[shapely.area(polygons) >= self.threshold * baseHexArea]
 
     def apply(self, panel: Panel) -> None:
         if not len(self.layers) > 0:
@@ -131,19 +172,13 @@ class HexCopperFill(PanelFeature):
 
         zoneArea = panel.boardSubstrate.substrates.buffer(-self.edgeclearance)
         zoneArea = zoneArea.intersection(panel.boardSubstrate.substrates)
-        zoneArea = zoneArea.difference(unary_union(
-            [substrate.exterior().buffer(self.clearance) for substrate in panel.substrates]
-        ))
-
-        hexagons = self._buildHexagonsPolygon(zoneArea.bounds)
-        hexagons = hexagons.intersection(zoneArea)
+        zoneArea = zoneArea.difference(
+            substratesExterior(panel.substrates, self.clearance))
 
-        baseHexArea = 3 * np.sqrt(3) * (self.diameter / 2) ** 2 / 2
-
-        geoms = [hexagons] if isinstance(hexagons, Polygon) else hexagons.geoms
-        for g in geoms:
-            if g.area < self.threshold * baseHexArea:
-                continue
+        if zoneArea.is_empty:
+            return
+        hexagons = self._buildHexagons(zoneArea.bounds)
+        for g in self._clipHexagons(hexagons, zoneArea):
             zoneContainer = pcbnew.ZONE(panel.board)
             zoneContainer.Outline().AddOutline(linestringToKicad(g.exterior))
             for hole in g.interiors:
@@ -156,4 +191,7 @@ class HexCopperFill(PanelFeature):
                 zoneContainer = zoneContainer.Duplicate()
                 zoneContainer.SetLayer(l)
                 panel.board.Add(zoneContainer)
-                panel.zonesToRefill.append(zoneContainer)
+                if self.prefill:
+                    panel.prefillZone(zoneContainer, g, self.clearance)
+                else:
+                    panel.zonesToRefill.append(zoneContainer)
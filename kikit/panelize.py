@@ -6,6 +6,7 @@ from kikit import sexpr
 from kikit.common import normalize
 
 from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
 
 from typing import Any, Callable, Dict, Iterable, List, Set, Tuple, Union
 
@@ -13,9 +14,9 @@ from pcbnewTransition.pcbnew import (LoadBoard, ToMM, VECTOR2I, BOX2I, EDA_ANGLE
 from enum import Enum
 from shapely.geometry import (Polygon, MultiPolygon, Point, LineString, box,
                               GeometryCollection, MultiLineString)
-from shapely.prepared import prep
 import shapely
 import shapely.affinity
+from shapely import STRtree
 from itertools import product, chain
 import numpy as np
 import os
@@ -28,10 +29,11 @@ from dataclasses import dataclass
 from kikit import substrate
 from kikit import units
 from kikit.kicadUtil import getPageDimensionsFromAst
-from kikit.substrate import Substrate, linestringToKicad, extractRings, TabError
+from kikit.substrate import (Substrate, linestringToKicad, extractRings, TabError,
+                             shapePolyToShapely, shapelyToShapePoly)
 from kikit.defs import PAPER_DIMENSIONS, STROKE_T, Layer, EDA_TEXT_HJUSTIFY_T, EDA_TEXT_VJUSTIFY_T, PAPER_SIZES
 from kikit.common import *
-from kikit.sexpr import isElement, parseSexprF, SExpr, Atom, findNode, parseSexprListF
+from kikit.sexpr import hasName, isElement, parseSexprF, SExpr, Atom, findNode, parseSexprListF
 from kikit.annotations import AnnotationReader, TabAnnotation
 from kikit.drc import DrcExclusion, readBoardDrcExclusions, serializeExclusion
 from kikit.units import mm, deg, inch
@@ -43,6 +45,9 @@ class PanelError(RuntimeError):
 class TooLargeError(PanelError):
     pass
 
+class PanelDrcErrors(PanelError):
+    pass
+
 class NonFatalErrors(PanelError):
     def __init__(self, errors: List[Tuple[KiPoint, str]]) -> None:
         multiple = len(errors) > 1
@@ -186,11 +191,11 @@ def getOriginCoord(origin, bBox):
     if origin == Origin.BottomRight:
         return VECTOR2I(bBox.GetX() + bBox.GetWidth(), bBox.GetY() + bBox.GetHeight())
 
-def appendItem(board: pcbnew.BOARD, item: pcbnew.BOARD_ITEM,
-               yieldMapping: Optional[Callable[[str, str], None]]=None) -> None:
+def duplicateItem(item: pcbnew.BOARD_ITEM,
+                  yieldMapping: Optional[Callable[[str, str], None]]=None) \
+                    -> pcbnew.BOARD_ITEM:
     """
-    Make a coppy of the item and append it to the board. Allows to append items
-    from one board to another.
+    Make a copy of the item. The copy is not added to any board.
 
     It can also yield mapping between old item identifier and a new one via the
     yieldMapping callback. This callback is invoked with an old ID and the new
@@ -200,9 +205,8 @@ def appendItem(board: pcbnew.BOARD, item: pcbnew.BOARD_ITEM,
         newItem = item.Duplicate()
     except TypeError: # Footprint has overridden the method, cannot be called directly
         newItem = pcbnew.Cast_to_BOARD_ITEM(item).Duplicate().Cast()
-    board.Add(newItem)
     if not yieldMapping:
-        return
+        return newItem
     if isinstance(item, pcbnew.FOOTPRINT):
         newFootprint = pcbnew.Cast_to_FOOTPRINT(newItem)
         for getter in [lambda x: x.Pads(), lambda x: x.GraphicalItems(), lambda x: x.Zones()]:
@@ -213,6 +217,19 @@ def appendItem(board: pcbnew.BOARD, item: pcbnew.BOARD_ITEM,
                 assert o.GetPosition() == n.GetPosition()
                 yieldMapping(o.m_Uuid.AsString(), n.m_Uuid.AsString())
     yieldMapping(item.m_Uuid.AsString(), newItem.m_Uuid.AsString())
+    return newItem
+
+def appendItem(board: pcbnew.BOARD, item: pcbnew.BOARD_ITEM,
+               yieldMapping: Optional[Callable[[str, str], None]]=None) -> None:
+    """
+    Make a coppy of the item and append it to the board. Allows to append items
+    from one board to another.
+
+    It can also yield mapping between old item identifier and a new one via the
+    yieldMapping callback. This callback is invoked with an old ID and the new
+    ID. Mapping is applicable only in v6.
+    """
+    board.Add(duplicateItem(item, yieldMapping))
 
 def collectNetNames(board):
     return [str(x) for x in board.GetNetInfo().NetsByName() if len(str(x)) > 0]
@@ -234,7 +251,7 @@ def toPolygon(entity: Union[List[ToPolygonGeometry], ToPolygonGeometry]) -> Poly
             (entity.GetX() + entity.GetWidth(), entity.GetY() + entity.GetHeight()),
             (entity.GetX(), entity.GetY() + entity.GetHeight())])
     if isinstance(entity, Substrate):
-        return Substrate.substrates
+        return entity.substrates
     raise NotImplementedError("Cannot convert {} to Polygon".format(type(entity)))
 
 def rectString(rect):
@@ -369,6 +386,63 @@ def prolongCut(cut, prolongation):
     c[-1] += normalize(c[-1] - c[-2]) * prolongation
     return LineString(c)
 
+def mouseBitePositions(cuts: List[LineString], spacing: KiLength) -> \
+        Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Evenly distribute holes along the cuts so that their spacing is at most
+    spacing. A cut shorter than spacing gets a single hole in its middle.
+
+    Returns an array of hole points together with arrays holding the index of
+    the cut and the index of the hole within the cut for each point.
+    """
+    cuts = np.array(cuts, dtype=object)
+    lengths = shapely.length(cuts)
+    counts = (lengths / spacing).astype(int) + 1
+    cutIndices = np.repeat(np.arange(len(cuts)), counts)
+    holeIndices = np.arange(len(cutIndices)) - np.repeat(np.cumsum(counts) - counts, counts)
+    holeLengths = lengths[cutIndices]
+    holeCounts = counts[cutIndices]
+    distances = np.where(holeCounts == 1, 0.5 * holeLengths,
+        holeIndices * holeLengths / np.maximum(holeCounts - 1, 1))
+    points = shapely.line_interpolate_point(cuts[cutIndices], distances)
+    return points, cutIndices, holeIndices
+
+def substratesExterior(substrates: Iterable[Substrate],
+                       clearance: Optional[KiLength]=None) \
+        -> Union[Polygon, MultiPolygon, GeometryCollection]:
+    """
+    Return a union of exteriors of the substrates built in a single pass. If
+    clearance is given, each exterior is buffered by it before the union.
+    """
+    exteriors = np.array([s.exterior() for s in substrates], dtype=object)
+    if clearance is not None:
+        # Use the same resolution as Geometry.buffer does by default
+        exteriors = shapely.buffer(exteriors, clearance, quad_segs=16)
+    return shapely.unary_union(exteriors)
+
+def zoneFill(area: Union[Polygon, MultiPolygon],
+             obstacles: STRtree,
+             keepouts: List[Union[Polygon, MultiPolygon]],
+             clearance: KiLength, minThickness: KiLength) \
+        -> Union[Polygon, MultiPolygon, GeometryCollection]:
+    """
+    Compute the copper of a zone filling the area. The fill keeps clearance
+    from the obstacles and it doesn't enter the keepouts. Parts of the fill
+    thinner than minThickness are removed just like KiCAD zone filler does.
+
+    The obstacles are given as a spatial index so it can be shared by all the
+    zones on a layer.
+    """
+    # Most of the obstacles are usually far away (e.g., pads of the boards)
+    nearby = obstacles.query(area, predicate="dwithin", distance=clearance)
+    obstacles = shapely.buffer(obstacles.geometries.take(np.sort(nearby)),
+                               clearance, quad_segs=16)
+    fill = area.difference(shapely.unary_union(np.concatenate(
+        [obstacles, np.array(keepouts, dtype=object)])))
+    if minThickness > 0:
+        fill = fill.buffer(-minThickness / 2).buffer(minThickness / 2)
+    return fill.intersection(area)
+
 def polygonToZone(polygon, board):
     """
     Given a polygon and target board, creates a KiCAD zone. The zone has to be
@@ -382,30 +456,72 @@ def polygonToZone(polygon, board):
         zone.Outline().AddHole(linestringToKicad(boundary))
     return zone
 
+def constructTabs(substrate: Substrate,
+                  partitionLines: Union[GeometryCollection, LineString],
+                  tabAnnotations: Iterable[TabAnnotation], fillet: KiLength = 0) -> \
+                    List[Union[Tuple[Optional[Polygon], Optional[LineString]], TabError]]:
+    """
+    Given substrate, partitionLines of the substrate and an iterable of tab
+    annotations, construct the tabs. Return a list with an item for each
+    annotation - either a pair tab and cut (both None if the tab does not hit
+    the partition line) or TabError if the tab cannot be constructed.
+    """
+    results = []
+    for annotation in tabAnnotations:
+        try:
+            results.append(substrate.tab(annotation.origin, annotation.direction,
+                annotation.width, partitionLines, annotation.maxLength, fillet))
+        except TabError as e:
+            results.append(e)
+    return results
+
+def _constructTabsWkb(substrateWkb: bytes, partitionLinesWkb: bytes,
+                      annotations: List[Tuple[Tuple[float, float], Tuple[float, float], KiLength, KiLength]],
+                      fillet: KiLength) -> List[Union[Tuple[Optional[bytes], Optional[bytes]], TabError]]:
+    """
+    Process pool counterpart of constructTabs; the geometry is passed as WKB
+    """
+    s = Substrate([])
+    s.substrates = shapely.from_wkb(substrateWkb)
+    s.oriented = True
+    tabAnnotations = [TabAnnotation(None, origin, direction, width, maxLength)
+                      for origin, direction, width, maxLength in annotations]
+    results = []
+    for r in constructTabs(s, shapely.from_wkb(partitionLinesWkb), tabAnnotations, fillet):
+        if isinstance(r, TabError):
+            results.append(r)
+        else:
+            results.append(tuple(None if x is None else shapely.to_wkb(x) for x in r))
+    return results
+
 def buildTabs(panel: "Panel", substrate: Substrate,
               partitionLines: Union[GeometryCollection, LineString],
-              tabAnnotations: Iterable[TabAnnotation], fillet: KiLength = 0) -> \
+              tabAnnotations: Iterable[TabAnnotation], fillet: KiLength = 0,
+              constructed: Optional[List[Union[Tuple[Optional[Polygon], Optional[LineString]], TabError]]] = None) -> \
                 Tuple[List[Polygon], List[LineString]]:
     """
     Given substrate, partitionLines of the substrate and an iterable of tab
     annotations, build tabs. Note that if the tab does not hit the partition
-    line, it is not included in the design.
+    line, it is not included in the design. The tabs already constructed via
+    constructTabs can be passed via constructed.
 
     Return a pair of lists: tabs and cuts.
     """
+    tabAnnotations = list(tabAnnotations)
+    if constructed is None:
+        constructed = constructTabs(substrate, partitionLines, tabAnnotations, fillet)
     tabs, cuts = [], []
-    for annotation in tabAnnotations:
-        try:
-            t, c = substrate.tab(annotation.origin, annotation.direction,
-                annotation.width, partitionLines, annotation.maxLength, fillet)
-            if t is not None:
-                tabs.append(t)
-                cuts.append(c)
-        except TabError as e:
+    for annotation, result in zip(tabAnnotations, constructed):
+        if isinstance(result, TabError):
             panel._renderLines(
                 [constructArrow(annotation.origin, annotation.direction, fromMm(3), fromMm(1))],
                 Layer.Margin)
-            panel.reportError(toKiCADPoint(e.origin), str(e))
+            panel.reportError(toKiCADPoint(result.origin), str(result))
+            continue
+        t, c = result
+        if t is not None:
+            tabs.append(t)
+            cuts.append(c)
     return tabs, cuts
 
 def normalizePartitionLineOrientation(line):
@@ -458,6 +574,83 @@ def bakeTextVars(board: pcbnew.BOARD) -> None:
         else:
             drawing.SetText(drawing.GetShownText())
 
+class SourceBoard:
+    """
+    A board loaded from a file together with its project data. The board serves
+    as a template for placing it into a panel - it is never modified, each
+    placement works with copies of its items. Therefore, appending the same
+    board multiple times loads and parses the source files only once.
+    """
+    def __init__(self, filename: Union[str, Path], bakeText: bool = False) -> None:
+        self.filename = filename
+        self.board = LoadBoard(str(filename))
+        if bakeText:
+            bakeTextVars(self.board)
+        self.netNames = collectNetNames(self.board)
+        self.project = self._readProject()
+        self.customDrcRules = self._readCustomDrcRules()
+        try:
+            self.drcExclusions = readBoardDrcExclusions(self.board)
+        except FileNotFoundError:
+            self.drcExclusions = [] # Ignore boards without a project
+        self._substrates: Dict[Tuple[int, int, int, int], Substrate] = {}
+        self._rotatedSubstrates: Dict[Tuple[Any, ...], Substrate] = {}
+
+    def substrate(self, edges: List[pcbnew.PCB_SHAPE], sourceArea: BOX2I,
+                  origin: VECTOR2I, rotation: KiAngle) -> Substrate:
+        """
+        Return the substrate of the board in the source area rotated around
+        origin. The substrate is reconstructed from the edges (in the source
+        board coordinates) only once per source area; its rotated copies are
+        cached per rotation angle.
+        """
+        areaKey = (sourceArea.GetX(), sourceArea.GetY(),
+                   sourceArea.GetWidth(), sourceArea.GetHeight())
+        key = (areaKey, origin[0], origin[1], rotation.AsDegrees() % 360)
+        rotated = self._rotatedSubstrates.get(key)
+        if rotated is None:
+            base = self._substrates.get(areaKey)
+            if base is None:
+                base = Substrate(edges)
+                self._substrates[areaKey] = base
+            rotated = base.transformed(rotation, origin, VECTOR2I(0, 0))
+            self._rotatedSubstrates[key] = rotated
+        return rotated
+
+    def _readProject(self) -> Optional[Dict[str, Any]]:
+        proFilename = os.path.splitext(self.board.GetFileName())[0]+'.kicad_pro'
+        try:
+            with open(proFilename, encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            # The board has no project, e.g., it comes from v5
+            return None
+
+    def _readCustomDrcRules(self) -> Optional[List[SExpr]]:
+        druFilename = os.path.splitext(self.board.GetFileName())[0]+'.kicad_dru'
+        try:
+            if os.stat(druFilename).st_size == 0:
+                return None
+            with open(druFilename, encoding="utf-8") as f:
+                return parseSexprListF(f)
+        except FileNotFoundError:
+            return None
+
+    @property
+    def projectVariables(self) -> Dict[str, str]:
+        if self.project is None:
+            return {}
+        return self.project.get("text_variables", {})
+
+    @staticmethod
+    def cacheKey(filename: Union[str, Path], bakeText: bool) -> Tuple[str, int, bool]:
+        """
+        Return a key under which the loaded board can be cached. The key
+        changes when the source file is modified.
+        """
+        path = os.path.realpath(str(filename))
+        return (path, os.stat(path).st_mtime_ns, bakeText)
+
 @dataclass
 class VCutSettings:
     lineWidth: KiLength = fromMm(0.4)
@@ -496,6 +689,13 @@ class Panel:
         self.filename = panelFilename
         self.board = pcbnew.NewBoard(panelFilename)
         self.sourcePaths = set() # A set of all board files that were appended to the panel
+        self.sourceBoards: Dict[Tuple[str, int, bool], SourceBoard] = {} # Loaded
+                                    # source boards, so we parse them only once
+        # Source file of every appended board together with a mapping of KIIDs
+        # of its items to the KIIDs of their copies in the panel
+        self.boardInstances: List[Tuple[str, Dict[str, str]]] = []
+        # Library footprints loaded by the panel, they are duplicated on use
+        self.footprintPrototypes: Dict[Tuple[str, str], pcbnew.FOOTPRINT] = {}
         self.substrates = [] # Substrates of the individual boards; e.g. for masking
         self.boardSubstrate = Substrate([]) # Keep substrate in internal representation,
                                             # Draw it just before saving
@@ -506,6 +706,8 @@ class Panel:
         self.copperLayerCount = None
         self.renderedMousebiteCounter = 0
         self.zonesToRefill = pcbnew.ZONES()
+        # Zones filled by KiKit on save with their area and clearance
+        self.prefilledZones: List[Tuple[pcbnew.ZONE, Union[Polygon, MultiPolygon], KiLength]] = []
         self.pageSize: Union[None, str, Tuple[int, int]] = None
 
         self.annotationReader: AnnotationReader = AnnotationReader.getDefault()
@@ -526,11 +728,23 @@ class Panel:
         self.chamferWidth: Optional[KiLength] = None
         self.chamferHeight: Optional[KiLength] = None
 
+    def loadFootprint(self, library: str, name: str) -> pcbnew.FOOTPRINT:
+        """
+        Return a new copy of a footprint from the library. The footprint is
+        loaded from the library only once, then its copies are made.
+        """
+        key = (library, name)
+        prototype = self.footprintPrototypes.get(key)
+        if prototype is None:
+            prototype = pcbnew.FootprintLoad(library, name)
+            self.footprintPrototypes[key] = prototype
+        return duplicateItem(prototype)
+
     def reportError(self, position: KiPoint, message: str) -> None:
         """
         Reports a non-fatal error. The error is marked and rendered to the panel
         """
-        footprint = pcbnew.FootprintLoad(KIKIT_LIB, "Error")
+        footprint = self.loadFootprint(KIKIT_LIB, "Error")
         footprint.SetPosition(position)
         for x in footprint.GraphicalItems():
             if not isinstance(x, pcbnew.PCB_TEXTBOX):
@@ -555,15 +769,161 @@ class Panel:
         pro files.
         """
         panelEdges = self.boardSubstrate.serialize(reconstructArcs)
-        boardsEdges = self._getRefillEdges(reconstructArcs)
-
         for e in panelEdges:
             e.SetWidth(edgeWidth)
-        for e in boardsEdges:
-            e.SetWidth(edgeWidth)
 
         self._validateVCuts()
         vcuts = self._renderVCutH() + self._renderVCutV()
+        self._fillPrefilledZones([area for _, area in vcuts if area is not None])
+
+        if refillAllZones or len(self.zonesToRefill) > 0:
+            self._saveWithRefill(panelEdges, vcuts, refillAllZones,
+                                 reconstructArcs, edgeWidth)
+        else:
+            self._saveWithoutRefill(panelEdges, vcuts)
+
+        # There are some properties of the board inaccessible from the Python
+        # API. Let's modify the project files directly. Note that this has to be
+        # done after the board is saved
+        self._adjustPageSize()
+        self.makeLayersVisible() # as they are not in KiCAD 6
+        self.transferProjectSettings()
+        self.writeCustomDrcRules()
+
+    def _fillPrefilledZones(self, keepouts: List[Polygon]) -> None:
+        """
+        Fill the zones registered via prefillZone. The copper keeps clearance
+        from pads, holes, tracks, vias, copper drawings and other copper zones
+        of the panel and it avoids the keepouts as well as the copper pour
+        keepouts present on the board.
+        """
+        if len(self.prefilledZones) == 0:
+            return
+        layers = {zone.GetLayer() for zone, _, _ in self.prefilledZones}
+        obstacles: Dict[int, List[Polygon]] = {layer: [] for layer in layers}
+        def shape(item: pcbnew.BOARD_ITEM, layer: int) -> Union[Polygon, MultiPolygon]:
+            # Polygonize the copper of the item the same way the KiCAD zone
+            # filler does
+            polygons = pcbnew.SHAPE_POLY_SET()
+            if isV6():
+                item.TransformShapeWithClearanceToPolygon(polygons, layer, 0,
+                    fromMm(0.005), pcbnew.ERROR_INSIDE)
+            else:
+                item.TransformShapeToPolygon(polygons, layer, 0,
+                    fromMm(0.005), pcbnew.ERROR_INSIDE)
+            return shapePolyToShapely(polygons)
+        def hole(item: Union[pcbnew.PAD, pcbnew.PCB_VIA], diameter: KiLength) -> Polygon:
+            return Point(item.GetPosition()[0], item.GetPosition()[1]).buffer(diameter / 2)
+
+        for footprint in self.board.GetFootprints():
+            for pad in footprint.Pads():
+                # Holes are cleared on all copper layers. Oval holes are
+                # approximated by a circle of their larger size.
+                drill = max(pad.GetDrillSizeX(), pad.GetDrillSizeY())
+                for layer in layers:
+                    if pad.IsOnLayer(layer):
+                        obstacles[layer].append(shape(pad, layer))
+                    if drill > 0:
+                        obstacles[layer].append(hole(pad, drill))
+            for item in footprint.GraphicalItems():
+                if item.GetLayer() in layers:
+                    obstacles[item.GetLayer()].append(shape(item, item.GetLayer()))
+        for item in self.board.GetDrawings():
+            if item.GetLayer() in layers:
+                obstacles[item.GetLayer()].append(shape(item, item.GetLayer()))
+        for track in self.board.GetTracks():
+            if isinstance(track, pcbnew.PCB_VIA):
+                drill = hole(track, track.GetDrillValue())
+                for layer in layers:
+                    if track.IsOnLayer(layer):
+                        obstacles[layer].append(shape(track, layer))
+                    # The drill of a via spanning only some layers has to be
+                    # cleared on the others as well
+                    obstacles[layer].append(drill)
+            elif track.GetLayer() in layers:
+                if isinstance(track, pcbnew.PCB_ARC):
+                    obstacle = shape(track, track.GetLayer())
+                else:
+                    obstacle = LineString([(track.GetStart()[0], track.GetStart()[1]),
+                                           (track.GetEnd()[0], track.GetEnd()[1])]) \
+                        .buffer(track.GetWidth() / 2)
+                obstacles[track.GetLayer()].append(obstacle)
+        prefilled = {zone.m_Uuid.AsString() for zone, _, _ in self.prefilledZones}
+        layerKeepouts = {layer: list(keepouts) for layer in layers}
+        for zone in self.board.Zones():
+            if zone.GetIsRuleArea():
+                if zone.GetDoNotAllowCopperPour():
+                    outline = shapePolyToShapely(zone.Outline())
+                    for layer in layers:
+                        if zone.IsOnLayer(layer):
+                            layerKeepouts[layer].append(outline)
+                continue
+            if zone.m_Uuid.AsString() in prefilled:
+                continue
+            for layer in layers:
+                if zone.IsOnLayer(layer):
+                    obstacles[layer].append(shapePolyToShapely(zone.Outline()))
+        trees = {layer: STRtree(obstacles[layer]) for layer in layers}
+
+        for zone, area, clearance in self.prefilledZones:
+            layer = zone.GetLayer()
+            fill = zoneFill(area, trees[layer], layerKeepouts[layer],
+                            clearance, zone.GetMinThickness())
+            filledPolys = shapelyToShapePoly(MultiPolygon(
+                [g for g in listGeometries(fill) if isinstance(g, Polygon)]))
+            try:
+                filledPolys.Fracture()
+            except TypeError: # Older KiCAD requires the polygon mode
+                filledPolys.Fracture(pcbnew.SHAPE_POLY_SET.PM_FAST)
+            zone.SetFilledPolysList(layer, filledPolys)
+            zone.SetIsFilled(True)
+            zone.SetNeedRefill(False)
+
+    def _saveWithoutRefill(self, panelEdges: List[pcbnew.PCB_SHAPE],
+                           vcuts: List[Tuple[Any, Optional[Polygon]]]) -> None:
+        """
+        Save the panel when no zones have to be refilled. In that case we don't
+        need the original board edges and we can render the panel edges right
+        away, so the board is saved only once.
+        """
+        # Board edges are replaced by the panel edges in the output, just like
+        # the refill path does
+        originalEdges = [e for e in self.board.GetDrawings()
+            if e.GetLayer() == Layer.Edge_Cuts and
+               not isinstance(e, (pcbnew.PCB_DIMENSION_BASE, pcbnew.PCB_TEXT))]
+        for edge in originalEdges:
+            self.board.Remove(edge)
+
+        addedItems = []
+        for cut, clearanceArea in vcuts:
+            self.board.Add(cut)
+            addedItems.append(cut)
+            if clearanceArea is not None:
+                addedItems.append(self.addKeepout(clearanceArea))
+        for edge in panelEdges:
+            self.board.Add(edge)
+            addedItems.append(edge)
+
+        self.board.Save(self.filename)
+
+        for item in addedItems:
+            self.board.Remove(item)
+        for edge in originalEdges:
+            self.board.Add(edge)
+
+    def _saveWithRefill(self, panelEdges: List[pcbnew.PCB_SHAPE],
+                        vcuts: List[Tuple[Any, Optional[Polygon]]],
+                        refillAllZones: bool, reconstructArcs: bool,
+                        edgeWidth: KiLength) -> None:
+        """
+        Save the panel and refill its zones. The zones are filled against the
+        outlines of the individual boards, therefore, we render them first and
+        replace them by the panel edges after the refill.
+        """
+        boardsEdges = self._getRefillEdges(reconstructArcs)
+        for e in boardsEdges:
+            e.SetWidth(edgeWidth)
+
         keepouts = []
         for cut, clearanceArea in vcuts:
             self.board.Add(cut)
@@ -574,6 +934,9 @@ class Panel:
         # - first, we render original board edges and save the board (to
         #   propagate all the design rules from project files)
         # - then we load the board, fill polygons and render panel edges.
+        # The zone filler needs the design rules, which are initialized from
+        # the project files only when the board is loaded, so the in-memory
+        # board cannot be used for the refill.
 
         for edge in boardsEdges:
             self.board.Add(edge)
@@ -593,9 +956,6 @@ class Panel:
         # Remove V-cuts keepouts
         for keepout in keepouts:
             self.board.Remove(keepout)
-        # Remove edges
-        for edge in panelEdges:
-            self.board.Remove(edge)
 
         # Handle zone refilling in a separate board
         fillBoard = pcbnew.LoadBoard(self.filename)
@@ -625,15 +985,6 @@ class Panel:
 
         fillBoard.Save(self.filename)
 
-        # There are some properties of the board inaccessible from the Python
-        # API. Let's modify the project files directly. Note that this has to be
-        # done after the board is saved
-        self._adjustPageSize()
-        self.makeLayersVisible() # as they are not in KiCAD 6
-        self.transferProjectSettings()
-        self.writeCustomDrcRules()
-
-
     def _getRefillEdges(self, reconstructArcs: bool):
         """
         Builds a list of edges that represent boards outlines and panel
@@ -764,7 +1115,7 @@ class Panel:
 
         return assignment
 
-    def _inheritNetClasses(self, board, netRenamer):
+    def _inheritNetClasses(self, source: SourceBoard, netRenamer):
         """
         KiCADhas broken API for net classes. Therefore, we have to load and save
         the net classes manually in the project file.
@@ -773,16 +1124,14 @@ class Panel:
         patterns instead. The code below tries to cover both cases in a
         non-conflicting way.
         """
-        proFilename = os.path.splitext(board.GetFileName())[0]+'.kicad_pro'
-        try:
-            with open(proFilename, encoding="utf-8") as f:
-                project = json.load(f)
-        except FileNotFoundError:
+        if source.project is None:
             # If the source board doesn't contain project, there's nothing to
             # inherit.
             return
+        # The net classes are renamed in place, don't spoil the cached project
+        project = deepcopy(source.project)
 
-        boardNetsNames = collectNetNames(board)
+        boardNetsNames = source.netNames
         netClassPatterns = [
             (p["netclass"], p["pattern"])
             for p in project["net_settings"].get("netclass_patterns", [])
@@ -816,7 +1165,7 @@ class Panel:
                 "pattern": netRenamer(pattern)
             })
 
-    def _inheriCustomDrcRules(self, board, netRenamer):
+    def _inheriCustomDrcRules(self, source: SourceBoard, netRenamer):
         """
         KiCADhas has no API for custom DRC rules, so we read the source files
         instead.
@@ -826,18 +1175,12 @@ class Panel:
         - if the rule contains condition, we identify boolean operations equals
           and not equals for net names and net classes and rename the nets
         """
-        druFilename = os.path.splitext(board.GetFileName())[0]+'.kicad_dru'
-        try:
-            if os.stat(druFilename).st_size == 0:
-                # If the source board doesn't contain DRU files, there's nothing to
-                # inherit.
-                return
-            with open(druFilename, encoding="utf-8") as f:
-                rules = parseSexprListF(f)
-        except FileNotFoundError:
+        if source.customDrcRules is None:
             # If the source board doesn't contain DRU files, there's nothing to
             # inherit.
             return
+        # The rules are renamed in place, don't spoil the cached ones
+        rules = deepcopy(source.customDrcRules)
 
         conditionRegex = re.compile(r"((A|B)\.Net(Class|Name)\s*?(==|!=)\s*?)'(.*?)'")
 
@@ -934,7 +1277,8 @@ class Panel:
         # we have to read out the page size from the source board and save it so
         # we can recover it.
         with open(board.GetFileName(), "r", encoding="utf-8") as f:
-            tree = parseSexprF(f, limit=10) # Introduce limit to speed up parsing
+            # We need only the board name and the first paper node
+            tree = parseSexprF(f, limit=2, nodeFilter=hasName("paper", "page"))
         self._inheritedPageDimensions = getPageDimensionsFromAst(tree)
 
     def setPageSize(self, size: Union[str, Tuple[int, int]] ) -> None:
@@ -1027,11 +1371,10 @@ class Panel:
             raise RuntimeError("Board rotation has to be passed as EDA_ANGLE, not a number")
 
 
-        board = LoadBoard(str(filename))
+        source = self._loadSourceBoard(filename, bakeText)
+        board = source.board
         if inheritDrc:
             self.sourcePaths.add(filename)
-        if bakeText:
-            bakeTextVars(board)
 
         thickness = board.GetDesignSettings().GetBoardThickness()
         if len(self.substrates) == 0:
@@ -1058,13 +1401,13 @@ class Panel:
         bId = len(self.substrates)
         netRenamerFn = lambda x: netRenamer(bId, x)
 
-        self._inheritNetClasses(board, netRenamerFn)
-        self._inheriCustomDrcRules(board, netRenamerFn)
+        self._inheritNetClasses(source, netRenamerFn)
+        self._inheriCustomDrcRules(source, netRenamerFn)
 
-        renameNets(board, netRenamerFn)
-        if refRenamer is not None:
-            renameRefs(board, lambda x: refRenamer(len(self.substrates), x))
+        netMapping = self._addRenamedNets(source.netNames, netRenamerFn)
 
+        # The source board is shared by all placements of it, therefore, we
+        # never modify its items; we transform their copies instead.
         drawings = collectItems(board.GetDrawings(), enlargedSourceArea)
         footprints = collectFootprints(board.GetFootprints(), enlargedSourceArea)
         tracks = collectItems(board.GetTracks(), enlargedSourceArea)
@@ -1075,9 +1418,35 @@ class Panel:
             nonlocal itemMapping
             itemMapping[old] = new
 
+        def place(item, yieldMapping=None):
+            newItem = duplicateItem(item, yieldMapping)
+            newItem.Rotate(originPoint, rotationAngle)
+            newItem.Move(translation)
+            return newItem
+
+        sourceEdges = [edge for edge in drawings if isBoardEdge(edge)]
+        for sourceFootprint in footprints:
+            sourceEdges += [x for x in sourceFootprint.GraphicalItems()
+                            if x.GetLayer() == Layer.Edge_Cuts]
+        try:
+            # The substrate is built once per source board and rotation, each
+            # placement only translates it.
+            template = source.substrate(sourceEdges, enlargedSourceArea,
+                                        originPoint, rotationAngle)
+        except substrate.PositionError as e:
+            raise substrate.PositionError(f"{filename}: {e.origMessage}", e.point)
+
         edges = []
         annotations = []
-        for footprint in footprints:
+        connectedItems = []
+        for sourceFootprint in footprints:
+            isAnnotation = interpretAnnotations and \
+                self.annotationReader.isAnnotation(sourceFootprint)
+            footprint = duplicateItem(sourceFootprint,
+                                      None if isAnnotation else yieldMapping)
+            if refRenamer is not None:
+                ref = footprint.Reference().GetText()
+                footprint.Reference().SetText(refRenamer(bId, ref))
             # We want to rotate text within footprints by the requested amount,
             # even if that text has "keep upright" attribute set. For that,
             # the attribute must be first removed without changing the
@@ -1091,26 +1460,25 @@ class Panel:
             footprint.Rotate(originPoint, rotationAngle)
             footprint.Move(translation)
             edges += removeCutsFromFootprint(footprint)
-            if interpretAnnotations and self.annotationReader.isAnnotation(footprint):
+            if isAnnotation:
                 annotations.extend(self.annotationReader.convertToAnnotation(footprint))
             else:
-                appendItem(self.board, footprint, yieldMapping)
+                self.board.Add(footprint)
+                connectedItems.extend(footprint.Pads())
         for track in tracks:
-            track.Rotate(originPoint, rotationAngle)
-            track.Move(translation)
-            appendItem(self.board, track, yieldMapping)
+            track = place(track, yieldMapping)
+            self.board.Add(track)
+            connectedItems.append(track)
         for zone in zones:
-            zone.Rotate(originPoint, rotationAngle)
-            zone.Move(translation)
-            appendItem(self.board, zone, yieldMapping)
-        for netId in board.GetNetInfo().NetsByNetcode():
-            self.board.Add(board.GetNetInfo().GetNetItem(netId))
+            zone = place(zone, yieldMapping)
+            self.board.Add(zone)
+            connectedItems.append(zone)
+        # Net codes are resolved via the parent board, so remap them only after
+        # the items are added to the panel
+        remapNets(connectedItems, netMapping)
 
         # Treat drawings differently since they contains board edges
-        for drawing in drawings:
-            drawing.Rotate(originPoint, rotationAngle)
-            drawing.Move(translation)
-        edges += [edge for edge in drawings if isBoardEdge(edge)]
+        edges += [place(edge) for edge in drawings if isBoardEdge(edge)]
         otherDrawings = [edge for edge in drawings if not isBoardEdge(edge)]
 
         def makeRevertTransformation(angle, origin, translation):
@@ -1119,48 +1487,60 @@ class Panel:
             return f
 
         revertTransformation = makeRevertTransformation(rotationAngle, originPoint, translation)
-        try:
-            s = Substrate(edges, 0,
-                revertTransformation=revertTransformation)
-            self.boardSubstrate.union(s)
-            self.substrates.append(s)
-            self.substrates[-1].annotations = annotations
-        except substrate.PositionError as e:
-            point = undoTransformation(e.point, rotationAngle, originPoint, translation)
-            raise substrate.PositionError(f"{filename}: {e.origMessage}", point)
+        s = template.transformed(fromDegrees(0), originPoint, translation,
+                                 revertTransformation=revertTransformation)
+        self.boardSubstrate.union(s)
+        self.substrates.append(s)
+        self.substrates[-1].annotations = annotations
         for drawing in otherDrawings:
-            appendItem(self.board, drawing, yieldMapping)
+            self.board.Add(place(drawing, yieldMapping))
 
-        try:
-            exclusions = readBoardDrcExclusions(board)
-            for drcE in exclusions:
-                try:
-                    newObjects = [self.board.GetItem(pcbnew.KIID(itemMapping[x.m_Uuid.AsString()])) for x in drcE.objects]
-                    assert all(x is not None for x in newObjects)
-                    newPosition = doTransformation(drcE.position, rotationAngle, originPoint, translation)
-                    self.drcExclusions.append(DrcExclusion(
-                        drcE.type,
-                        newPosition,
-                        newObjects
-                    ))
-                except KeyError as e:
-                    continue # We cannot handle DRC exclusions with board edges
-        except FileNotFoundError:
-            pass # Ignore boards without a project
-
-        self.projectVars.append(self._readProjectVariables(board))
+        for drcE in source.drcExclusions:
+            try:
+                newObjects = [self.board.GetItem(pcbnew.KIID(itemMapping[x.m_Uuid.AsString()])) for x in drcE.objects]
+                assert all(x is not None for x in newObjects)
+                newPosition = doTransformation(drcE.position, rotationAngle, originPoint, translation)
+                self.drcExclusions.append(DrcExclusion(
+                    drcE.type,
+                    newPosition,
+                    newObjects
+                ))
+            except KeyError as e:
+                continue # We cannot handle DRC exclusions with board edges
+
+        self.projectVars.append(dict(source.projectVariables))
+        self.boardInstances.append((str(filename), itemMapping))
 
         return findBoundingBox(edges)
 
-    def _readProjectVariables(self, board: pcbnew.BOARD) -> Dict[str, str]:
-        projectPath = self.getProFilepath(board.GetFileName())
-        try:
-            with open(projectPath, "r", encoding="utf-8") as f:
-                project = json.load(f)
-                return project.get("text_variables", {})
-        except Exception:
-            # We silently ignore missing project (e.g, the source is a v5 board)
-            return {}
+    def _loadSourceBoard(self, filename: Union[str, Path], bakeText: bool) -> SourceBoard:
+        """
+        Return the source board for given file. The board is loaded only once
+        and reused until the file changes.
+        """
+        key = SourceBoard.cacheKey(filename, bakeText)
+        source = self.sourceBoards.get(key)
+        if source is None:
+            source = SourceBoard(filename, bakeText)
+            self.sourceBoards[key] = source
+        return source
+
+    def _addRenamedNets(self, netNames: Iterable[str],
+                        renamer: Callable[[str], str]) -> Dict[str, Any]:
+        """
+        Add nets to the panel under new names given by renamer. Return mapping
+        from the original names to the panel nets.
+        """
+        netinfo = self.board.GetNetInfo()
+        mapping = { "": netinfo.GetNetItem("") }
+        for name in netNames:
+            newName = renamer(name)
+            newNet = netinfo.GetNetItem(newName)
+            if newNet is None:
+                newNet = pcbnew.NETINFO_ITEM(self.board, newName)
+                self.board.Add(newNet)
+            mapping[name] = newNet
+        return mapping
 
     def appendSubstrate(self, substrate: ToPolygonGeometry) -> None:
         """
@@ -1471,9 +1851,7 @@ class Panel:
         maxHeight - if the panel doesn't meet this height, error is set
         """
         self.makeFrame(widthH, widthV, hspace, vspace, minWidth, minHeight, maxWidth, maxHeight)
-        boardSlot = GeometryCollection()
-        for s in self.substrates:
-            boardSlot = boardSlot.union(s.exterior())
+        boardSlot = substratesExterior(self.substrates)
         boardSlot = boardSlot.buffer(slotwidth, join_style="mitre")
         frameBody = box(*self.boardSubstrate.bounds()).difference(boardSlot)
         self.appendSubstrate(frameBody)
@@ -1581,7 +1959,8 @@ class Panel:
         Take a list of cuts and perform mouse bites. The cuts can be prolonged
         to
         """
-        bloatedSubstrate = prep(self.boardSubstrate.substrates.buffer(SHP_EPSILON))
+        bloatedSubstrate = self.boardSubstrate.substrates.buffer(SHP_EPSILON)
+        shapely.prepare(bloatedSubstrate)
         offsetCuts = []
         for cut in cuts:
             cut = cut.simplify(SHP_EPSILON) # Remove self-intersecting geometry
@@ -1589,19 +1968,15 @@ class Panel:
             offsetCut = cut.parallel_offset(offset, "left")
             offsetCuts.append(offsetCut)
 
-        for cut in listGeometries(shapely.ops.unary_union(offsetCuts).simplify(SHP_EPSILON)):
-            self.renderedMousebiteCounter += 1
-            length = cut.length
-            count = int(length / spacing) + 1
-            for i in range(count):
-                if count == 1:
-                    hole = cut.interpolate(0.5, normalized=True)
-                else:
-                    hole = cut.interpolate( i * length / (count - 1) )
-                if bloatedSubstrate.intersects(hole):
-                    self.addNPTHole(toKiCADPoint((hole.x, hole.y)), diameter,
-                                    ref=f"KiKit_MB_{self.renderedMousebiteCounter}_{i+1}",
-                                    excludedFromPos=True)
+        cuts = list(listGeometries(shapely.ops.unary_union(offsetCuts).simplify(SHP_EPSILON)))
+        holes, cutIndices, holeIndices = mouseBitePositions(cuts, spacing)
+        valid = shapely.intersects(bloatedSubstrate, holes)
+        coords = shapely.get_coordinates(holes[valid])
+        refs = [f"KiKit_MB_{self.renderedMousebiteCounter + c + 1}_{h + 1}"
+                for c, h in zip(cutIndices[valid], holeIndices[valid])]
+        self.renderedMousebiteCounter += len(cuts)
+        self.addNPTHoles([toKiCADPoint((x, y)) for x, y in coords], diameter,
+                         refs=refs, excludedFromPos=True)
 
     def makeCutsToLayer(self, cuts, layer=Layer.Cmts_User, prolongation=fromMm(0), width=fromMm(0.3)):
         """
@@ -1632,8 +2007,25 @@ class Panel:
         Add a drilled non-plated hole to the position (`VECTOR2I`) with given
         diameter. The paste option allows to place the hole on the paste layers.
         """
-        footprint = pcbnew.FootprintLoad(KIKIT_LIB, "NPTH")
-        footprint.SetPosition(position)
+        self.addNPTHoles([position], diameter, paste,
+                         refs=None if ref is None else [ref],
+                         excludedFromPos=excludedFromPos,
+                         solderMaskMargin=solderMaskMargin)
+
+    def addNPTHoles(self, positions: List[VECTOR2I], diameter: KiLength,
+                    paste: bool=False, refs: Optional[List[str]]=None,
+                    excludedFromPos: bool=False,
+                    solderMaskMargin: Optional[KiLength] = None,
+    ) -> None:
+        """
+        Add drilled non-plated holes of the same diameter to the positions. The
+        hole footprint is set up only once and then copied for each position.
+        The optional refs give a reference for each of the holes. See
+        addNPTHole for the other parameters.
+        """
+        if len(positions) == 0:
+            return
+        footprint = self.loadFootprint(KIKIT_LIB, "NPTH")
         for pad in footprint.Pads():
             pad.SetDrillSize(toKiCADPoint((diameter, diameter)))
             pad.SetSize(toKiCADPoint((diameter, diameter)))
@@ -1644,15 +2036,19 @@ class Panel:
                 layerSet.AddLayer(Layer.F_Paste)
                 layerSet.AddLayer(Layer.B_Paste)
                 pad.SetLayerSet(layerSet)
-        if ref is not None:
-            footprint.SetReference(ref)
         if hasattr(footprint, "SetExcludedFromPosFiles"): # KiCAD 6 doesn't support this attribute
             footprint.SetExcludedFromPosFiles(excludedFromPos)
         if hasattr(footprint, "SetExcludedFromBOM"):
             footprint.SetExcludedFromBOM(True)
         if hasattr(footprint, "SetBoardOnly"):
             footprint.SetBoardOnly(True)
-        self.board.Add(footprint)
+        for i, position in enumerate(positions):
+            # The set-up footprint itself is used for the last hole
+            hole = footprint if i == len(positions) - 1 else duplicateItem(footprint)
+            hole.SetPosition(position)
+            if refs is not None:
+                hole.SetReference(refs[i])
+            self.board.Add(hole)
 
     def addFiducial(self, position: VECTOR2I, copperDiameter: KiLength,
                     openingDiameter: KiLength, bottom: bool = False,
@@ -1664,7 +2060,7 @@ class Panel:
         fiducial can also have an opening on the stencil. This is enabled by
         paste = True.
         """
-        footprint = pcbnew.FootprintLoad(KIKIT_LIB, "Fiducial")
+        footprint = self.loadFootprint(KIKIT_LIB, "Fiducial")
         # As of V6, the footprint first needs to be added to the board,
         # then we can change its properties. Otherwise, it misses parent pointer
         # and KiCAD crashes.
@@ -1769,16 +2165,40 @@ class Panel:
             s.annotations = list(
                 filter(lambda x: not isinstance(x, TabAnnotation), s.annotations))
 
-    def buildTabsFromAnnotations(self, fillet: KiLength) -> List[LineString]:
+    def buildTabsFromAnnotations(self, fillet: KiLength, jobs: int = 1) -> List[LineString]:
         """
         Given annotations for the individual substrates, create tabs for them.
         Tabs are appended to the panel, cuts are returned.
 
+        If jobs > 1, the tabs of the individual substrates are constructed in a
+        pool of processes. This pays off for many tabs with fillets. The result
+        is the same as for the serial construction.
+
         Expects that a valid partition line is assigned to the the panel.
         """
+        constructed = [None] * len(self.substrates)
+        pending = [i for i, s in enumerate(self.substrates) if len(s.annotations) > 0]
+        if jobs > 1 and len(pending) > 1:
+            args = []
+            for i in pending:
+                s = self.substrates[i]
+                s.orient()
+                args.append((shapely.to_wkb(s.substrates),
+                             shapely.to_wkb(s.partitionLine),
+                             [((a.origin[0], a.origin[1]), (a.direction[0], a.direction[1]),
+                               a.width, a.maxLength) for a in s.annotations]))
+            with ProcessPoolExecutor(min(jobs, len(pending))) as executor:
+                results = executor.map(_constructTabsWkb, *zip(*args),
+                                       [fillet] * len(pending))
+                for i, result in zip(pending, results):
+                    constructed[i] = [r if isinstance(r, TabError) else
+                                      tuple(None if x is None else shapely.from_wkb(x) for x in r)
+                                      for r in result]
+
         tabs, cuts = [], []
-        for s in self.substrates:
-            t, c = buildTabs(self, s, s.partitionLine, s.annotations, fillet)
+        for s, sConstructed in zip(self.substrates, constructed):
+            t, c = buildTabs(self, s, s.partitionLine, s.annotations, fillet,
+                             sConstructed)
             tabs.extend(t)
             cuts.extend(c)
         self.boardSubstrate.union(tabs)
@@ -1980,7 +2400,7 @@ class Panel:
     def copperFillNonBoardAreas(self, clearance: KiLength=fromMm(1),
             layers: List[Layer]=[Layer.F_Cu,Layer.B_Cu], hatched: bool=False,
             strokeWidth: KiLength=fromMm(1), strokeSpacing: KiLength=fromMm(1),
-            orientation: KiAngle=fromDegrees(45)) -> None:
+            orientation: KiAngle=fromDegrees(45), prefill: bool=False) -> None:
         """
         This function is deprecated, please, use panel features instead.
 
@@ -1990,6 +2410,9 @@ class Panel:
 
         By default, fills top and bottom layer, but you can specify any other
         copper layer that is enabled.
+
+        If prefill is set, solid fill is computed by KiKit (see prefillZone)
+        instead of KiCAD zone filler. Hatched fill is always left to KiCAD.
         """
         _, _, maxx, maxy = self.panelBBox()
         if not self.boardSubstrate.isSinglePiece():
@@ -1999,8 +2422,7 @@ class Panel:
         increaseZonePriorities(self.board)
 
         zoneArea = self.boardSubstrate.exterior()
-        for substrate in self.substrates:
-            zoneArea = zoneArea.difference(substrate.exterior().buffer(clearance))
+        zoneArea = zoneArea.difference(substratesExterior(self.substrates, clearance))
 
         geoms = [zoneArea] if isinstance(zoneArea, Polygon) else zoneArea.geoms
 
@@ -2022,7 +2444,10 @@ class Panel:
                 zoneContainer = zoneContainer.Duplicate()
                 zoneContainer.SetLayer(l)
                 self.board.Add(zoneContainer)
-                self.zonesToRefill.append(zoneContainer)
+                if prefill and not hatched:
+                    self.prefillZone(zoneContainer, g, clearance)
+                else:
+                    self.zonesToRefill.append(zoneContainer)
 
     def locateBoard(inputFilename, expandDist=None):
         """
@@ -2040,6 +2465,16 @@ class Panel:
             return boardArea
         sourceArea=expandRect(boardArea, expandDist)
 
+    def prefillZone(self, zone: pcbnew.ZONE, area: Union[Polygon, MultiPolygon],
+                    clearance: KiLength) -> None:
+        """
+        Fill the zone with area when the panel is saved, instead of running
+        KiCAD zone filler. The fill keeps clearance from pads, holes, tracks,
+        vias, copper drawings and other copper zones of the panel. Suitable for
+        zones outside of the boards, e.g., for filling the frame with copper.
+        """
+        self.prefilledZones.append((zone, area, clearance))
+
     def addKeepout(self, area, noTracks=True, noVias=True, noCopper=True):
         """
         Add a keepout area to all copper layers. Area is a shapely
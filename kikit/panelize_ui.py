@@ -221,8 +221,8 @@ def panelize(input, output, preset, plugin, layout, source, tabs, cuts, framing,
                 f.write(ki.dumpPreset(preset))
     except Exception as e:
         import sys
-        from kikit.panelize import NonFatalErrors
-        if isinstance(e, NonFatalErrors):
+        from kikit.panelize import NonFatalErrors, PanelDrcErrors
+        if isinstance(e, (NonFatalErrors, PanelDrcErrors)):
             sys.stderr.write(str(e) + "\n")
         else:
             sys.stderr.write("An error occurred: " + str(e) + "\n")
@@ -311,6 +311,8 @@ def doPanelization(input, output, preset, plugins=[]):
     if panel.hasErrors():
         raise NonFatalErrors(panel.errors)
 
+    ki.runPanelDrc(preset["post"], panel)
+
 
 @click.command()
 @click.argument("input", type=click.Path(dir_okay=False))
@@ -292,20 +292,20 @@ def buildTabs(preset, panel, substrates, boundarySubstrates):
             panel.buildTabAnnotationsFixed(properties["hcount"],
                 properties["vcount"], properties["hwidth"], properties["vwidth"],
                 properties["mindistance"], boundarySubstrates)
-            return panel.buildTabsFromAnnotations(properties["fillet"])
+            return panel.buildTabsFromAnnotations(properties["fillet"], properties["jobs"])
         if type == "spacing":
             panel.clearTabsAnnotations()
             panel.buildTabAnnotationsSpacing(properties["spacing"],
                 properties["hwidth"], properties["vwidth"], boundarySubstrates)
-            return panel.buildTabsFromAnnotations(properties["fillet"])
+            return panel.buildTabsFromAnnotations(properties["fillet"], properties["jobs"])
         if type == "corner":
             panel.clearTabsAnnotations()
             panel.buildTabAnnotationsCorners(properties["width"])
-            return panel.buildTabsFromAnnotations(properties["fillet"])
+            return panel.buildTabsFromAnnotations(properties["fillet"], properties["jobs"])
         if type == "full":
             return panel.buildFullTabs(properties["cutout"], properties["patchcorners"])
         if type == "annotation":
-            return panel.buildTabsFromAnnotations(properties["fillet"])
+            return panel.buildTabsFromAnnotations(properties["fillet"], properties["jobs"])
         if type == "plugin":
             pluginInst = properties["code"](preset, properties["arg"])
             return pluginInst.buildTabs(panel)
@@ -596,6 +596,7 @@ def buildCopperfill(preset, panel):
                 clearance=preset["clearance"],
                 edgeclearance=preset["edgeclearance"],
                 layers=preset["layers"],
+                prefill=preset["prefill"]
             ))
         if type == "hatched":
             panel.apply(HatchedCopperFill(
@@ -613,7 +614,8 @@ def buildCopperfill(preset, panel):
                 layers=preset["layers"],
                 diameter=preset["diameter"],
                 space=preset["spacing"],
-                threshold=preset["threshold"]
+                threshold=preset["threshold"],
+                prefill=preset["prefill"]
             ))
     except KeyError as e:
         raise PresetError(f"Missing parameter '{e}' in section 'postprocessing'")
@@ -659,6 +661,26 @@ def runUserScript(preset, panel):
     userScriptModule.kikitPostprocess(panel, preset["scriptarg"])
 
 
+def runPanelDrc(preset, panel):
+    """
+    Check DRC of the saved panel. Each distinct board is checked only once and
+    its violations are mapped to all its placements.
+    """
+    try:
+        if not preset["drc"]:
+            return
+        from kikit.drc import runPanelImpl
+        from kikit.drc_ui import ReportLevel
+        violations = []
+        failed = runPanelImpl(panel, True, True, False, ReportLevel.error,
+                              preset["drcjobs"], violations.append)
+        if failed:
+            raise PanelDrcErrors("The panel was saved, but it has DRC violations:\n\n"
+                                 + "\n".join(violations))
+    except KeyError as e:
+        raise PresetError(f"Missing parameter '{e}' in section 'postprocessing'")
+
+
 def buildDebugAnnotation(preset, panel):
     """
     Add debug annotation to the panel
@@ -402,6 +402,10 @@ TABS_SECTION = {
         typeIn(["fixed", "spacing", "corner", "annotation", "plugin"]),
         "Specify tab fillet radius (experimental)"
     ),
+    "jobs": SNaturalNum(
+        typeIn(["fixed", "spacing", "corner", "annotation", "plugin"]),
+        "Number of processes used for constructing the tabs"
+    ),
     "code": SPlugin(
         plugin.TabsPlugin,
         typeIn(["plugin"]),
@@ -689,6 +693,10 @@ COPPERFILL_SECTION = {
     "threshold": SPercent(
         typeIn(["hex"]),
         "Remove fragments smaller than threshold"
+    ),
+    "prefill": SBool(
+        typeIn(["solid", "hex"]),
+        "Compute the fill in KiKit instead of running KiCAD zone filler"
     )
 }
 
@@ -732,6 +740,14 @@ POST_SECTION = {
     "edgewidth": SLength(
         always(),
         "Specify line width for the Edge.Cuts of the panel"
+    ),
+    "drc": SBool(
+        always(),
+        "Run DRC of the saved panel, checking each distinct board only once"
+    ),
+    "drcjobs": SNaturalNum(
+        always(),
+        "Number of processes used for checking DRC of the boards"
     )
 }
 
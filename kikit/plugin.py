@@ -171,7 +171,8 @@ class TabsPlugin:
         """
         panel.clearTabsAnnotations()
         self.buildTabAnnotations(panel)
-        return panel.buildTabsFromAnnotations(self.preset["tabs"]["fillet"])
+        return panel.buildTabsFromAnnotations(self.preset["tabs"]["fillet"],
+                                              self.preset["tabs"]["jobs"])
 
 class CutsPlugin:
     """
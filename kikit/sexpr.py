@@ -1,5 +1,7 @@
+import gc
+import re
 from io import StringIO
-from typing import Callable, Dict, Iterable, Optional, Union
+from typing import Callable, Dict, Iterable, Optional, Tuple, Union
 
 # Simple white-space aware S-Expression parser (parsing and dumping yields the
 # same result). Might not support all features of S-expression, but should be
@@ -338,35 +340,149 @@ def readSexpr(stream, limit=None):
 
     return expr
 
-def parseSexprF(sourceStream, limit=None, buffer_size=4096):
-    stream = Stream(sourceStream, buffer_size=buffer_size)
-    lw = stream.readUntilEndOfWhitespace()
-    s = readSexpr(stream, limit=limit)
-    s.leadingWhitespace = lw
-    s.trailingOuterWhitespace = stream.readUntilEndOfWhitespace()
-    return s
+# The bulk parser below works on the whole text at once. It tokenizes by a
+# single regular expression and it gives exactly the same tree as readSexpr
+# over a Stream. Each token consists of the leading whitespace and one of:
+# unquoted atom, opening parenthesis, closing parenthesis, quoted string or an
+# unterminated quote.
+_TOKEN = re.compile(r'''(\s*)(?:([^\s()"][^\s()]*)|(\()|(\))|"([^"\\]*(?:\\.[^"\\]*)*)"|("))''',
+                    re.DOTALL)
+# A run of atoms and whitespace without any parenthesis; used for skipping
+# subtrees without tokenizing them one by one
+_ATOMS = re.compile(r'''(?:\s*(?:[^\s()"][^\s()]*|"[^"\\]*(?:\\.[^"\\]*)*"))*\s*''',
+                    re.DOTALL)
+_WHITESPACE = re.compile(r"\s*")
+_WHITESPACE_WITH_COMMENTS = re.compile(r"(?:\s|#[^\n]*\n?)*")
+
+NodeFilter = Callable[[str], bool]
+
+def skipSexprText(text: str, position: int) -> int:
+    """
+    Skip SExpression starting at given position without building it. Returns
+    the position right after it.
+    """
+    depth = 0
+    length = len(text)
+    while True:
+        position = _ATOMS.match(text, position).end()
+        if position >= length:
+            raise ParseError("Unexpected end of file within expression")
+        c = text[position]
+        position += 1
+        if c == "(":
+            depth += 1
+        elif c == ")":
+            depth -= 1
+            if depth == 0:
+                return position
+        else:
+            raise ParseError("Unexpected end of file in quoted string")
 
-def parseSexprS(s, limit=None, buffer_size=4096):
-    return parseSexprF(StringIO(s), limit=limit, buffer_size=buffer_size)
+def readSexprText(text: str, position: int = 0, limit: Optional[int] = None,
+                  nodeFilter: Optional[NodeFilter] = None) -> Tuple[SExpr, int]:
+    """
+    Reads SExpression from text starting at given position. Returns the
+    expression and the position right after it. You can optionally try to
+    parse only the first n nodes by specifying limit; then the rest of the text
+    is captured as a trailing whitespace of the expression.
+
+    If nodeFilter is specified, top-level nodes whose name doesn't satisfy it
+    are skipped and left out of the result (together with their leading
+    whitespace). Such expression no longer serializes to the original text.
+    """
+    if not text.startswith("(", position):
+        raise ParseError(f"Expected '(', got {repr(text[position:position + 1])}")
+
+    # The tree is acyclic, so there is no point in letting the garbage
+    # collector repeatedly traverse the millions of nodes we allocate
+    gcEnabled = gc.isenabled()
+    gc.disable()
+    try:
+        root = SExpr()
+        expr = root
+        parents = []
+        count = 0
+        position += 1
+        match = _TOKEN.match(text, position)
+        while match is not None:
+            if limit is not None and not parents and count >= limit:
+                root.trailingWhitespace = text[match.start():]
+                root.complete = False
+                return root, len(text)
+            kind = match.lastindex
+            position = match.end()
+            if kind == 2:
+                expr.items.append(Atom(match.group(2), match.group(1)))
+                if not parents:
+                    count += 1
+            elif kind == 3:
+                if nodeFilter is not None and not parents:
+                    name = _TOKEN.match(text, position)
+                    if name is not None and name.lastindex in (2, 5) \
+                            and not nodeFilter(name.group(name.lastindex)):
+                        position = skipSexprText(text, position - 1)
+                        match = _TOKEN.match(text, position)
+                        continue
+                child = SExpr(None, match.group(1))
+                expr.items.append(child)
+                parents.append(expr)
+                expr = child
+            elif kind == 4:
+                expr.trailingWhitespace = match.group(1)
+                if not parents:
+                    return root, position
+                expr = parents.pop()
+                if not parents:
+                    count += 1
+            elif kind == 5:
+                expr.items.append(Atom(match.group(5), match.group(1), True))
+                if not parents:
+                    count += 1
+            else:
+                raise ParseError("Unexpected end of file in quoted string")
+            match = _TOKEN.match(text, position)
+        raise ParseError("Unexpected end of file within expression")
+    finally:
+        if gcEnabled:
+            gc.enable()
+
+def parseSexprF(sourceStream, limit=None, buffer_size=4096, nodeFilter=None):
+    # The bulk parser reads the whole source at once, buffer_size is kept for
+    # compatibility
+    return parseSexprS(sourceStream.read(), limit=limit, nodeFilter=nodeFilter)
+
+def parseSexprS(s, limit=None, buffer_size=4096, nodeFilter=None):
+    lw = _WHITESPACE.match(s).group()
+    expr, position = readSexprText(s, len(lw), limit=limit, nodeFilter=nodeFilter)
+    expr.leadingWhitespace = lw
+    expr.trailingOuterWhitespace = _WHITESPACE.match(s, position).group()
+    return expr
 
 def parseSexprListF(sourceStream, limit=None, buffer_size=4096):
+    text = sourceStream.read()
     sexprs = []
-    stream = Stream(sourceStream, buffer_size=buffer_size)
-
-    while not stream.isEOF():
-        lw = readWhitespaceWithComments(stream)
-
-        # Check if we've reached EOF after reading whitespace
-        if stream.isEOF():
+    position = 0
+    while position < len(text):
+        lw = _WHITESPACE_WITH_COMMENTS.match(text, position).group()
+        position += len(lw)
+        if position >= len(text):
             break
 
-        s = readSexpr(stream, limit=limit)
+        s, position = readSexprText(text, position, limit=limit)
         s.leadingWhitespace = lw
-        s.trailingOuterWhitespace = readWhitespaceWithComments(stream)
+        s.trailingOuterWhitespace = _WHITESPACE_WITH_COMMENTS.match(text, position).group()
+        position += len(s.trailingOuterWhitespace)
         sexprs.append(s)
 
     return sexprs
 
+def hasName(*names: str) -> NodeFilter:
+    """
+    Node filter accepting nodes with any of the given names
+    """
+    names = frozenset(names)
+    return names.__contains__
+
 AstNode = Union[SExpr, Atom]
 
 def isElement(name: str) -> Callable[[AstNode], bool]:
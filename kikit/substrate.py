@@ -1,8 +1,9 @@
 from shapely import geometry
 from shapely.geometry import (Polygon, MultiPolygon, LineString,
-    MultiLineString, LinearRing, Point)
+    MultiLineString, LinearRing, Point, MultiPoint)
 from shapely.geometry.collection import GeometryCollection
 from shapely.ops import orient, unary_union, split, nearest_points
+from shapely.prepared import prep
 import shapely
 import json
 import numpy as np
@@ -34,11 +35,15 @@ class TabError(RuntimeError):
     def __init__(self, origin, direction, hints):
         self.origin = origin
         self.direction = direction
+        self.hints = hints
         message = "Cannot create tab; possible causes:\n"
         for hint in hints:
             message += f"- {hint}\n"
         super().__init__(message)
 
+    def __reduce__(self):
+        return (TabError, (self.origin, self.direction, self.hints))
+
 class TabFilletError(RuntimeError):
     pass
 
@@ -249,14 +254,28 @@ def shapePolyToShapely(p: pcbnew.SHAPE_POLY_SET) \
         outline = shapeLinechainToList(kOutline)
         holes = []
         for hIdx in range(p.HoleCount(pIdx)):
-            kHole = p.Hole(hIdx)
-            assert kHole.isClosed()
+            kHole = p.Hole(pIdx, hIdx)
+            assert kHole.IsClosed()
             holes.append(shapeLinechainToList(kHole))
         polygons.append(Polygon(outline, holes=holes))
     if len(polygons) == 1:
         return polygons[0]
     return MultiPolygon(polygons=polygons)
 
+def shapelyToShapePoly(geometry: Union[Polygon, MultiPolygon]) \
+        -> pcbnew.SHAPE_POLY_SET:
+    """
+    Take a shapely polygon or multipolygon and create SHAPE_POLY_SET out of it.
+    """
+    p = pcbnew.SHAPE_POLY_SET()
+    for polygon in listGeometries(geometry):
+        if polygon.is_empty:
+            continue
+        p.AddOutline(linestringToKicad(polygon.exterior))
+        for hole in polygon.interiors:
+            p.AddHole(linestringToKicad(hole))
+    return p
+
 
 def toShapely(ring, geometryList):
     """
@@ -516,6 +535,188 @@ class CircleFitCandidates:
         return np.array((xc, yc)), r
 
 
+def fitCircles(xs: np.ndarray, ys: np.ndarray, xSums: np.ndarray,
+               ySums: np.ndarray, counts: Optional[np.ndarray] = None,
+               maxIter: int = 10) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Batched version of CircleFitCandidates._fitCircle. Each row of xs and ys
+    holds one point set; xSums and ySums are the sums of the rows accumulated
+    in the point order. If counts are given, only the first counts[i] points of
+    the i-th row are considered. The arithmetic mirrors the scalar version
+    operation by operation.
+
+    Returns an array of centers (shape (m, 2)) and an array of radii.
+    """
+    if counts is None:
+        n = xs.shape[1]
+        mask = True
+    else:
+        n = counts
+        mask = np.arange(xs.shape[1]) < counts[:, None]
+
+    xMean = xSums / n
+    yMean = ySums / n
+
+    Xi = np.where(mask, xs - xMean[:, None], 0)
+    Yi = np.where(mask, ys - yMean[:, None], 0)
+    Zi = Xi * Xi + Yi * Yi
+
+    Mxy = (Xi * Yi).sum(axis=1) / n
+    Mxx = (Xi * Xi).sum(axis=1) / n
+    Myy = (Yi * Yi).sum(axis=1) / n
+    Mxz = (Xi * Zi).sum(axis=1) / n
+    Myz = (Yi * Zi).sum(axis=1) / n
+    Mzz = (Zi * Zi).sum(axis=1) / n
+
+    Mz = Mxx + Myy
+    Cov_xy = Mxx * Myy - Mxy * Mxy
+    Var_z = Mzz - Mz * Mz
+
+    A2 = 4 * Cov_xy - 3 * Mz * Mz - Mzz
+    A1 = Var_z * Mz + 4. * Cov_xy * Mz - Mxz * Mxz - Myz * Myz
+    A0 = Mxz * (Mxz * Myy - Myz * Mxy) + Myz * (Myz * Mxx - Mxz * Mxy) - Var_z * Cov_xy
+    A22 = A2 + A2
+
+    # Newton iteration for all the rows at once; a row stops updating once it
+    # hits one of the termination conditions of the scalar version
+    Y = A0.copy()
+    X = np.zeros_like(A0)
+    active = np.ones(len(A0), dtype=bool)
+    with np.errstate(divide="ignore", invalid="ignore", over="ignore"):
+        for i in range(maxIter):
+            Dy = A1 + X * (A22 + 16. * (X ** 2))
+            xnew = X - Y / Dy
+            active &= (xnew != X) & np.isfinite(xnew)
+            ynew = A0 + xnew * (A1 + xnew * (A2 + 4. * xnew * xnew))
+            active &= ~(np.abs(ynew) >= np.abs(Y))
+            if not active.any():
+                break
+            X = np.where(active, xnew, X)
+            Y = np.where(active, ynew, Y)
+
+        det = X ** 2 - X * Mz + Cov_xy
+        Xcenter = (Mxz * (Myy - X) - Myz * Mxy) / det / 2.
+        Ycenter = (Myz * (Mxx - X) - Mxz * Mxy) / det / 2.
+
+        centers = np.stack((Xcenter + xMean, Ycenter + yMean), axis=1)
+        radii = np.sqrt(np.abs(Xcenter ** 2 + Ycenter ** 2 + Mz))
+    return centers, radii
+
+def chainsFitCircles(xs: np.ndarray, ys: np.ndarray, centers: np.ndarray,
+                     radii: np.ndarray, tolerance: float,
+                     counts: Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    Batched version of CircleFitCandidates._doLinesFitCircle. Each row of xs
+    and ys is a polyline (optionally limited to the first counts[i] points);
+    decide for each row whether all its segments lie within tolerance from the
+    corresponding circle.
+    """
+    if counts is None:
+        pointMask, segmentMask = True, True
+    else:
+        pointMask = np.arange(xs.shape[1]) < counts[:, None]
+        segmentMask = pointMask[:, 1:]
+    cx = centers[:, 0:1]
+    cy = centers[:, 1:2]
+    r = radii[:, None]
+    with np.errstate(divide="ignore", invalid="ignore", over="ignore"):
+        pointsOff = np.abs(np.sqrt((xs - cx) ** 2 + (ys - cy) ** 2) - r) > tolerance
+
+        # The extreme of a segment occurs either in one of the endpoints or in
+        # the projection of center of the circle to the line (if it lies on the
+        # segment).
+        sx, sy = xs[:, :-1], ys[:, :-1]
+        abx, aby = xs[:, 1:] - sx, ys[:, 1:] - sy
+        t = ((cx - sx) * abx + (cy - sy) * aby) / (abx * abx + aby * aby)
+        onSegment = ~((t < 0) | (t > 1))
+        px, py = sx + t * abx, sy + t * aby
+        projectionOff = np.abs(np.sqrt((px - cx) ** 2 + (py - cy) ** 2) - r) > tolerance
+    return ~(pointsOff & pointMask).any(axis=1) & \
+           ~(onSegment & projectionOff & segmentMask).any(axis=1)
+
+def findArcRuns(coords: np.ndarray, tolerance: float, minRadius: float,
+                radiusLimit: float = fromMm(1000)) \
+        -> List[Tuple[int, int, Optional[Tuple[np.ndarray, float]]]]:
+    """
+    Split a sequence of points into arcs and line segments. Returns a list of
+    runs (start, end, circle); circle is None for line segments (then end is
+    start + 1) or (center, radius) for an arc spanning coords[start:end + 1].
+
+    The runs are the same as when greedily growing CircleFitCandidates from
+    each point. However, whether an arc can start at a given point is decided
+    for the whole array at once and the arcs are grown in batches.
+    """
+    coords = np.asarray(coords, dtype=float)
+    count = len(coords)
+    runs: List[Tuple[int, int, Optional[Tuple[np.ndarray, float]]]] = []
+
+    # Candidate arcs need at least 5 points, fit them for all starts at once
+    windowCount = max(0, count - 4)
+    if windowCount > 0:
+        windows = np.arange(windowCount)[:, None] + np.arange(5)
+        wxs, wys = coords[windows, 0], coords[windows, 1]
+        wxSums = wxs[:, 0] + wxs[:, 1] + wxs[:, 2] + wxs[:, 3] + wxs[:, 4]
+        wySums = wys[:, 0] + wys[:, 1] + wys[:, 2] + wys[:, 3] + wys[:, 4]
+        wCenters, wRadii = fitCircles(wxs, wys, wxSums, wySums)
+        arcStarts = chainsFitCircles(wxs, wys, wCenters, wRadii, tolerance) \
+                    & (wRadii < radiusLimit)
+
+    i = 0
+    while i < count:
+        if i < windowCount and arcStarts[i]:
+            length, circle = _growArc(coords, i, (wCenters[i], wRadii[i]),
+                                      tolerance, radiusLimit)
+            if circle[1] > minRadius:
+                runs.append((i, i + length - 1, circle))
+                i += length - 1
+                continue
+        runs.append((i, i + 1, None))
+        i += 1
+    return runs
+
+def _growArc(coords: np.ndarray, start: int, circle: Tuple[np.ndarray, float],
+             tolerance: float, radiusLimit: float) \
+        -> Tuple[int, Tuple[np.ndarray, float]]:
+    """
+    Extend an arc of 5 points starting at coords[start] as long as the points
+    fit a circle. Returns the number of points and the final circle.
+
+    Whether a point is accepted depends only on the fit with and without it,
+    so we evaluate the prefixes in chunks of doubling size and take the first
+    rejected one.
+    """
+    points = coords[start:]
+    xSums, ySums = np.cumsum(points[:, 0]), np.cumsum(points[:, 1])
+    length = 5
+    while length < len(points):
+        counts = np.arange(length + 1, min(len(points), 2 * length) + 1)
+        chunk = points[:counts[-1]]
+        xs = np.broadcast_to(chunk[:, 0], (len(counts), len(chunk)))
+        ys = np.broadcast_to(chunk[:, 1], (len(counts), len(chunk)))
+        centers, radii = fitCircles(xs, ys, xSums[counts - 1], ySums[counts - 1], counts)
+
+        prevCenters = np.vstack((circle[0], centers[:-1]))
+        prevRadii = np.append(circle[1], radii[:-1])
+        with np.errstate(invalid="ignore"):
+            moved = (np.sqrt(np.sum((centers - prevCenters) ** 2, axis=1)) > tolerance) \
+                    | (np.abs(radii - prevRadii) > tolerance)
+        lastXs = np.stack((chunk[counts - 2, 0], chunk[counts - 1, 0]), axis=1)
+        lastYs = np.stack((chunk[counts - 2, 1], chunk[counts - 1, 1]), axis=1)
+        fits = chainsFitCircles(lastXs, lastYs, centers, radii, tolerance)
+        if moved.any():
+            fits[moved] = chainsFitCircles(xs[moved], ys[moved], centers[moved],
+                                           radii[moved], tolerance, counts[moved])
+        accepted = fits & (radii < radiusLimit)
+
+        rejected = np.flatnonzero(~accepted)
+        if len(rejected) > 0:
+            grown = rejected[0]
+            if grown > 0:
+                circle = centers[grown - 1], radii[grown - 1]
+            return length + grown, circle
+        circle = centers[-1], radii[-1]
+        length = counts[-1]
+    return length, circle
 
 def liesOnSegment(start, end, point, tolerance=fromMm(0.01)):
     """
@@ -594,6 +795,15 @@ def closestIntersectionPoint(origin, direction, outline, maxDistance):
             raise TypeError(f"intersection() returned an unsupported datatype: {geom.__class__.__name__}")
     return min([(g, origin.distance(g)) for g in geoms], key=lambda t: t[1])[0]
 
+def rotateGeometry(geometry, angle: KiAngle, origin):
+    """
+    Rotate shapely geometry around origin in the same way KiCAD rotates board
+    items. KiCAD's y-axis points down, hence, the rotation is in the opposite
+    direction than in shapely.
+    """
+    return shapely.affinity.rotate(geometry, -angle.AsDegrees(),
+                                   origin=(origin[0], origin[1]))
+
 def linestringToKicad(linestring):
     """
     Convert Shapely linestring to KiCAD's linechain
@@ -619,6 +829,59 @@ class Substrate:
         self.annotations = []
         self.revertTransformation = revertTransformation
 
+    @property
+    def substrates(self):
+        # Pieces added via union are merged lazily in a single cascaded union
+        # when the geometry is needed. Merging them one by one is quadratic.
+        if self._pending:
+            pieces = [self._substrates] + self._pending
+            self._pending = []
+            self._substrates = unary_union(pieces)
+        return self._substrates
+
+    @substrates.setter
+    def substrates(self, geometry):
+        self._substrates = geometry
+        self._pending = []
+        self._bounds = None
+        self._index = None
+
+    def _spatialIndex(self):
+        """
+        Return a list of the substrate pieces, an STRtree over them and the
+        prepared substrate geometry. The index is built lazily and dropped
+        whenever the geometry changes.
+        """
+        substrates = self.substrates
+        if self._index is None:
+            pieces = list(listGeometries(substrates))
+            self._index = (pieces, shapely.STRtree(pieces), prep(substrates))
+        return self._index
+
+    def transformed(self, rotation: KiAngle, origin: KiPoint,
+                    translation: KiPoint, revertTransformation=None) -> "Substrate":
+        """
+        Return a new substrate with the geometry rotated around origin and then
+        translated - i.e., the transformation Panel.appendBoard applies to
+        board items. This is significantly cheaper than reconstructing the
+        substrate from transformed board edges. The orientation is preserved,
+        annotations and the partition line are not copied.
+        """
+        geometry = self.substrates
+        bounds = self._bounds
+        if rotation.AsDegrees() % 360 != 0:
+            geometry = rotateGeometry(geometry, rotation, origin)
+            bounds = None
+        geometry = shapely.affinity.translate(geometry, translation[0], translation[1])
+
+        s = Substrate([], revertTransformation=revertTransformation)
+        s.substrates = geometry
+        s.oriented = self.oriented
+        if bounds is not None:
+            s._bounds = (bounds[0] + translation[0], bounds[1] + translation[1],
+                         bounds[2] + translation[0], bounds[3] + translation[1])
+        return s
+
     def backToSource(self, point):
         """
         Return a point in the source form (if a reverse transformation was set)
@@ -641,7 +904,9 @@ class Substrate:
         """
         Return shapely bounds of substrates
         """
-        return self.substrates.bounds
+        if self._bounds is None:
+            self._bounds = self.substrates.bounds
+        return self._bounds
 
     def interiors(self):
         """
@@ -653,7 +918,7 @@ class Substrate:
         """
         Return a mid point of the bounding box
         """
-        minx, miny, maxx, maxy = self.substrates.bounds
+        minx, miny, maxx, maxy = self.bounds()
         return ((minx + maxx) // 2, (miny + maxy) // 2)
 
     def union(self, other):
@@ -661,13 +926,18 @@ class Substrate:
         Appends a substrate, polygon or list of polygons. If there is a common
         intersection, with existing substrate, it will be merged into a single
         substrate.
+
+        The merge is deferred until the geometry is accessed, so appending many
+        pieces one by one is cheap.
         """
         if isinstance(other, list):
-            self.substrates = unary_union([self.substrates] + other)
+            self._pending.extend(other)
         elif isinstance(other, Substrate):
-            self.substrates = unary_union([self.substrates, other.substrates])
+            self._pending.append(other.substrates)
         else:
-            self.substrates = unary_union([self.substrates, other])
+            self._pending.append(other)
+        self._bounds = None
+        self._index = None
         self.oriented = False
 
     def cut(self, piece):
@@ -707,20 +977,17 @@ class Substrate:
         rearranged = np.roll(coords, -max_dist_index, axis=0)
         coords = np.vstack((rearranged, rearranged[0]))
 
+        if reconstructArcs:
+            runs = findArcRuns(coords, TOLERANCE, fromMm(0.25))
+        else:
+            runs = [(i, i + 1, None) for i in range(len(coords))]
+
         segments = []
-        i = 0
-        while i < len(coords):
-            j = i # in the case the following cycle never happens
-            candidateCircle = CircleFitCandidates(tolerance=TOLERANCE)
-            if reconstructArcs:
-                for j in range(i, len(coords)):
-                    # Just walk edge segments until there is an arc
-                    if not candidateCircle.addPoint(coords[j]):
-                        break
-
-            if candidateCircle.foundCircle is not None and candidateCircle.foundCircle[1] > fromMm(0.25):
-                center, radius = candidateCircle.foundCircle
-                start, end, mid = candidateCircle.start, candidateCircle.end, candidateCircle.mid
+        for runStart, runEnd, circle in runs:
+            if circle is not None:
+                center, radius = circle
+                start, end = coords[runStart], coords[runEnd]
+                mid = coords[runStart + (runEnd - runStart + 1) // 2]
 
                 # We prefer to preserve arc start and end points, adjust center
                 # so it is true:
@@ -754,15 +1021,12 @@ class Substrate:
                     arcMiddle = min(middleCandidates, key=lambda c: np.linalg.norm(c - mid))
 
                     segments.append(self._constructArc(toKiCADPoint(start), toKiCADPoint(arcMiddle), toKiCADPoint(end)))
-
-                i += len(candidateCircle) - 1
             else:
                 # Yield a line
-                a = coords[i]
-                b = coords[(i + 1) % len(coords)]
+                a = coords[runStart]
+                b = coords[runEnd % len(coords)]
                 if np.linalg.norm(np.array(a) - np.array(b)) > SHP_EPSILON:
                     segments.append(self._constructEdgeSegment(a, b))
-                i += 1
         return segments
 
     def _constructEdgeSegment(self, a, b):
@@ -798,7 +1062,7 @@ class Substrate:
         """
         Return bounding box as BOX2I
         """
-        minx, miny, maxx, maxy = self.substrates.bounds
+        minx, miny, maxx, maxy = self.bounds()
         return pcbnew.BOX2I(
             pcbnew.VECTOR2I(int(minx), int(miny)),
             pcbnew.VECTOR2I(int(maxx - minx), int(maxy - miny)))
@@ -845,17 +1109,23 @@ class Substrate:
         adding of geometry is more efficient.
         """
         self.orient()
+        pieces, tree, prepared = self._spatialIndex()
 
-        if self.substrates.contains(Point(origin)) and not self.substrates.boundary.contains(Point(origin)):
+        if prepared.contains(Point(origin)) and not self.substrates.boundary.contains(Point(origin)):
             raise TabError(origin, direction, ["Tab annotation is placed inside the board. It has to be on edge or outside the board."])
 
         origin = np.array(origin, dtype=np.float64)
         direction = np.around(normalize(direction), 4)
         origin -= direction * float(SHP_EPSILON)
-        for geom in listGeometries(self.substrates):
+        sideOriginA = origin + makePerpendicular(direction) * width / 2
+        sideOriginB = origin - makePerpendicular(direction) * width / 2
+        # Only the pieces within the area swept by the tab sides can be hit
+        sweep = MultiPoint([sideOriginA, sideOriginB,
+                            sideOriginA + direction * maxHeight,
+                            sideOriginB + direction * maxHeight])
+        for pieceIdx in np.sort(tree.query(sweep)):
+            geom = pieces[pieceIdx]
             try:
-                sideOriginA = origin + makePerpendicular(direction) * width / 2
-                sideOriginB = origin - makePerpendicular(direction) * width / 2
                 boundary = geom.exterior
                 splitPointA = closestIntersectionPoint(sideOriginA, direction,
                     boundary, maxHeight)
@@ -972,17 +1242,16 @@ class Substrate:
         """
         if isinstance(self.substrates, Polygon):
             return
-        mainland = []
-        for i, substrate in enumerate(self.substrates.geoms):
-            ismainland = True
-            for j, otherSubstrate in enumerate(self.substrates.geoms):
-                if j == i:
-                    continue
-                if Polygon(otherSubstrate.exterior.coords).contains(substrate):
-                    ismainland = False
-                    break
-            if ismainland:
-                mainland.append(substrate)
+        pieces = np.array(self.substrates.geoms)
+        # Index the outlines (i.e., the pieces with holes filled) and query
+        # for the outlines each piece lies within. The queried pieces are
+        # prepared by shapely, so only candidates with overlapping bounding
+        # boxes are tested.
+        outlines = shapely.polygons(shapely.get_exterior_ring(pieces))
+        tree = shapely.STRtree(outlines)
+        pieceIdx, outlineIdx = tree.query(pieces, predicate="within")
+        islands = set(pieceIdx[pieceIdx != outlineIdx].tolist())
+        mainland = [p for i, p in enumerate(pieces) if i not in islands]
         self.substrates = shapely.geometry.collection.GeometryCollection(mainland)
         self.oriented = False
 
@@ -0,0 +1,24 @@
+import time
+from typing import Callable, Iterable, Tuple
+
+def measure(fn: Callable[[], None], repeat: int = 3) -> float:
+    """
+    Run the function repeatedly and return the best wall time in seconds
+    """
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def report(title: str, rows: Iterable[Tuple[int, float, float]]) -> None:
+    """
+    Print a table comparing the reference and the current implementation for
+    given input sizes
+    """
+    print(title)
+    print(f"{'size':>8} {'reference [s]':>14} {'current [s]':>12} {'speedup':>8}")
+    for size, reference, current in rows:
+        print(f"{size:>8} {reference:>14.4f} {current:>12.4f} {reference / current:>7.1f}x")
+    print()
@@ -0,0 +1,95 @@
+"""
+Benchmarks of DRC report reading. Run via `python3 drc.py`.
+"""
+import io
+import os
+import re
+import sys
+from kikit.drc import (DrcReport, Violation, collectFingerprints, readReport,
+                       readBoardItem)
+from common import measure, report
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "..", "units"))
+from test_drc import FakeBoard, FakeFootprint, FakeItem
+
+def fakeBoard(padCount: int):
+    footprints = []
+    for i in range(padCount // 4):
+        x, y = 3 * (i % 300), 3 * (i // 300)
+        pads = [FakeItem(x + 0.5 * j, y, f"Pad {j + 1} [GND] of U{i} on F.Cu")
+                for j in range(4)]
+        footprints.append(FakeFootprint(x, y, f"U{i}", pads))
+    return FakeBoard(footprints, [])
+
+def fakeReport(board: FakeBoard, violations: int) -> str:
+    lines = ["** Drc report for board.kicad_pcb **",
+             f"** Found {violations} DRC violations **"]
+    step = max(1, len(board.footprints) // violations)
+    for footprint in board.footprints[::step][:violations]:
+        lines.append("[clearance]: Clearance violation")
+        lines.append("    Rule: netclass 'Default'; Severity: error")
+        for pad in footprint.pads[:2]:
+            x, y = pad.GetPosition()
+            lines.append(f"    @({x / 1e6:.4f} mm, {y / 1e6:.4f} mm): {pad.description}")
+    lines += ["** Found 0 unconnected pads **", "** Found 0 Footprint errors **",
+              "** End of Report **"]
+    return "\n".join(lines) + "\n"
+
+def referenceReadViolations(reportFile, fingerprints):
+    violations = []
+    line = reportFile.readline()
+    while True:
+        headerMatch = re.match(r'\[(.*)\]: (.*)\n', line)
+        if headerMatch is None:
+            break
+        line = reportFile.readline()
+        bodyMatch = re.match(r'\s*(.*); (Severity: )?(.*)', line)
+        if bodyMatch is None:
+            break
+        v = Violation(
+            type = headerMatch.group(1),
+            description = headerMatch.group(2),
+            rule = bodyMatch.group(1),
+            severity = bodyMatch.group(3))
+        line = reportFile.readline()
+        while line.startswith("    "):
+            v.objects.append(readBoardItem(line, fingerprints))
+            line = reportFile.readline()
+        violations.append(v)
+    return line, violations
+
+def referenceReadReport(reportFile, board):
+    """
+    The original implementation describing every item in the board
+    """
+    fingerprints = collectFingerprints(board)
+    drcV, unconnectedV, footprintV = [], [], []
+    line = reportFile.readline()
+    while True:
+        if len(line) == 0:
+            break
+        if re.match(r'\*\* Found \d+ DRC violations \*\*', line):
+            line, drcV = referenceReadViolations(reportFile, fingerprints)
+            continue
+        if re.match(r'\*\* Found \d+ unconnected pads \*\*', line):
+            line, unconnectedV = referenceReadViolations(reportFile, fingerprints)
+            continue
+        if re.match(r'\*\* Found \d+ Footprint errors \*\*', line):
+            line, footprintV = referenceReadViolations(reportFile, fingerprints)
+        line = reportFile.readline()
+    return DrcReport(drcV, unconnectedV, footprintV)
+
+def benchmarkReadReport():
+    rows = []
+    for padCount in [5000, 20000, 50000]:
+        board = fakeBoard(padCount)
+        text = fakeReport(board, 100)
+        assert readReport(io.StringIO(text), board) == \
+               referenceReadReport(io.StringIO(text), board)
+        rows.append((padCount,
+            measure(lambda: referenceReadReport(io.StringIO(text), board)),
+            measure(lambda: readReport(io.StringIO(text), board))))
+    report("readReport, 100 violations (pads)", rows)
+
+if __name__ == "__main__":
+    benchmarkReadReport()
@@ -0,0 +1,121 @@
+"""
+Benchmarks of schematic crawling. Run via `python3 eeschema.py`.
+"""
+import os
+import shutil
+import tempfile
+from copy import deepcopy
+from kikit.eeschema_v6 import (Symbol, SymbolInstance, SymbolView, collectSymbols,
+                               getField, getReference, loadSheets)
+from common import measure, report
+
+RESOURCES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "resources",
+                         "assembly_project_1_KiCAD7")
+
+SHEET = """
+  (sheet (at 0 0) (size 10 10)
+    (uuid {uuid})
+    (property "Sheetname" "Channel {idx}" (at 0 0 0))
+    (property "Sheetfile" "channel_{file}.kicad_sch" (at 0 0 0))
+  )
+"""
+
+WIRE = """
+  (wire (pts (xy {0} 69.85) (xy 106.68 {0}))
+    (stroke (width 0) (type default))
+    (uuid 00000000-0000-0000-0000-{0:012d})
+  )
+"""
+
+def buildHierarchy(directory: str, files: int, instances: int) -> str:
+    """
+    Build a root schematic instantiating given number of channel sheets that
+    are spread over given number of distinct files. Return the root filename.
+    """
+    with open(os.path.join(RESOURCES, "bottom_sheet.kicad_sch"), encoding="utf-8") as f:
+        channel = f.read()
+    channel = channel[:channel.rindex(")")] + "".join(WIRE.format(i) for i in range(3000)) + ")\n"
+    for i in range(files):
+        with open(os.path.join(directory, f"channel_{i}.kicad_sch"), "w", encoding="utf-8") as f:
+            f.write(channel)
+    for name in ["nested.kicad_sch", "bottom_sheet.kicad_sch"]:
+        shutil.copy(os.path.join(RESOURCES, name), directory)
+    with open(os.path.join(RESOURCES, "assembly_project_1_KiCAD7.kicad_sch"), encoding="utf-8") as f:
+        root = f.read()
+    sheets = "".join(SHEET.format(uuid=f"00000000-0000-0000-0000-{i:012d}", idx=i, file=i % files)
+                     for i in range(instances))
+    root = root[:root.rindex(")")] + sheets + ")\n"
+    rootName = os.path.join(directory, "root.kicad_sch")
+    with open(rootName, "w", encoding="utf-8") as f:
+        f.write(root)
+    return rootName
+
+class NoCache(dict):
+    """
+    Sheet cache that never stores anything; mimics the original crawl, which
+    parsed a sheet file on every instantiation
+    """
+    def __setitem__(self, key, value):
+        pass
+
+def benchmarkCrawl() -> None:
+    rows = []
+    for files in [1, 4, 8]:
+        with tempfile.TemporaryDirectory() as directory:
+            root = buildHierarchy(directory, files, 40)
+            reference = measure(lambda: collectSymbols(root, sheets=NoCache()), 1)
+            current = measure(lambda: collectSymbols(root, sheets=loadSheets(root)))
+            rows.append((files, reference, current))
+    report("Crawl of 40 sheet instances, no cache vs. cache (distinct files)", rows)
+
+def symbolsAndInstances(count: int):
+    symbols, instances = [], []
+    for i in range(count):
+        properties = {"Reference": f"R{i}", "Value": "10k", "Footprint": "R_0603",
+                      "Datasheet": "~", "LCSC": "C25804", "Manufacturer": "Yageo",
+                      "MPN": "RC0603FR-0710KL", "Tolerance": "1%"}
+        symbols.append(Symbol(uuid=str(i), path=f"/root/{i}", unit=1,
+                              lib_id="Device:R", properties=properties))
+        instances.append(SymbolInstance(symbol_path=f"/root/{i}", reference=f"R{i}",
+                                        unit=1, value="10k"))
+    return symbols, instances
+
+def referenceComponents(symbols, instances):
+    """
+    The original extractComponents, which deep-copied every symbol
+    """
+    symbolsDict = {x.path: x for x in symbols}
+    components = []
+    for inst in instances:
+        s = deepcopy(symbolsDict[inst.symbol_path])
+        if inst.reference is not None:
+            s.properties["Reference"] = inst.reference
+        if inst.value is not None:
+            s.properties["Value"] = inst.value
+        if inst.footprint is not None:
+            s.properties["Footprint"] = inst.footprint
+        if inst.unit is not None:
+            s.unit = inst.unit
+        components.append(s)
+    return components
+
+def currentComponents(symbols, instances):
+    symbolsDict = {x.path: x for x in symbols}
+    return [SymbolView(symbolsDict[inst.symbol_path], inst) for inst in instances]
+
+def useComponents(components) -> None:
+    for c in components:
+        getReference(c), getField(c, "Value"), getField(c, "LCSC")
+
+def benchmarkComponents() -> None:
+    rows = []
+    for count in [1000, 5000, 20000]:
+        symbols, instances = symbolsAndInstances(count)
+        reference = measure(lambda: useComponents(referenceComponents(symbols, instances)))
+        current = measure(lambda: useComponents(currentComponents(symbols, instances)))
+        rows.append((count, reference, current))
+    report("Component extraction and field access (components)", rows)
+
+if __name__ == "__main__":
+    benchmarkCrawl()
+    benchmarkComponents()
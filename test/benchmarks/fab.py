@@ -0,0 +1,134 @@
+"""
+Benchmarks of fabrication data export. Run via `python3 fab.py`.
+"""
+import csv
+import os
+import random
+import re
+import tempfile
+from kikit.eeschema_v6 import Symbol, SymbolInstance, SymbolView
+from kikit.fab.common import (CorrectionPattern, CorrectionPatternIndex, applyCorrectionPattern,
+                              getField, getReference, getUnit, naturalComponentKey)
+from kikit.fab import jlcpcb
+from common import measure, report
+
+class FakeFootprint:
+    """
+    Just enough of pcbnew.FOOTPRINT for looking up corrections
+    """
+    def __init__(self, name: str):
+        self.name = name
+
+    def GetFPID(self):
+        return self
+
+    def GetUniStringLibId(self):
+        return self.name
+
+def correctionPatterns(count: int):
+    """
+    Build a correction pattern file content with count patterns
+    """
+    return [CorrectionPattern(re.compile(f"^Lib_{i}:Package_{i}_.*"), re.compile(".*"), 0.1, 0.2, 90)
+            for i in range(count)]
+
+def footprints(count: int, patternCount: int, distinct: int = 200):
+    """
+    Build footprints with given number of distinct names; half of the names
+    have no matching pattern.
+    """
+    rnd = random.Random(0)
+    names = [f"Lib_{i % (2 * patternCount)}:Package_{i % (2 * patternCount)}_Variant"
+             for i in range(distinct)]
+    return [FakeFootprint(rnd.choice(names)) for _ in range(count)]
+
+def referenceCorrections(patterns, fps):
+    # The original collectPosData looked the correction up for X, Y and rotation
+    return [(applyCorrectionPattern(patterns, f), applyCorrectionPattern(patterns, f),
+             applyCorrectionPattern(patterns, f)) for f in fps]
+
+def currentCorrections(patterns, fps):
+    index = CorrectionPatternIndex(patterns)
+    return [applyCorrectionPattern(index, f) for f in fps]
+
+def benchmarkCorrections() -> None:
+    rows = []
+    for patternCount in [10, 100, 1000]:
+        patterns = correctionPatterns(patternCount)
+        fps = footprints(20000, patternCount)
+        reference = measure(lambda: referenceCorrections(patterns, fps), 1)
+        current = measure(lambda: currentCorrections(patterns, fps))
+        rows.append((patternCount, reference, current))
+    report("Corrections for 20k footprints (correction patterns)", rows)
+
+def bomComponents(count: int):
+    """
+    Build components of a large board: a few huge groups (decoupling
+    capacitors, pull-up resistors) and many small ones.
+    """
+    rnd = random.Random(0)
+    values = ["100n", "10k", "1u", "4k7"] + [f"Value{i}" for i in range(200)]
+    components = []
+    for i in range(count):
+        value = values[min(int(rnd.expovariate(0.5)), len(values) - 1)]
+        symbol = Symbol(unit=1, properties={"Reference": f"C{i}", "Value": value,
+                        "Footprint": "C_0402", "LCSC": f"LCSC_{value}"})
+        components.append(SymbolView(symbol, SymbolInstance(reference=f"C{i}")))
+    return components
+
+def referenceCollectBom(components, lscsFields, ignore):
+    """
+    The original jlcpcb.collectBom, which copied the group on every append
+    """
+    bom = {}
+    for c in components:
+        if getUnit(c) != 1:
+            continue
+        reference = getReference(c)
+        if reference.startswith("#PWR") or reference.startswith("#FL"):
+            continue
+        if reference in ignore:
+            continue
+        if getField(c, "JLCPCB_IGNORE") is not None and getField(c, "JLCPCB_IGNORE") != "":
+            continue
+        if hasattr(c, "in_bom") and not c.in_bom:
+            continue
+        if hasattr(c, "on_board") and not c.on_board:
+            continue
+        if hasattr(c, "dnp") and c.dnp:
+            continue
+        orderCode = None
+        for fieldName in lscsFields:
+            orderCode = getField(c, fieldName)
+            if orderCode is not None and orderCode.strip() != "":
+                break
+        cType = (getField(c, "Value"), getField(c, "Footprint"), orderCode)
+        bom[cType] = bom.get(cType, []) + [reference]
+    return bom
+
+def referenceBomToCsv(bomData, filename):
+    with open(filename, "w", newline="", encoding="utf-8") as csvfile:
+        writer = csv.writer(csvfile)
+        writer.writerow(["Comment", "Designator", "Footprint", "LCSC"])
+        for cType, references in bomData.items():
+            sortedReferences = sorted(references, key=naturalComponentKey)
+            for i in range(0, len(references), 100):
+                value, footprint, lcsc = cType
+                writer.writerow([value, ",".join(sortedReferences[i:i+100]), footprint, lcsc])
+
+def benchmarkBom() -> None:
+    rows = []
+    with tempfile.TemporaryDirectory() as directory:
+        filename = os.path.join(directory, "bom.csv")
+        for count in [2000, 5000, 20000]:
+            components = bomComponents(count)
+            reference = measure(lambda: referenceBomToCsv(
+                referenceCollectBom(components, ["LCSC"], []), filename), 1)
+            current = measure(lambda: jlcpcb.bomToCsv(
+                jlcpcb.collectBom(components, ["LCSC"], []), filename))
+            rows.append((count, reference, current))
+    report("JLCPCB BOM collection and export (components)", rows)
+
+if __name__ == "__main__":
+    benchmarkCorrections()
+    benchmarkBom()
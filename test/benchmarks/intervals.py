@@ -0,0 +1,54 @@
+"""
+Benchmarks of interval and box queries. Run via `python3 intervals.py`.
+"""
+import random
+from typing import Dict, List, Tuple
+from kikit.intervals import BoxNeighbors, Interval, IntervalList
+from common import measure, report
+
+def gridBoxes(count: int, seed: int = 0) -> Dict[int, Tuple[float, float, float, float]]:
+    """
+    Build count boxes arranged in a square grid with random sizes and gaps.
+    """
+    rnd = random.Random(seed)
+    side = int(count ** 0.5) + 1
+    boxes = {}
+    for i in range(count):
+        x, y = 10 * (i % side) + rnd.uniform(0, 2), 10 * (i // side) + rnd.uniform(0, 2)
+        boxes[i] = (x, y, x + rnd.uniform(2, 8), y + rnd.uniform(2, 8))
+    return boxes
+
+def referenceComputeQuery(list: List[Tuple[object, Interval, float]]) -> Dict[object, List[Tuple[object, IntervalList]]]:
+    """
+    The original implementation of BoxNeighbors._computeQuery
+    """
+    neighbors = {}
+    for i, (ident, interval, pos) in enumerate(list):
+        n: List[Tuple[object, IntervalList]] = []
+        rest = IntervalList([interval])
+        for j in range(i + 1, len(list)):
+            nIdent, nInterval, nPos = list[j]
+            shadow = rest.intersect(nInterval)
+            if shadow.trivial():
+                continue
+            n.append((nIdent, shadow))
+            rest = rest.difference(nInterval)
+            if rest.trivial():
+                break
+        neighbors[ident] = n
+    return neighbors
+
+class ReferenceBoxNeighbors(BoxNeighbors):
+    _computeQuery = staticmethod(referenceComputeQuery)
+
+def benchmarkBoxNeighbors() -> None:
+    rows = []
+    for count in [1000, 2500, 5000]:
+        boxes = gridBoxes(count)
+        reference = measure(lambda: ReferenceBoxNeighbors(boxes), 1)
+        current = measure(lambda: BoxNeighbors(boxes))
+        rows.append((count, reference, current))
+    report("BoxNeighbors construction (boxes)", rows)
+
+if __name__ == "__main__":
+    benchmarkBoxNeighbors()
@@ -0,0 +1,174 @@
+"""
+Benchmarks of panel construction. Rendering of mouse bites requires KiCad.
+Run via `python3 panel.py`.
+"""
+import os
+import tempfile
+import shapely
+import numpy as np
+from shapely.geometry import (GeometryCollection, LineString, MultiPolygon,
+                              Polygon, box)
+from shapely.ops import unary_union
+from shapely.prepared import prep
+from pcbnewTransition import pcbnew
+from kikit.common import fromMm, toKiCADPoint
+from kikit.panelize import (Panel, BasicGridPosition, mouseBitePositions,
+                            substratesExterior)
+from kikit.substrate import Substrate
+from kikit.panel_features.copperFill import HexCopperFill
+from common import measure, report
+
+RESOURCES = os.path.join(os.path.dirname(__file__), "..", "resources")
+
+class ReferencePanel(Panel):
+    """
+    Panel loading every footprint from the library, as it used to
+    """
+    def loadFootprint(self, library, name):
+        return pcbnew.FootprintLoad(library, name)
+
+def makePanel(panelClass, outputdir, rows, cols):
+    """
+    Build a grid of rows x cols boards with tabs and return the panel together
+    with its cuts
+    """
+    panel = panelClass(os.path.join(outputdir, "panel.kicad_pcb"))
+    panel.makeGrid(os.path.join(RESOURCES, "conn.kicad_pcb"), None, rows, cols,
+        toKiCADPoint((fromMm(100), fromMm(100))),
+        BasicGridPosition(fromMm(2), fromMm(2)))
+    panel.buildPartitionLineFromBB()
+    panel.buildTabAnnotationsFixed(2, 2, fromMm(3), fromMm(3), fromMm(0), [])
+    cuts = panel.buildTabsFromAnnotations(fromMm(0))
+    return panel, cuts
+
+def referenceHolePositions(cuts, substrate, spacing):
+    bloatedSubstrate = prep(substrate)
+    holes = []
+    for cut in cuts:
+        length = cut.length
+        count = int(length / spacing) + 1
+        for i in range(count):
+            if count == 1:
+                hole = cut.interpolate(0.5, normalized=True)
+            else:
+                hole = cut.interpolate(i * length / (count - 1))
+            if bloatedSubstrate.intersects(hole):
+                holes.append((hole.x, hole.y))
+    return holes
+
+def holePositions(cuts, substrate, spacing):
+    shapely.prepare(substrate)
+    holes, _, _ = mouseBitePositions(cuts, spacing)
+    return shapely.get_coordinates(holes[shapely.intersects(substrate, holes)])
+
+def benchmarkMouseBitePositions():
+    mm = fromMm(1)
+    rows = []
+    for count in [10, 32, 100]:
+        # A row of boards, each with a cut along its top and bottom edge
+        substrate = unary_union([box(20 * i * mm, 0, 20 * i * mm + 16 * mm, 16 * mm)
+                                 for i in range(count)]).buffer(fromMm(0.001))
+        cuts = []
+        for i in range(count):
+            x = 20 * i * mm
+            cuts.append(LineString([(x, -0.25 * mm), (x + 16 * mm, -0.25 * mm)]))
+            cuts.append(LineString([(x, 16.25 * mm), (x + 16 * mm, 16.25 * mm)]))
+        spacing = fromMm(0.8)
+        rows.append((count,
+            measure(lambda: referenceHolePositions(cuts, substrate, spacing)),
+            measure(lambda: holePositions(cuts, substrate, spacing))))
+    report("Mouse-bite hole positions, per-hole loop vs. vectorized (boards)", rows)
+
+def gridSubstrates(count):
+    """
+    Build count x count boards with a cut-out in a grid
+    """
+    mm = fromMm(1)
+    substrates = []
+    for i in range(count):
+        for j in range(count):
+            x, y = 20 * i * mm, 20 * j * mm
+            s = Substrate([])
+            s.union(box(x, y, x + 16 * mm, y + 16 * mm).difference(
+                box(x + 4 * mm, y + 4 * mm, x + 12 * mm, y + 12 * mm)))
+            substrates.append(s)
+    return substrates
+
+def referenceTightFrame(substrates, frame, slotwidth):
+    boardSlot = GeometryCollection()
+    for s in substrates:
+        boardSlot = boardSlot.union(s.exterior())
+    boardSlot = boardSlot.buffer(slotwidth, join_style="mitre")
+    return frame.difference(boardSlot)
+
+def tightFrame(substrates, frame, slotwidth):
+    boardSlot = substratesExterior(substrates)
+    boardSlot = boardSlot.buffer(slotwidth, join_style="mitre")
+    return frame.difference(boardSlot)
+
+def benchmarkTightFrame():
+    rows = []
+    for count in [4, 8, 16]:
+        substrates = gridSubstrates(count)
+        frame = box(-fromMm(5), -fromMm(5), 20 * count * fromMm(1), 20 * count * fromMm(1))
+        rows.append((count * count,
+            measure(lambda: referenceTightFrame(substrates, frame, fromMm(2))),
+            measure(lambda: tightFrame(substrates, frame, fromMm(2)))))
+    report("Tight frame, iterative vs. single union (boards)", rows)
+
+def referenceHexFill(fill, zoneArea):
+    horizontalSpacing = fill.space + np.sqrt(3) / 2 * fill.diameter
+    verticalSpacing = 3 / 4 * fill.diameter + np.sqrt(3) / 2 * fill.space
+    minx, miny, maxx, maxy = zoneArea.bounds
+    maxx += horizontalSpacing
+    maxy += horizontalSpacing
+    hexagons = []
+    y = miny
+    shifted = False
+    while y <= maxy:
+        x = minx - (horizontalSpacing / 2 if shifted else 0)
+        while x <= maxx:
+            hexagons.append(Polygon([
+                (x + fill.diameter / 2 * np.cos(np.pi / 6 + i / 3 * np.pi),
+                 y + fill.diameter / 2 * np.sin(np.pi / 6 + i / 3 * np.pi)) for i in range(6)
+            ]))
+            x += horizontalSpacing
+        y += verticalSpacing
+        shifted = not shifted
+    hexagons = MultiPolygon(hexagons).intersection(zoneArea)
+    baseHexArea = 3 * np.sqrt(3) * (fill.diameter / 2) ** 2 / 2
+    return [g for g in hexagons.geoms if g.area >= fill.threshold * baseHexArea]
+
+def hexFill(fill, zoneArea):
+    return fill._clipHexagons(fill._buildHexagons(zoneArea.bounds), zoneArea)
+
+def benchmarkHexFill():
+    fill = HexCopperFill(diameter=fromMm(1), space=fromMm(0.3))
+    rows = []
+    for count in [2, 4, 8]:
+        substrates = gridSubstrates(count)
+        zoneArea = box(-fromMm(5), -fromMm(5), 20 * count * fromMm(1), 20 * count * fromMm(1))
+        zoneArea = zoneArea.difference(substratesExterior(substrates, fromMm(1)))
+        rows.append((count * count,
+            measure(lambda: referenceHexFill(fill, zoneArea), 1),
+            measure(lambda: hexFill(fill, zoneArea), 1)))
+    report("Hex copper fill, per-hexagon vs. vectorized (boards)", rows)
+
+def benchmarkMouseBites():
+    rows = []
+    with tempfile.TemporaryDirectory() as outputdir:
+        for count in [2, 5, 10]:
+            reference, referenceCuts = makePanel(ReferencePanel, outputdir, count, count)
+            cached, cachedCuts = makePanel(Panel, outputdir, count, count)
+            rows.append((count * count,
+                measure(lambda: reference.makeMouseBites(referenceCuts,
+                    fromMm(0.5), fromMm(0.8)), 1),
+                measure(lambda: cached.makeMouseBites(cachedCuts,
+                    fromMm(0.5), fromMm(0.8)), 1)))
+    report("Mouse bites, footprint loaded per hole vs. cached (boards)", rows)
+
+if __name__ == "__main__":
+    benchmarkMouseBitePositions()
+    benchmarkTightFrame()
+    benchmarkHexFill()
+    benchmarkMouseBites()
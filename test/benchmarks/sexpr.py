@@ -0,0 +1,66 @@
+"""
+Benchmarks of S-expression parsing. Run via `python3 sexpr.py`.
+"""
+import os
+from io import StringIO
+from kikit.sexpr import Stream, hasName, parseSexprS, readSexpr
+from common import measure, report
+
+RESOURCES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "resources")
+
+def referenceParse(text: str):
+    """
+    The original character-by-character parser over a Stream
+    """
+    stream = Stream(StringIO(text))
+    lw = stream.readUntilEndOfWhitespace()
+    expr = readSexpr(stream)
+    expr.leadingWhitespace = lw
+    expr.trailingOuterWhitespace = stream.readUntilEndOfWhitespace()
+    return expr
+
+def realFiles():
+    """
+    Yield contents of the KiCad boards and schematics in the test resources and
+    of a large board made by repeating the body of a real one.
+    """
+    for name in ["assembly_project_1_KiCAD7/assembly_project_1_KiCAD7.kicad_sch",
+                 "assembly_project_1_KiCAD7/assembly_project_1_KiCAD7.kicad_pcb",
+                 "conn-fail-ignored-v9.kicad_pcb"]:
+        with open(os.path.join(RESOURCES, name), encoding="utf-8") as f:
+            yield f.read()
+    yield repeatedBody("conn-fail-ignored-v9.kicad_pcb", 50)
+
+def benchmarkParse() -> None:
+    rows = []
+    for text in realFiles():
+        assert str(parseSexprS(text)) == text
+        reference = measure(lambda: referenceParse(text), 1)
+        current = measure(lambda: parseSexprS(text))
+        rows.append((len(text), reference, current))
+    report("S-expression parsing (bytes)", rows)
+
+def repeatedBody(name: str, count: int) -> str:
+    """
+    Make a large document by repeating the body of a real one
+    """
+    with open(os.path.join(RESOURCES, name), encoding="utf-8") as f:
+        text = f.read()
+    body = text[text.index("(", 1):text.rindex(")")]
+    return text[:text.index("(", 1)] + count * body + ")\n"
+
+def benchmarkSelectiveParse() -> None:
+    rows = []
+    for name, nodes in [
+            ("assembly_project_1_KiCAD7/assembly_project_1_KiCAD7.kicad_sch",
+             hasName("uuid", "symbol", "sheet", "symbol_instances")),
+            ("conn-fail-ignored-v9.kicad_pcb", hasName("paper", "page"))]:
+        text = repeatedBody(name, 50)
+        full = measure(lambda: parseSexprS(text))
+        selective = measure(lambda: parseSexprS(text, nodeFilter=nodes))
+        rows.append((len(text), full, selective))
+    report("Selective S-expression parsing, full vs. filtered (bytes)", rows)
+
+if __name__ == "__main__":
+    benchmarkParse()
+    benchmarkSelectiveParse()
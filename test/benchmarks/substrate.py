@@ -0,0 +1,170 @@
+"""
+Benchmarks of substrate operations. Run via `python3 substrate.py`.
+"""
+import numpy as np
+from shapely.geometry import Point, Polygon, box
+from shapely.geometry.collection import GeometryCollection
+from kikit.common import fromMm
+from kikit.substrate import (CircleFitCandidates, NoIntersectionError, Substrate,
+                             TabError, biteBoundary, closestIntersectionPoint,
+                             findArcRuns, makePerpendicular, normalize, SHP_EPSILON)
+from kikit.common import listGeometries
+from common import measure, report
+
+mm = fromMm(1)
+
+def manyIslands(count: int):
+    """
+    Build substrate geometry consisting of count frames, each of them with an
+    island inside.
+    """
+    pieces = []
+    side = int(count ** 0.5) + 1
+    for i in range(count):
+        x, y = 10 * (i % side) * mm, 10 * (i // side) * mm
+        frame = box(x, y, x + 8 * mm, y + 8 * mm).difference(
+            box(x + 2 * mm, y + 2 * mm, x + 6 * mm, y + 6 * mm))
+        pieces += [frame, box(x + 3 * mm, y + 3 * mm, x + 5 * mm, y + 5 * mm)]
+    s = Substrate([])
+    s.union(pieces)
+    return s.substrates
+
+def substrateOf(geometry) -> Substrate:
+    s = Substrate([])
+    s.substrates = geometry
+    return s
+
+def referenceRemoveIslands(s: Substrate) -> None:
+    """
+    The original pairwise implementation of Substrate.removeIslands
+    """
+    mainland = []
+    for i, substrate in enumerate(s.substrates.geoms):
+        ismainland = True
+        for j, otherSubstrate in enumerate(s.substrates.geoms):
+            if j == i:
+                continue
+            if Polygon(otherSubstrate.exterior.coords).contains(substrate):
+                ismainland = False
+                break
+        if ismainland:
+            mainland.append(substrate)
+    s.substrates = GeometryCollection(mainland)
+
+def benchmarkRemoveIslands() -> None:
+    rows = []
+    for count in [50, 200, 500]:
+        geometry = manyIslands(count)
+        reference = measure(lambda: referenceRemoveIslands(substrateOf(geometry)), 1)
+        current = measure(lambda: substrateOf(geometry).removeIslands())
+        rows.append((2 * count, reference, current))
+    report("Substrate.removeIslands (pieces)", rows)
+
+def arcRing(count: int) -> np.ndarray:
+    """
+    Build a ring of roughly count vertices consisting of rounded corners and
+    milled holes (arcs) and a wavy edge (short line segments).
+    """
+    holes = [Point(x * mm, 20 * mm).buffer(2 * mm, quad_segs=count // 32)
+             for x in range(10, 100, 20)]
+    wave = [(x * mm, 50 * mm + np.sin(x) * mm) for x in np.linspace(100, 0, count // 2)]
+    outline = Polygon([(0, 0), (100 * mm, 0)] + wave).buffer(3 * mm, quad_segs=count // 32)
+    return np.array(outline.difference(holes[0].union(holes[1])).exterior.coords)
+
+def referenceArcRuns(coords, tolerance, minRadius):
+    """
+    The original point-by-point walk of Substrate._serializeRing
+    """
+    runs = []
+    i = 0
+    while i < len(coords):
+        candidate = CircleFitCandidates(tolerance=tolerance)
+        for j in range(i, len(coords)):
+            if not candidate.addPoint(coords[j]):
+                break
+        if candidate.foundCircle is not None and candidate.foundCircle[1] > minRadius:
+            runs.append((i, i + len(candidate) - 1, candidate.foundCircle))
+            i += len(candidate) - 1
+        else:
+            runs.append((i, i + 1, None))
+            i += 1
+    return runs
+
+def benchmarkArcReconstruction() -> None:
+    rows = []
+    for count in [1000, 4000, 16000]:
+        coords = arcRing(count)
+        reference = measure(lambda: referenceArcRuns(coords, fromMm(0.01), fromMm(0.25)), 1)
+        current = measure(lambda: findArcRuns(coords, fromMm(0.01), fromMm(0.25)))
+        rows.append((len(coords), reference, current))
+    report("Arc reconstruction (ring vertices)", rows)
+
+def boardGrid(count: int) -> Substrate:
+    """
+    Build a panel substrate of count 8x8 mm boards spaced by 2 mm
+    """
+    side = int(count ** 0.5) + 1
+    s = Substrate([])
+    s.union([box(10 * (i % side) * mm, 10 * (i // side) * mm,
+                 10 * (i % side) * mm + 8 * mm, 10 * (i // side) * mm + 8 * mm)
+             for i in range(count)])
+    s.orient()
+    return s
+
+def tabAnnotations(count: int):
+    """
+    Two tabs per board of boardGrid, left and bottom, pointing to the board
+    """
+    side = int(count ** 0.5) + 1
+    annotations = []
+    for i in range(count):
+        x, y = 10 * (i % side) * mm, 10 * (i // side) * mm
+        annotations.append(((x - mm, y + 4 * mm), (1, 0)))
+        annotations.append(((x + 4 * mm, y - mm), (0, 1)))
+    return annotations
+
+def referenceTab(s: Substrate, origin, direction, width, maxHeight):
+    """
+    The original implementation of Substrate.tab scanning all the pieces of
+    the substrate (without partition line and fillet)
+    """
+    if s.substrates.contains(Point(origin)) and not s.substrates.boundary.contains(Point(origin)):
+        raise TabError(origin, direction, ["Tab annotation is placed inside the board."])
+    origin = np.array(origin, dtype=np.float64)
+    direction = np.around(normalize(direction), 4)
+    origin -= direction * float(SHP_EPSILON)
+    for geom in listGeometries(s.substrates):
+        try:
+            sideOriginA = origin + makePerpendicular(direction) * width / 2
+            sideOriginB = origin - makePerpendicular(direction) * width / 2
+            boundary = geom.exterior
+            splitPointA = closestIntersectionPoint(sideOriginA, direction,
+                boundary, maxHeight)
+            splitPointB = closestIntersectionPoint(sideOriginB, direction,
+                boundary, maxHeight)
+            tabFace = biteBoundary(boundary, splitPointB, splitPointA)
+            return Polygon(list(tabFace.coords) + [sideOriginA, sideOriginB]), tabFace
+        except NoIntersectionError:
+            continue
+    raise TabError(origin, direction, ["Tab does not hit the board"])
+
+def benchmarkTabs() -> None:
+    rows = []
+    for count in [100, 400, 1000]:
+        s = boardGrid(count)
+        annotations = tabAnnotations(count)
+        width, maxHeight = 2 * mm, 5 * mm
+        for origin, direction in annotations[:50]:
+            assert s.tab(origin, direction, width, maxHeight=maxHeight)[0].equals(
+                referenceTab(s, origin, direction, width, maxHeight)[0])
+        reference = measure(lambda: [referenceTab(s, o, d, width, maxHeight)
+                                     for o, d in annotations], 1)
+        current = measure(lambda: [s.tab(o, d, width, maxHeight=maxHeight)
+                                   for o, d in annotations])
+        rows.append((len(annotations), reference, current))
+    report("Tabs on a panel substrate (tabs)", rows)
+
+if __name__ == "__main__":
+    benchmarkRemoveIslands()
+    benchmarkArcReconstruction()
+    benchmarkTabs()
@@ -0,0 +1,62 @@
+"""
+Benchmarks of tab construction. Run via `python3 tabs.py`.
+"""
+import os
+from concurrent.futures import ProcessPoolExecutor
+import shapely
+from shapely.geometry import LineString, box
+from kikit.annotations import TabAnnotation
+from kikit.common import fromMm
+from kikit.panelize import _constructTabsWkb, constructTabs
+from kikit.substrate import Substrate
+from common import measure, report
+
+mm = fromMm(1)
+
+def boards(count: int):
+    """
+    Build count boards, each with its partition line and 8 tab annotations
+    """
+    result = []
+    for i in range(count):
+        x = 20 * i * mm
+        s = Substrate([])
+        s.union(box(x, 0, x + 16 * mm, 16 * mm))
+        s.orient()
+        partitionLine = LineString([(x - 2 * mm, -2 * mm), (x + 18 * mm, -2 * mm),
+                                    (x + 18 * mm, 18 * mm), (x - 2 * mm, 18 * mm),
+                                    (x - 2 * mm, -2 * mm)])
+        annotations = []
+        for offset in [4 * mm, 12 * mm]:
+            annotations += [
+                TabAnnotation(None, (x, offset), (1, 0), 2 * mm),
+                TabAnnotation(None, (x + 16 * mm, offset), (-1, 0), 2 * mm),
+                TabAnnotation(None, (x + offset, 0), (0, 1), 2 * mm),
+                TabAnnotation(None, (x + offset, 16 * mm), (0, -1), 2 * mm)]
+        result.append((s, partitionLine, annotations))
+    return result
+
+def serialTabs(boards, fillet):
+    return [constructTabs(s, p, a, fillet) for s, p, a in boards]
+
+def parallelTabs(boards, fillet, jobs):
+    with ProcessPoolExecutor(jobs) as executor:
+        return list(executor.map(_constructTabsWkb,
+            [shapely.to_wkb(s.substrates) for s, _, _ in boards],
+            [shapely.to_wkb(p) for _, p, _ in boards],
+            [[(a.origin, a.direction, a.width, a.maxLength) for a in annotations]
+             for _, _, annotations in boards],
+            [fillet] * len(boards)))
+
+def benchmarkTabs():
+    jobs = os.cpu_count()
+    rows = []
+    for count in [10, 40, 160]:
+        b = boards(count)
+        rows.append((count * 8,
+            measure(lambda: serialTabs(b, fromMm(1)), 1),
+            measure(lambda: parallelTabs(b, fromMm(1), jobs), 1)))
+    report(f"Filleted tabs, serial vs. {jobs} processes (tabs)", rows)
+
+if __name__ == "__main__":
+    benchmarkTabs()
@@ -209,6 +209,33 @@ load common
         $RES/conn.kicad_pcb panel_t18.kicad_pcb
 }
 
+@test "Prefilled copperfill" {
+    for fill in solid hex; do
+        kikit panelize \
+            --layout 'grid; rows: 2; cols: 2; space: 2mm' \
+            --tabs 'fixed; hwidth: 10mm; vwidth: 15mm' \
+            --cuts 'vcuts; clearance: 1.5mm' \
+            --framing 'frame; width: 5mm; space: 3mm;' \
+            --tooling '3hole; hoffset: 2.5mm; voffset: 2.5mm; size: 1.5mm' \
+            --copperfill "$fill; prefill: true" \
+            --debug 'trace: true; deterministic: true' \
+            $RES/conn.kicad_pcb panel_prefill_$fill.kicad_pcb
+
+        # The zones are loaded back filled, even though no filler was run
+        python3 -c "
+import sys
+from pcbnewTransition import pcbnew
+board = pcbnew.LoadBoard(sys.argv[1])
+zones = [z for z in board.Zones() if not z.GetIsRuleArea()
+         and z.GetLayer() in [pcbnew.F_Cu, pcbnew.B_Cu]]
+assert len(zones) > 0
+for z in zones:
+    assert z.IsFilled()
+    assert z.GetFilledPolysList(z.GetLayer()).OutlineCount() > 0
+" panel_prefill_$fill.kicad_pcb
+    done
+}
+
 @test "Set aux origin" {
     kikit panelize \
         --post 'origin: bl;' \
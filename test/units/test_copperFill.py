@@ -0,0 +1,52 @@
+import numpy as np
+import pytest
+from shapely.geometry import MultiPolygon, Polygon, box
+from kikit.common import fromMm
+from kikit.panel_features.copperFill import HexCopperFill
+
+
+def referenceHexagons(fill, area):
+    horizontalSpacing = fill.space + np.sqrt(3) / 2 * fill.diameter
+    verticalSpacing = 3 / 4 * fill.diameter + np.sqrt(3) / 2 * fill.space
+    minx, miny, maxx, maxy = area
+    maxx += horizontalSpacing
+    maxy += horizontalSpacing
+    hexagons = []
+    y = miny
+    shifted = False
+    while y <= maxy:
+        x = minx - (horizontalSpacing / 2 if shifted else 0)
+        while x <= maxx:
+            hexagons.append(Polygon([
+                (x + fill.diameter / 2 * np.cos(np.pi / 6 + i / 3 * np.pi),
+                 y + fill.diameter / 2 * np.sin(np.pi / 6 + i / 3 * np.pi)) for i in range(6)
+            ]))
+            x += horizontalSpacing
+        y += verticalSpacing
+        shifted = not shifted
+    return MultiPolygon(hexagons)
+
+
+def test_buildHexagons():
+    fill = HexCopperFill(diameter=fromMm(3), space=fromMm(0.5))
+    area = (fromMm(-3), fromMm(2), fromMm(40), fromMm(27))
+    hexagons = fill._buildHexagons(area)
+    expected = referenceHexagons(fill, area).geoms
+    assert len(hexagons) == len(expected)
+    for h, e in zip(hexagons, expected):
+        assert h.equals_exact(e, tolerance=1e-6)
+
+
+def test_clipHexagons():
+    fill = HexCopperFill(diameter=fromMm(3), space=fromMm(0.5))
+    zoneArea = box(0, 0, fromMm(40), fromMm(30)).difference(
+        box(fromMm(5), fromMm(5), fromMm(35), fromMm(25)))
+    hexagons = fill._buildHexagons(zoneArea.bounds)
+    clipped = fill._clipHexagons(hexagons, zoneArea)
+
+    baseHexArea = 3 * np.sqrt(3) * (fill.diameter / 2) ** 2 / 2
+    expected = referenceHexagons(fill, zoneArea.bounds).intersection(zoneArea)
+    expected = [g for g in expected.geoms if g.area >= fill.threshold * baseHexArea]
+    assert len(clipped) == len(expected)
+    assert sum(g.area for g in clipped) == pytest.approx(sum(g.area for g in expected))
+    assert all(zoneArea.buffer(1).contains(g) for g in clipped)
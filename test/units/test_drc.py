@@ -0,0 +1,210 @@
+import io
+import os
+import uuid
+import pytest
+from types import SimpleNamespace
+from kikit.common import fromMm
+from kikit.drc import (DrcReport, FingerprintIndex, Violation, collectFingerprints,
+                       readReport, runPanelDrc)
+from kikit import panelize_ui_impl
+from kikit.panelize import PanelDrcErrors
+
+class FakeKiid:
+    def __init__(self, value):
+        self.value = value
+
+    def AsString(self):
+        return self.value
+
+class FakeItem:
+    """
+    Just enough of pcbnew.BOARD_ITEM for reading DRC reports
+    """
+    describeCount = 0
+
+    def __init__(self, x, y, description, kiid=None):
+        self.position = (fromMm(x), fromMm(y))
+        self.description = description
+        self.m_Uuid = FakeKiid(kiid or str(uuid.uuid4()))
+
+    def GetPosition(self):
+        return self.position
+
+    def GetItemDescription(self, *args):
+        FakeItem.describeCount += 1
+        return self.description
+
+    GetSelectMenuText = GetItemDescription
+
+class FakeFootprint(FakeItem):
+    def __init__(self, x, y, reference, pads):
+        super().__init__(x, y, f"Footprint {reference}")
+        self.pads = pads
+        self.reference = FakeItem(x, y - 1, f"Reference '{reference}'")
+        self.value = FakeItem(x, y + 1, "Value 'R'")
+
+    def Pads(self):
+        return self.pads
+
+    def GraphicalItems(self):
+        return []
+
+    def Zones(self):
+        return []
+
+    def Reference(self):
+        return self.reference
+
+    def Value(self):
+        return self.value
+
+class FakeBoard:
+    def __init__(self, footprints, tracks):
+        self.footprints = footprints
+        self.tracks = tracks
+
+    def GetItem(self, kiid):
+        for x in self.footprints + self.tracks:
+            if x.m_Uuid.AsString() == kiid.AsString():
+                return x
+        return None
+
+    def Remove(self, item):
+        for items in [self.footprints, self.tracks]:
+            if item in items:
+                items.remove(item)
+
+    def GetDrawings(self):
+        return []
+
+    def GetFootprints(self):
+        return self.footprints
+
+    def GetTracks(self):
+        return self.tracks
+
+    def Zones(self):
+        return []
+
+def fakeBoard():
+    footprints = [FakeFootprint(10 * i, 5, f"R{i}",
+                                [FakeItem(10 * i - 1, 5, f"Pad 1 of R{i}"),
+                                 FakeItem(10 * i + 1, 5, f"Pad 2 of R{i}")])
+                  for i in range(100)]
+    # Tracks sharing a position with pads and with each other
+    tracks = [FakeItem(10 * i + 1, 5, "Track [GND] on F.Cu")
+              for i in range(0, 100, 10)]
+    tracks.append(FakeItem(11, 5, "Track [GND] on F.Cu"))
+    return FakeBoard(footprints, tracks)
+
+REPORT = """** Drc report for board.kicad_pcb **
+** Created on 2024-01-01T00:00:00 **
+
+** Found 2 DRC violations **
+[clearance]: Clearance violation (netclass 'Default' clearance 0.2000 mm; actual 0.1000 mm)
+    Rule: netclass 'Default'; Severity: error
+    @(31.0000 mm, 5.0000 mm): Pad 2 of R3
+    @(39.0000 mm, 5.0000 mm): Pad 1 of R4
+[silk_overlap]: Silkscreen overlap
+    Local override; warning
+    @(11.0000 mm, 5.0000 mm): Track [GND] on F.Cu
+
+** Found 1 unconnected pads **
+[unconnected_items]: Missing connection between items
+    Local override; Severity: error
+    @(70.0000 mm, 4.0000 mm): Reference 'R7'
+
+** Found 0 Footprint errors **
+
+** End of Report **
+"""
+
+def test_fingerprintIndexMatchesCollected():
+    board = fakeBoard()
+    index = FingerprintIndex(board)
+    for fingerprint, item in collectFingerprints(board).items():
+        assert index[fingerprint] is item
+
+def test_readReportDescribesOnlyReportedItems():
+    board = fakeBoard()
+    FakeItem.describeCount = 0
+    report = readReport(io.StringIO(REPORT), board)
+    assert FakeItem.describeCount < 10
+
+    assert [v.type for v in report.drc] == ["clearance", "silk_overlap"]
+    assert [v.severity for v in report.drc] == ["error", "warning"]
+    assert report.drc[0].objects == [board.footprints[3].pads[1],
+                                     board.footprints[4].pads[0]]
+    # Duplicate fingerprints resolve to the last item
+    assert report.drc[1].objects == [board.tracks[-1]]
+    assert report.unconnected[0].objects == [board.footprints[7].reference]
+    assert report.footprint == []
+
+def test_runPanelDrc(monkeypatch):
+    aFile, bFile = os.path.abspath("a.kicad_pcb"), os.path.abspath("b.kicad_pcb")
+    sources = {
+        aFile: FakeBoard([FakeFootprint(0, 0, "R1", [])],
+                                 [FakeItem(1, 0, "Track"), FakeItem(2, 0, "Track")]),
+        bFile: FakeBoard([], [FakeItem(0, 0, "Track")])
+    }
+    # Two placements of a, one of b; the second track of a is not placed
+    a, b = sources[aFile], sources[bFile]
+    instances = []
+    placed = []
+    for filename, items in [(aFile, [a.footprints[0], a.tracks[0]]),
+                            (aFile, [a.footprints[0], a.tracks[0]]),
+                            (bFile, b.tracks)]:
+        copies = [FakeItem(0, 0, x.description) for x in items]
+        placed += copies
+        instances.append((filename, {x.m_Uuid.AsString(): c.m_Uuid.AsString()
+                                     for x, c in zip(items, copies)}))
+    frame = FakeItem(0, 0, "Frame")
+    kiids = [x.m_Uuid.AsString() for x in placed + [frame]]
+    loadPanel = lambda: FakeBoard([], [FakeItem(0, 0, "", kiid) for kiid in kiids])
+
+    def loadBoard(filename):
+        return loadPanel() if filename == "panel.kicad_pcb" else sources[filename]
+    def runBoardDrc(board, strict):
+        if board in sources.values():
+            drc = [Violation("clearance", "", "", "error", [board.tracks[0], board.tracks[-1]]),
+                   Violation("track_dangling", "", "", "warning", [board.tracks[-1]])]
+            if len(board.footprints) > 0:
+                drc.append(Violation("courtyards_overlap", "", "", "error",
+                                     [board.footprints[0], board.tracks[0]]))
+            return DrcReport(drc, [], [Violation("copper_sliver", "", "", "warning")])
+        # Only panel-level items are checked on the panel
+        assert [x.m_Uuid.AsString() for x in board.tracks] == [frame.m_Uuid.AsString()]
+        return DrcReport([Violation("silk_overlap", "", "", "warning", board.tracks)], [], [])
+    monkeypatch.setattr("kikit.drc.pcbnew.LoadBoard", loadBoard)
+    monkeypatch.setattr("kikit.drc.runBoardDrc", runBoardDrc)
+
+    panel = SimpleNamespace(filename="panel.kicad_pcb", boardInstances=instances)
+    _, report = runPanelDrc(panel, strict=False, ignoreExcluded=False)
+
+    describe = lambda v: (v.type, [x.m_Uuid.AsString() for x in v.objects])
+    # Violations of a are reported for both placements. The second track of a
+    # is not placed, so the violations involving it are dropped even if their
+    # other objects are placed
+    assert [describe(v) for v in report.drc] == [
+        ("courtyards_overlap", [kiids[0], kiids[1]]),
+        ("courtyards_overlap", [kiids[2], kiids[3]]),
+        ("clearance", [kiids[4], kiids[4]]),
+        ("track_dangling", [kiids[4]]),
+        ("silk_overlap", [kiids[5]])]
+    # Violations without objects are reported once per source board
+    assert [describe(v) for v in report.footprint] == [("copper_sliver", [])] * 2
+
+def test_panelizeRunsPanelDrc(monkeypatch):
+    panel = object()
+    calls = []
+    def runPanelImpl(p, useMm, ignoreExcluded, strict, level, jobs, yieldViolation):
+        calls.append((p, jobs))
+        yieldViolation("** Found 1 DRC violations: **")
+        return True
+    monkeypatch.setattr("kikit.drc.runPanelImpl", runPanelImpl)
+
+    panelize_ui_impl.runPanelDrc({"drc": False, "drcjobs": 2}, panel)
+    assert calls == []
+    with pytest.raises(PanelDrcErrors, match="Found 1 DRC violations"):
+        panelize_ui_impl.runPanelDrc({"drc": True, "drcjobs": 2}, panel)
+    assert calls == [(panel, 2)]
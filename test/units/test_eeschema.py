@@ -0,0 +1,54 @@
+import pytest
+from kikit import eeschema_v6
+from kikit.eeschema_v6 import *
+
+SCHEMATICS = [
+    "../resources/assembly_project_1_KiCAD6/assembly_project_1_KiCAD6.kicad_sch",
+    "../resources/assembly_project_1_KiCAD7/assembly_project_1_KiCAD7.kicad_sch"
+]
+
+def test_loadSheetsParsesEachFileOnce(monkeypatch):
+    parsed = []
+    readSheet = eeschema_v6.readSheet
+    def countingReadSheet(filename):
+        parsed.append(filename)
+        return readSheet(filename)
+    monkeypatch.setattr(eeschema_v6, "readSheet", countingReadSheet)
+
+    sheets = loadSheets(SCHEMATICS[1])
+    assert len(parsed) == len(set(parsed)) == len(sheets) == 3
+
+    symbols, instances = collectSymbols(SCHEMATICS[1], sheets=sheets)
+    assert len(parsed) == 3
+    # The bottom sheet is instantiated twice
+    assert len(set(s.path for s in symbols)) == len(symbols) == 4
+    assert len(instances) == 4
+
+@pytest.mark.parametrize("schematic", SCHEMATICS)
+def test_preloadedCrawl(schematic):
+    assert collectSymbols(schematic, sheets=loadSheets(schematic)) \
+        == collectSymbols(schematic)
+
+@pytest.mark.parametrize("schematic", SCHEMATICS)
+def test_extractComponents(schematic):
+    symbols, instances = collectSymbols(schematic)
+    symbolsDict = {x.path: x for x in symbols}
+    components = extractComponents(schematic)
+    assert len(components) == len(instances)
+    for component, inst in zip(components, instances):
+        symbol = symbolsDict[inst.symbol_path]
+        expected = dict(symbol.properties)
+        if inst.reference is not None:
+            expected["Reference"] = inst.reference
+        if inst.value is not None:
+            expected["Value"] = inst.value
+        if inst.footprint is not None:
+            expected["Footprint"] = inst.footprint
+        assert component.properties == expected
+        for field in list(expected.keys()) + ["Nonexistent"]:
+            assert getField(component, field) == expected.get(field)
+        assert getReference(component) == expected["Reference"]
+        assert getUnit(component) == (symbol.unit if inst.unit is None else inst.unit)
+        assert component.path == symbol.path
+        # The shared symbol is left untouched
+        assert component.symbol == symbol
@@ -0,0 +1,34 @@
+import os
+from pcbnewTransition import pcbnew
+from kikit.export import gerberImpl
+
+SOURCE = "../resources/conn.kicad_pcb"
+
+def readPlotted(directory):
+    """
+    Read all files in the directory, skip lines with time stamps as they
+    differ from run to run
+    """
+    content = {}
+    for name in sorted(os.listdir(directory)):
+        with open(os.path.join(directory, name), encoding="utf-8") as f:
+            content[name] = [l for l in f.read().splitlines()
+                             if "date" not in l.lower()]
+    return content
+
+def test_parallelGerberMatchesSerial(tmp_path, monkeypatch):
+    board = pcbnew.LoadBoard(os.path.abspath(SOURCE))
+    # Nothing should be written into the working directory
+    workdir = tmp_path / "workdir"
+    workdir.mkdir()
+    monkeypatch.chdir(workdir)
+    gerberImpl(board, str(tmp_path / "serial"))
+    gerberImpl(board, str(tmp_path / "parallel"), jobs=3)
+    serial = readPlotted(tmp_path / "serial")
+    assert len(serial) > 0
+    assert serial == readPlotted(tmp_path / "parallel")
+    for name in ["serial", "parallel"]:
+        files = os.listdir(tmp_path / name)
+        assert any(f.endswith(".drl") for f in files)
+        assert "drill_report.rpt" in files
+    assert os.listdir(workdir) == []
@@ -0,0 +1,100 @@
+import re
+import pytest
+from kikit.eeschema_v6 import Symbol
+from kikit.fab.common import *
+
+def patterns(*footprints):
+    return [CorrectionPattern(re.compile(f), re.compile(".*"), i, -i, 90 * i)
+            for i, f in enumerate(footprints)]
+
+def sequentialLookup(correctionPatterns, name):
+    for corpat in correctionPatterns:
+        if corpat.footprint.match(name):
+            return (corpat.x_correction, corpat.y_correction, corpat.rotation)
+    return (0, 0, 0)
+
+NAMES = ["Resistor_SMD:R_0402_1005Metric", "Capacitor_SMD:C_0603_1608Metric",
+         "Package_SO:SOIC-8_3.9x4.9mm_P1.27mm", "LED_SMD:LED_0805", "Custom:X"]
+
+@pytest.mark.parametrize("correctionPatterns", [
+    patterns(),
+    patterns("^Resistor_SMD:", ".*_0603_", "Package_SO:SOIC-8", ".*:R_", ".*"),
+    patterns("LED_SMD:LED_0805$", "LED", "^Package_(SO|QFP):", "(?i)custom"),
+    patterns("(a)\\1", "Capacitor"),
+])
+def test_correctionPatternIndex(correctionPatterns):
+    index = CorrectionPatternIndex(correctionPatterns)
+    for name in NAMES + NAMES:
+        assert index.lookup(name) == sequentialLookup(correctionPatterns, name)
+
+def component(reference, value, unit=1, **kwargs):
+    properties = {"Reference": reference, "Value": value, "Footprint": "R_0402"}
+    properties.update(kwargs.pop("properties", {}))
+    return Symbol(unit=unit, properties=properties, **kwargs)
+
+def test_groupBom():
+    components = [
+        component("R1", "10k"), component("C1", "100n"), component("R2", "10k"),
+        component("R3", "10k", unit=2), component("#PWR01", "GND"),
+        component("R4", "10k", dnp=True), component("R5", "10k", in_bom=False),
+        component("R6", "1k"), component("R7", "10k")
+    ]
+    bom = groupBom(components, ["R6"], lambda c: (getField(c, "Value"),))
+    assert bom == {("10k",): ["R1", "R2", "R7"], ("100n",): ["C1"]}
+    assert list(bom.keys()) == [("10k",), ("100n",)]
+    assert bomReferences(bom) == {"R1", "R2", "R7", "C1"}
+    assert restrictBom(bom, {"R2", "R7"}) == {("10k",): ["R2", "R7"]}
+
+def test_jlcpcbCollectBom():
+    from kikit.fab.jlcpcb import collectBom
+    components = [
+        component("R1", "10k", properties={"LCSC": "C1"}),
+        component("R2", "10k", properties={"LCSC": " ", "LCSC2": "C1"}),
+        component("R3", "10k", properties={"JLCPCB_IGNORE": "x"})
+    ]
+    assert collectBom(components, ["LCSC", "LCSC2"], []) == \
+        {("10k", "R_0402", "C1"): ["R1", "R2"]}
+
+class FakeBoard:
+    def __init__(self, filename):
+        self.filename = filename
+
+    def GetFileName(self):
+        return self.filename
+
+def test_incrementalGerberArchive(tmp_path, monkeypatch):
+    plotted = []
+    def fakeGerberImpl(board, outputdir, **kwargs):
+        plotted.append(kwargs)
+        os.makedirs(outputdir)
+        with open(os.path.join(outputdir, "board-CuTop.gtl"), "w") as f:
+            f.write("G04 plotted*\n")
+    monkeypatch.setattr("kikit.fab.common.gerberImpl", fakeGerberImpl)
+
+    boardFile = tmp_path / "board.kicad_pcb"
+    boardFile.write_text("(kicad_pcb)")
+    board = FakeBoard(str(boardFile))
+    outputdir = str(tmp_path / "out")
+    os.makedirs(outputdir)
+
+    exportGerberArchive(board, outputdir, "gerbers", incremental=True)
+    exportGerberArchive(board, outputdir, "gerbers", incremental=True)
+    assert len(plotted) == 1
+    assert os.path.exists(os.path.join(outputdir, "gerbers.zip"))
+
+    # Different settings or board content require plotting again
+    exportGerberArchive(board, outputdir, "gerbers", incremental=True, drilling=False)
+    assert len(plotted) == 2
+    boardFile.write_text("(kicad_pcb (version 1))")
+    exportGerberArchive(board, outputdir, "gerbers", incremental=True, drilling=False)
+    assert len(plotted) == 3
+
+    # Missing outputs are regenerated
+    os.remove(os.path.join(outputdir, "gerbers.zip"))
+    exportGerberArchive(board, outputdir, "gerbers", incremental=True, drilling=False)
+    assert len(plotted) == 3
+    assert os.path.exists(os.path.join(outputdir, "gerbers.zip"))
+
+    # Non-incremental export always plots
+    exportGerberArchive(board, outputdir, "gerbers", drilling=False)
+    assert len(plotted) == 4
@@ -1,4 +1,5 @@
 import pytest
+from itertools import product
 from kikit.intervals import *
 
 def identity(x):
@@ -119,6 +120,50 @@ def test_boxNeighborsNotSameLevel():
     assert n.bottom(2) == [4]
     assert n.bottom(1) == [3]
 
+def naiveNeighbors(boxes, getInterval, getDistance):
+    """
+    Reference implementation of the neighbor query - test all boxes in the
+    given direction
+    """
+    items = [(ident, getInterval(b), getDistance(b)) for ident, b in boxes.items()]
+    items.sort(key=lambda t: t[2])
+    neighbors = {}
+    for i, (ident, interval, _) in enumerate(items):
+        n = []
+        rest = IntervalList([interval])
+        for nIdent, nInterval, _ in items[i + 1:]:
+            shadow = rest.intersect(nInterval)
+            if shadow.trivial():
+                continue
+            n.append((nIdent, shadow))
+            rest = rest.difference(nInterval)
+        neighbors[ident] = n
+    return neighbors
+
+def test_boxNeighborsRandom():
+    import random
+    rnd = random.Random(42)
+    for _ in range(20):
+        boxes = {}
+        for i, j in product(range(8), range(8)):
+            if rnd.random() < 0.3:
+                continue
+            x, y = 10 * i + rnd.randint(0, 3), 10 * j + rnd.randint(0, 3)
+            w, h = rnd.choice([2, 4, 6, 7]), rnd.choice([2, 4, 6, 7])
+            boxes[(i, j)] = (x, y, x + w, y + h)
+        n = BoxNeighbors(boxes)
+
+        xProj = lambda b: Interval(b[0], b[2])
+        yProj = lambda b: Interval(b[1], b[3])
+        for query, getInterval, getDistance in [
+                (n.leftC, yProj, lambda b: -b[2]),
+                (n.rightC, yProj, lambda b: b[0]),
+                (n.topC, xProj, lambda b: -b[3]),
+                (n.bottomC, xProj, lambda b: b[1])]:
+            truth = naiveNeighbors(boxes, getInterval, getDistance)
+            for ident in boxes.keys():
+                assert query(ident) == truth[ident]
+
 def test_bounds():
     a = [1, 2, 3, 4, 5, 6, 7, 8]
     b = [2, 4, 6, 8, 10, 12, 14]
@@ -1,11 +1,18 @@
 import pytest
+import shapely
+from shapely import STRtree
+from concurrent.futures import ProcessPoolExecutor
 from pcbnewTransition.pcbnew import EDA_ANGLE, DEGREES_T
-from kikit.common import KiAngle
+from kikit.annotations import TabAnnotation
+from kikit.common import KiAngle, fromMm
 from kikit.panelize import (
     GridPlacerBase, BasicGridPosition, OddEvenRowsPosition,
-    OddEvenColumnPosition, OddEvenRowsColumnsPosition, prolongCut
+    OddEvenColumnPosition, OddEvenRowsColumnsPosition, prolongCut,
+    Panel, constructTabs, _constructTabsWkb, mouseBitePositions,
+    substratesExterior, zoneFill
 )
-from shapely.geometry import LineString
+from kikit.substrate import Substrate, TabError
+from shapely.geometry import GeometryCollection, LineString, Point, box
 from math import sqrt
 
 
@@ -70,3 +77,129 @@ def test_prolongCut():
 
     assert prolonged.coords[0] == pytest.approx((sqrt(2)/2 * -0.5, sqrt(2)/2 * -0.5))
     assert prolonged.coords[1] == pytest.approx((1 + sqrt(2)/2 * 0.5, 1 + sqrt(2)/2 * 0.5))
+
+
+def test_constructTabsInProcessPool():
+    mm = fromMm(1)
+    s = Substrate([])
+    s.union(box(0, 0, 10 * mm, 10 * mm))
+    s.orient()
+    partitionLine = LineString([(-2 * mm, -5 * mm), (-2 * mm, 15 * mm)])
+    annotations = [
+        TabAnnotation(None, (0, 3 * mm), (1, 0), 2 * mm),
+        TabAnnotation(None, (0, 7 * mm), (1, 0), 2 * mm),
+        TabAnnotation(None, (5 * mm, 5 * mm), (1, 0), 2 * mm)] # Inside the board
+    fillet = fromMm(0.5)
+
+    serial = constructTabs(s, partitionLine, annotations, fillet)
+    with ProcessPoolExecutor(1) as executor:
+        parallel = executor.submit(_constructTabsWkb,
+            shapely.to_wkb(s.substrates), shapely.to_wkb(partitionLine),
+            [(a.origin, a.direction, a.width, a.maxLength) for a in annotations],
+            fillet).result()
+
+    assert len(serial) == len(parallel) == 3
+    for expected, actual in zip(serial[:2], parallel[:2]):
+        assert [shapely.to_wkb(x) for x in expected] == list(actual)
+    assert isinstance(serial[2], TabError) and isinstance(parallel[2], TabError)
+    assert str(serial[2]) == str(parallel[2])
+
+
+def tabbedPanel(tmp_path, jobs):
+    """
+    Build tabs for a row of three boards with given number of jobs. Return
+    the panel and the cuts.
+    """
+    mm = fromMm(1)
+    panel = Panel(str(tmp_path / f"panel-{jobs}.kicad_pcb"))
+    for i in range(3):
+        x = 20 * i * mm
+        s = Substrate([])
+        s.union(box(x, 0, x + 16 * mm, 16 * mm))
+        s.partitionLine = LineString([(x - 2 * mm, -2 * mm), (x + 18 * mm, -2 * mm),
+                                      (x + 18 * mm, 18 * mm), (x - 2 * mm, 18 * mm),
+                                      (x - 2 * mm, -2 * mm)])
+        s.annotations = [
+            TabAnnotation(None, (x, 8 * mm), (1, 0), 3 * mm),
+            TabAnnotation(None, (x + 16 * mm, 8 * mm), (-1, 0), 3 * mm),
+            TabAnnotation(None, (x + 8 * mm, 0), (0, 1), 3 * mm)]
+        panel.substrates.append(s)
+        panel.boardSubstrate.union(s.substrates)
+    # The last board has no tabs
+    panel.substrates[-1].annotations = []
+    cuts = panel.buildTabsFromAnnotations(fromMm(0.5), jobs)
+    return panel, cuts
+
+
+def test_buildTabsFromAnnotationsInProcessPool(tmp_path):
+    serialPanel, serialCuts = tabbedPanel(tmp_path, 1)
+    parallelPanel, parallelCuts = tabbedPanel(tmp_path, 2)
+
+    assert len(serialCuts) == len(parallelCuts) == 6
+    assert [shapely.to_wkb(x) for x in serialCuts] == \
+           [shapely.to_wkb(x) for x in parallelCuts]
+    assert serialPanel.boardSubstrate.substrates.equals(
+        parallelPanel.boardSubstrate.substrates)
+    assert serialPanel.boardSubstrate.substrates.area > 3 * 16 * 16 * fromMm(1) ** 2
+
+
+def test_mouseBitePositions():
+    cuts = [LineString([(0, 0), (10, 0)]),
+            LineString([(0, 5), (1, 5)]),
+            LineString([(0, 10), (3, 10), (3, 13)])]
+    spacing = 2
+    points, cutIndices, holeIndices = mouseBitePositions(cuts, spacing)
+
+    expected = []
+    for c, cut in enumerate(cuts):
+        count = int(cut.length / spacing) + 1
+        for i in range(count):
+            if count == 1:
+                hole = cut.interpolate(0.5, normalized=True)
+            else:
+                hole = cut.interpolate(i * cut.length / (count - 1))
+            expected.append((c, i, hole.x, hole.y))
+    assert [(c, h, p.x, p.y) for c, h, p in zip(cutIndices, holeIndices, points)] \
+        == pytest.approx(expected)
+    assert len(mouseBitePositions([], spacing)[0]) == 0
+
+
+def test_substratesExterior():
+    substrates = []
+    for i in range(5):
+        s = Substrate([])
+        s.union(box(3 * i, 0, 3 * i + 2, 2).difference(box(3 * i + 0.5, 0.5, 3 * i + 1.5, 1.5)))
+        substrates.append(s)
+
+    exterior = substratesExterior(substrates)
+    assert exterior.area == pytest.approx(5 * 4)
+    assert len(exterior.geoms) == 5
+
+    buffered = substratesExterior(substrates, 1)
+    expected = GeometryCollection()
+    for s in substrates:
+        expected = expected.union(s.exterior().buffer(1))
+    assert buffered.symmetric_difference(expected).area == pytest.approx(0, abs=1e-6)
+    assert substratesExterior([]).is_empty
+
+
+def test_zoneFill():
+    area = box(0, 0, 20, 10).difference(box(2, 2, 18, 8)) # A frame
+    hole = Point(1, 5).buffer(0.5)
+    keepout = box(9, -1, 11, 11)
+    fill = zoneFill(area, STRtree([hole]), [keepout], clearance=0.2, minThickness=0)
+
+    assert fill.area == pytest.approx(area.difference(keepout).difference(
+        hole.buffer(0.2)).area, rel=1e-3)
+    assert fill.distance(hole) == pytest.approx(0.2, abs=1e-3)
+    assert not fill.intersects(keepout.buffer(-1e-6))
+    assert area.buffer(1e-6).contains(fill)
+
+    # The clearance around the hole cuts the left side of the frame into
+    # slivers thinner than the minimal thickness, they are removed
+    thick = zoneFill(area, STRtree([hole]), [], clearance=0.2, minThickness=0.5)
+    assert thick.distance(Point(0.1, 5)) > 0.1
+    assert thick.contains(Point(10, 1))
+    assert zoneFill(area, STRtree([]), [], clearance=0.2, minThickness=0).equals(area)
+    far = Point(100, 100).buffer(1)
+    assert zoneFill(area, STRtree([far]), [], clearance=0.2, minThickness=0).equals(area)
@@ -47,3 +47,60 @@ def test_readwhitespace_with_comments():
 
     stream = Stream(StringIO("  \n\n \t# Aloha\n("))
     assert readWhitespaceWithComments(stream) == "  \n\n \t# Aloha\n"
+
+def streamParse(s, limit=None):
+    stream = Stream(StringIO(s), buffer_size=3)
+    lw = stream.readUntilEndOfWhitespace()
+    expr = readSexpr(stream, limit=limit)
+    expr.leadingWhitespace = lw
+    expr.trailingOuterWhitespace = stream.readUntilEndOfWhitespace()
+    return expr
+
+def test_bulkParserMatchesStream():
+    sources = [
+        '(a b)',
+        '  (a "b c"(d)"e\\"f"g"h" ) \n',
+        '(a "x\\\\" y)',
+        '(a b (c))',
+        '((a)(b (c (d)))e)   ',
+        '(a b c d e f)'
+    ]
+    for source in sources:
+        for limit in [None, 0, 1, 2, 4]:
+            expected = streamParse(source, limit)
+            actual = parseSexprS(source, limit)
+            assert actual == expected
+            assert actual.trailingOuterWhitespace == expected.trailingOuterWhitespace
+            assert str(actual) == str(expected)
+
+def test_bulkParserErrors():
+    for source in ["", "a", "(a", '(a "b)', "(a (b)"]:
+        with pytest.raises(ParseError):
+            parseSexprS(source)
+
+def test_parseSexprList():
+    source = "# Header\n(a b)\n  # Comment\n(c (d))\n"
+    exprs = parseSexprListF(StringIO(source))
+    assert len(exprs) == 2
+    assert exprs[0].leadingWhitespace == "# Header\n"
+    assert exprs[0].trailingOuterWhitespace == "\n  # Comment\n"
+    assert "".join(str(x) for x in exprs) == source
+
+def test_nodeFilter():
+    source = '(kicad (version 1) (lib (symbol "a(" (b))) (symbol x)\n  (uuid 42) "q" (() c))'
+    parsed = parseSexprS(source, nodeFilter=hasName("symbol", "uuid"))
+    assert str(parsed) == '(kicad (symbol x)\n  (uuid 42) "q" (() c))'
+
+    parsed = parseSexprS(source, limit=2, nodeFilter=hasName("uuid"))
+    assert parsed.items[1].items == parseSexprS("(uuid 42)").items
+    assert not parsed.complete
+
+def test_nodeFilterOnBoard():
+    with open("../resources/conn.kicad_pcb", encoding="utf-8") as f:
+        full = parseSexprF(f)
+    with open("../resources/conn.kicad_pcb", encoding="utf-8") as f:
+        filtered = parseSexprF(f, nodeFilter=hasName("paper", "net"))
+    expected = [x for x in full.items
+        if isinstance(x, Atom) or isElement("paper")(x) or isElement("net")(x)]
+    assert len(filtered.items) == len(expected)
+    assert all(str(a) == str(b) for a, b in zip(filtered.items, expected))
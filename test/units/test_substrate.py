@@ -1,5 +1,5 @@
 import pytest
-from shapely.geometry import Point
+from shapely.geometry import Point, box
 from kikit.substrate import *
 
 def test_biteBoundary():
@@ -21,3 +21,133 @@ def test_biteBoundary():
 
     t5 = biteBoundary(l1, Point(1, 0.25), Point(1, 0.75), 0.1)
     assert t5 == LineString([(1, 0.25), (1, 0.75)])
+
+def test_transformed():
+    mm = fromMm(1)
+    s = Substrate([])
+    s.union(Polygon([(0, 0), (2 * mm, 0), (2 * mm, mm), (0, mm)]))
+    s.orient()
+
+    # KiCAD rotates clockwise in the shapely coordinate system as its y-axis
+    # points down
+    rotated = s.transformed(fromDegrees(90), (0, 0), (10 * mm, 0))
+    assert rotated.bounds() == pytest.approx((10 * mm, -2 * mm, 11 * mm, 0))
+    assert rotated.oriented
+
+    translated = s.transformed(fromDegrees(0), (0, 0), (10 * mm, 5 * mm))
+    assert translated.bounds() == (10 * mm, 5 * mm, 12 * mm, 6 * mm)
+    assert translated.substrates.equals(box(10 * mm, 5 * mm, 12 * mm, 6 * mm))
+
+def test_deferredUnion():
+    mm = fromMm(1)
+    s = Substrate([])
+    for i in range(10):
+        s.union(box(i * mm, 0, (i + 1) * mm, mm))
+    s.union([box(0, mm, mm, 2 * mm)])
+    assert s.bounds() == (0, 0, 10 * mm, 2 * mm)
+    assert s.isSinglePiece()
+    assert s.substrates.area == pytest.approx(11 * mm * mm)
+
+    s.cut(box(0, 0, 10 * mm, mm))
+    s.union(box(20 * mm, 0, 21 * mm, mm))
+    assert s.bounds() == (0, 0, 21 * mm, 2 * mm)
+    assert not s.isSinglePiece()
+
+def test_removeIslands():
+    mm = fromMm(1)
+    s = Substrate([])
+    pieces = []
+    for i in range(5):
+        frame = box(10 * i * mm, 0, 10 * i * mm + 8 * mm, 8 * mm).difference(
+            box(10 * i * mm + 2 * mm, 2 * mm, 10 * i * mm + 6 * mm, 6 * mm))
+        island = box(10 * i * mm + 3 * mm, 3 * mm, 10 * i * mm + 5 * mm, 5 * mm)
+        pieces += [frame, island]
+    s.union(pieces)
+    assert len(s.substrates.geoms) == 10
+
+    s.removeIslands()
+    assert len(s.substrates.geoms) == 5
+    assert all(len(p.interiors) == 1 for p in s.substrates.geoms)
+
+def test_tabIndex():
+    mm = fromMm(1)
+    s = Substrate([])
+    s.union([box(10 * i * mm, 0, 10 * i * mm + 8 * mm, 8 * mm) for i in range(20)])
+    tab = lambda origin, direction: s.tab(origin, direction, 2 * mm, maxHeight=5 * mm)
+
+    # Tab from the gap between boards 3 and 4 to the left hits board 3
+    t, face = tab((39 * mm, 4 * mm), (-1, 0))
+    assert face.bounds == pytest.approx((38 * mm, 3 * mm, 38 * mm, 5 * mm), abs=mm / 100)
+    assert t.bounds == pytest.approx((38 * mm, 3 * mm, 39 * mm, 5 * mm), abs=mm / 100)
+
+    with pytest.raises(TabError):
+        tab((34 * mm, 4 * mm), (1, 0))
+    with pytest.raises(TabError):
+        tab((39 * mm, 20 * mm), (-1, 0))
+
+    # When more pieces are in reach, the first one of the substrate wins
+    _, face = s.tab((39 * mm, 4 * mm), (-1, 0), 2 * mm)
+    assert face.bounds == pytest.approx((8 * mm, 3 * mm, 8 * mm, 5 * mm), abs=mm / 100)
+
+    # The index follows changes of the substrate
+    s.union(box(0, 20 * mm, 8 * mm, 28 * mm))
+    _, face = tab((9 * mm, 24 * mm), (-1, 0))
+    assert face.bounds == pytest.approx((8 * mm, 23 * mm, 8 * mm, 25 * mm), abs=mm / 100)
+    s.cut(box(30 * mm, 0, 38 * mm, 8 * mm))
+    with pytest.raises(TabError):
+        tab((39 * mm, 4 * mm), (-1, 0))
+
+def incrementalArcRuns(coords, tolerance, minRadius):
+    """
+    The original point-by-point walk of Substrate._serializeRing
+    """
+    runs = []
+    i = 0
+    while i < len(coords):
+        candidate = CircleFitCandidates(tolerance=tolerance)
+        for j in range(i, len(coords)):
+            if not candidate.addPoint(coords[j]):
+                break
+        if candidate.foundCircle is not None and candidate.foundCircle[1] > minRadius:
+            runs.append((i, i + len(candidate) - 1, candidate.foundCircle))
+            i += len(candidate) - 1
+        else:
+            runs.append((i, i + 1, None))
+            i += 1
+    return runs
+
+def arcTestRings():
+    mm = fromMm(1)
+    rng = np.random.default_rng(0)
+    rounded = box(0, 0, 100 * mm, 50 * mm).buffer(3 * mm, quad_segs=256)
+    milled = box(0, 0, 80 * mm, 80 * mm).difference(
+        box(20 * mm, 20 * mm, 60 * mm, 60 * mm).buffer(1 * mm, quad_segs=64))
+    holes = box(0, 0, 100 * mm, 100 * mm).difference(unary_union(
+        [Point(x * mm, y * mm).buffer(2 * mm, quad_segs=32)
+         for x in range(10, 100, 20) for y in range(10, 100, 20)]))
+    angles = np.sort(rng.uniform(0, 2 * np.pi, 2000))
+    radii = 30 * mm + rng.uniform(-0.1 * mm, 0.1 * mm, 2000)
+    noisy = Polygon(np.stack((radii * np.cos(angles), radii * np.sin(angles)), axis=1))
+    for polygon in [rounded, milled, holes, noisy]:
+        for ring in [polygon.exterior] + list(polygon.interiors):
+            yield np.array(ring.coords)
+
+def test_findArcRunsMatchesIncremental():
+    tolerance, minRadius = fromMm(0.01), fromMm(0.25)
+    for coords in arcTestRings():
+        expected = incrementalArcRuns(coords, tolerance, minRadius)
+        actual = findArcRuns(coords, tolerance, minRadius)
+        assert len(actual) == len(expected)
+        for (aStart, aEnd, aCircle), (eStart, eEnd, eCircle) in zip(actual, expected):
+            assert (aStart, aEnd) == (eStart, eEnd)
+            assert (aCircle is None) == (eCircle is None)
+            if aCircle is not None:
+                # The batched fit sums the moments in a different order
+                assert np.allclose(aCircle[0], eCircle[0], rtol=1e-9, atol=1e-3)
+                assert np.isclose(aCircle[1], eCircle[1], rtol=1e-9, atol=1e-3)
+
+def test_findArcRunsShortChains():
+    for count in range(6):
+        coords = np.array([(i * fromMm(1), 0) for i in range(count)])
+        assert findArcRuns(coords, fromMm(0.01), fromMm(0.25)) == \
+            [(i, i + 1, None) for i in range(count)]